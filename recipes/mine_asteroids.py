@@ -1,17 +1,17 @@
 import itertools
-import queue
 import threading
-import time
 
 from snisp.agent import Agent
+from snisp.assignment import Assigner
 
 
 """
 This recipe shows how to more efficiently strip all of the minable Asteroids
-in the Agent's current System. By using a Queue of Asteroid Symbols, the recipe
-demonstrates how Waypoints can be easily serialized. The shared Queue between
-threads is also a more efficient means of extraction, compared to the
-default example in the README.
+in the Agent's current System. An Assigner pairs free mining Ships with the
+Asteroids nobody is working on, minimizing the total travel time across the
+whole fleet instead of sending each Ship to whatever Asteroid is next in line.
+Ships keep their Asteroid until it is stripped, so new Ships never reshuffle
+the ones already at work.
 
 The recipe can be run in it's own thread and it requires no monitoring,
 which is ideal for running as a sub-script for a larger game.
@@ -40,85 +40,75 @@ def run(agent):
     # Get your command ship
     command_ship = agent.fleet.command_ship
 
-    # Get all of the mineable Asteroids Symbols in your Command Ship's System
-    # Sets automatically prevent duplicates
-    asteroid_symbols = {
-        i.symbol for i in
+    # Get all of the mineable Asteroids in your Command Ship's System
+    # The dict automatically prevents duplicates
+    asteroids = {
+        i.symbol: i for i in
         itertools.chain(
             command_ship.waypoints.asteroids(),
             command_ship.waypoints.engineered_asteroids(),
         )
     }
-    # Build a Queue with all of the Symbols
-    # You could just build the Queue with the Asteroids directly but one of
-    # the intents of this recipe is to show how Waypoints can go from
-    # symbol --> Waypoint, which makes serializing data a breeze
-    asteroid_queue = queue.Queue()
-    for symbol in asteroid_symbols:
-        asteroid_queue.put(symbol)
 
-    already_mining_ships = set()
+    # Keeps each mining Ship paired with one Asteroid
+    assigner = Assigner()
+    # Symbols of Asteroids with nothing left to extract
+    stripped = set()
+    lock = threading.Lock()
+    # Set whenever a Ship finishes its Asteroid
+    freed = threading.Event()
+    threads = []
 
-    wait = 60 * 15  # Fifteen minutes between loops
-    while not asteroid_queue.empty():
-        for ship in agent.fleet:
-            if ship.symbol not in already_mining_ships:
-                if ship.can_mine:
-                    t = threading.Thread(
-                        target=extract,
-                        args=(ship, asteroid_queue),
-                        daemon=True
-                    )
-                    t.start()
-                    already_mining_ships.add(ship.symbol)
-        for _ in range(wait):
-            time.sleep(1)
-            # Check the queue once a second
-            if asteroid_queue.empty():
-                # All Asteroids are being extracted! Need to break out of the
-                # loop and wait until they're completed
+    wait = 60 * 15  # At most fifteen minutes between loops
+    while True:
+        with lock:
+            remaining = [
+                i for i in asteroids.values() if i.symbol not in stripped
+            ]
+            if not remaining:
                 break
+            miners = [i for i in agent.fleet if i.can_mine]
+            # Only the Ships and Asteroids that are free get new pairs
+            pairs = assigner.update(miners, remaining)
+            freed.clear()
+        for ship, asteroid in pairs:
+            t = threading.Thread(
+                target=extract,
+                args=(ship, asteroid, assigner, stripped, lock, freed),
+                daemon=True
+            )
+            t.start()
+            threads.append(t)
+        # Wait until a Ship is free for another Asteroid, or for new Ships
+        freed.wait(timeout=wait)
     # Block until all currently working threads have had a chance to strip
-    # their Asteroids and mark their queue task done
-    asteroid_queue.join()
-
+    # their Asteroids
+    for t in threads:
+        t.join()
 
-def extract(ship, asteroid_queue):
-    try:
-        # Attempt to get an Asteroid symbol
-        asteroid_symbol = asteroid_queue.get_nowait()
-    except queue.Empty:
-        # No more asteroids. Exit
-        return
-    else:
-        # Get the Asteroid Waypoint from the Asteroid symbol
-        asteroid = ship.waypoints.get(waypoint_symbol=asteroid_symbol)
 
+def extract(ship, asteroid, assigner, stripped, lock, freed):
     while True:
         # Navigate to the Asteroid
         # Autopilot blocks until you're at the destination
         ship.autopilot(asteroid)
-        stripped = False
+        done = False
         # Extract until cargo is full
         # ship.extract automatically updates the ship's cargo
         while ship.cargo.units < ship.cargo.capacity:
             extraction = ship.extract()
             if extraction.units == 0:
                 # Asteroid is stripped! Nothing else to see here
-                stripped = True
+                done = True
                 break
         # Sell off whatever is in the Ship's cargo at the closest Markets
         # Jettisons anything that can't be sold
         ship.sell_off_cargo()
-        if stripped:
-            # Mark the Asteroid as completed
-            asteroid_queue.task_done()
-            try:
-                # Attempt to get the next Asteroid Symbol
-                asteroid_symbol = asteroid_queue.get_nowait()
-            except queue.Empty:
-                # No more asteroids. Exit
-                return
-            else:
-                # Get the Asteroid Waypoint from the Asteroid symbol
-                asteroid = ship.waypoints.get(waypoint_symbol=asteroid_symbol)
+        if done:
+            with lock:
+                # Mark the Asteroid as completed and free the Ship for the
+                # next round of assignments
+                stripped.add(asteroid.symbol)
+                assigner.release(ship)
+            freed.set()
+            return
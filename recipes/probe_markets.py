@@ -2,6 +2,7 @@ import threading
 import time
 
 from snisp.agent import Agent
+from snisp.assignment import assign
 
 
 """
@@ -38,14 +39,15 @@ def run(agent):
     # Get all of the Markets in your Command Ship's System
     markets = list(command_ship.markets)
 
-    # Empty set for tracking probed Markets
-    markets_with_probes = {}
+    # Set of Market symbols that have a Probe at them or heading their way
+    markets_with_probes = set()
 
-    # Set of Probes that are at their Market
-    probes_at_markets = {}
+    # Set of Probes that are at, or heading to, their Market
+    probes_at_markets = set()
 
     while True:
-        next_arrival = 60 * 15  # Fifteen minute baseline
+        in_transit = []
+        idle = []
         for probe in agent.fleet.probes():
             if probe.symbol in probes_at_markets:
                 # Already at a Market
@@ -53,10 +55,7 @@ def run(agent):
             if probe.nav.status == 'IN_TRANSIT':
                 # Probe may already be in transit to a Market from
                 # a previous iteration or function
-                if probe.arrival < next_arrival:
-                    # Set the timer to reset once this Probe arrives at
-                    # it's destination
-                    next_arrival = probe.arrival
+                in_transit.append(probe)
                 continue
             if probe.at_market:
                 # The Probe is either at a Market that already has a probe,
@@ -68,39 +67,40 @@ def run(agent):
                     # Mark the Probe as at a Market
                     probes_at_markets.add(probe.symbol)
                     continue
-
-            # At this point we know the Probe is not IN_TRANSIT and is not
-            # at a Market that already has a Probe at it
-            # Next thing to do is find the closest Market to the Probe
-            next_market = probe.closest(markets)
-            while next_market.symbol in markets_with_probes:
-                # Drain the Markets pool of already known Probed Markets
-                _ = markets.remove(next_market)
-                if not markets:
-                    # No remaining Markets! All Markets have been Probed
-                    # or have a Probe heading their way
-                    return
-                next_market = probe.closest(markets)
-
+            idle.append(probe)
+
+        remaining = [
+            i for i in markets if i.symbol not in markets_with_probes
+        ]
+        if not remaining:
+            # No remaining Markets! All Markets have been Probed
+            # or have a Probe heading their way
+            return
+
+        # Send every idle Probe at once, minimizing the total travel time
+        # Unlike sending each Probe to its closest Market in turn, an early
+        # Probe never takes a Market that a later Probe is much closer to
+        for probe, market in assign(idle, remaining):
             # Move the Probe on to the new Market location
             probe.update_flight_mode('CRUISE')
-            # .navigate will *not* block if the Probe is not already IN_TRANSIT
-            # The check for IN_TRANSIT at the top of the loop confirmed this
-            probe.navigate(next_market)
+            # .navigate will *not* block if the Probe is not already
+            # IN_TRANSIT. The check for IN_TRANSIT above confirmed this
+            probe.navigate(market)
 
             # Mark the Market as Probed
-            markets_with_probes.add(next_market.symbol)
+            markets_with_probes.add(market.symbol)
 
             # Mark the Probe as at a Market
             probes_at_markets.add(probe.symbol)
+            in_transit.append(probe)
 
-            # Remove the Market from the list
-            _ = markets.remove(next_market)
-            if not markets:
-                # No remaining Markets! All Markets have been Probed
-                # or have a Probe heading their way
-                return
+        if len(markets_with_probes) >= len(markets):
+            # Every Market has been Probed or has a Probe heading its way
+            return
 
         # Wait either the default 15 minutes or when the next Probe is set to
         # arrive at its destination
-        time.sleep(next_arrival)
+        if in_transit:
+            agent.fleet.wait_any(in_transit, 'arrival', timeout=60 * 15)
+        else:
+            time.sleep(60 * 15)
@@ -2,7 +2,10 @@ import os
 import logging
 import threading
 
-from snisp import agent, cache, database, utils  # noqa: F401
+from snisp import (  # noqa: F401
+    agent, assignment, cache, database, memory, navigation, operations,
+    utils,
+)
 
 
 logging.basicConfig(
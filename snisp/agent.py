@@ -1,14 +1,17 @@
 import atexit
 import collections
 import logging
+import math
 import os
 import threading
+import time
 
 from snisp import database, utils
 from snisp.client import SpaceClient, load_user
 from snisp.contracts import Contracts
 from snisp.factions import Factions
 from snisp.fleet import Fleet
+from snisp.scheduler import Scheduler
 from snisp.systems import Systems
 
 
@@ -35,6 +38,8 @@ class Agent:
         self.contracts = Contracts(self)
         self.fleet = Fleet(self)
         self.factions = Factions(self)
+        self.scheduler = Scheduler(self)
+        self.ledger = Ledger(self)
         self.dead_ships = dict()
         self.recent_transactions = collections.deque(maxlen=100)
 
@@ -65,7 +70,9 @@ class Agent:
             PlayerData
         """
         response = self.client.get('/my/agent')
-        return PlayerData(self, response.json()['data'])
+        data = response.json()['data']
+        self.ledger.record(data)
+        return PlayerData(self, data)
 
     @property
     def email(self):
@@ -90,6 +97,102 @@ class Agent:
         return self._token
 
 
+class Ledger:
+
+    """
+    The Agent's credits, kept locally from transaction responses
+
+    Purchases, sales, refuels, repairs, and the like respond with the
+    Agent's new credits, which are recorded here, so checking the balance
+    does not need a GET /my/agent. The balance is reconciled with
+    /my/agent once it is older than max_age seconds, or after anything
+    that changes the credits without reporting them, e.g., accepting a
+    Contract
+
+    >>> agent.ledger.credits
+    175000
+    >>> agent.ledger.affordable(2_500, buffer=100_000)
+    30
+    """
+
+    def __init__(self, agent, max_age=300):
+        self.agent = agent
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self._credits = None
+        self._updated_at = 0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.agent!r})'
+
+    @property
+    def credits(self):
+        """The Agent's credits, reconciled if older than max_age"""
+        with self.lock:
+            credits = self._credits
+            stale = (
+                credits is None or
+                time.monotonic() - self._updated_at > self.max_age
+            )
+        if stale:
+            return self.reconcile()
+        return credits
+
+    def record(self, agent_data):
+        """
+        Records the credits from a response's agent data
+
+        Args:
+            agent_data: dict with 'credits', e.g., response['data']['agent'].
+                        Nothing is recorded if it is None or has no credits
+        """
+        if not agent_data or agent_data.get('credits') is None:
+            return
+        with self.lock:
+            self._credits = agent_data['credits']
+            self._updated_at = time.monotonic()
+
+    def invalidate(self):
+        """The next balance check is reconciled with /my/agent"""
+        with self.lock:
+            self._credits = None
+
+    def reconcile(self):
+        """
+        Replaces the local balance with the credits from /my/agent
+
+        Returns:
+            int: The Agent's credits
+        """
+        with self.lock:
+            local = self._credits
+        credits = self.agent.data.credits
+        if local is not None and local != credits:
+            logger.info(
+                f'AGENT: {self.agent.symbol} | Ledger reconciled from '
+                f'${local:,.2f} to ${credits:,.2f}'
+            )
+        return credits
+
+    def affordable(self, unit_price, *, buffer=0):
+        """
+        Returns how many units at unit_price the credits cover while
+        keeping buffer credits in reserve
+
+        Args:
+            unit_price: Price per unit
+
+        Kwargs:
+            buffer: Credits to keep. Default is 0
+
+        Returns:
+            int: math.inf if unit_price is not positive
+        """
+        if unit_price <= 0:
+            return math.inf
+        return max(0, (self.credits - buffer) // unit_price)
+
+
 class PlayerData(utils.AbstractJSONItem):
 
     """Your Agent's current data"""
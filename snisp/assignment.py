@@ -0,0 +1,250 @@
+import math
+
+from snisp import navigation, utils
+
+try:  # pragma: no cover
+    import numpy
+except ModuleNotFoundError:  # pragma: no cover
+    numpy = None
+
+
+def cost_matrix(ships, targets, flight_mode='CRUISE'):
+    """
+    Returns the estimated seconds for each Ship to reach each target
+
+    Trips the Ship does not have the fuel on hand for are costed at DRIFT,
+    the slowest way there without refueling. matrix[i][j] is the cost of
+    sending ships[i] to targets[j]
+
+    Args:
+        ships: list of Ships
+        targets: list of Waypoints, Waypoint subclasses, or anything else
+                 with an x and y, e.g., Markets
+
+    Kwargs:
+        flight_mode: Default is CRUISE
+
+    Returns:
+        list of lists
+    """
+    flight_mode = navigation.flight_modes(flight_mode)[0]
+    if not ships or not targets:
+        return [[] for _ in ships]
+    distances = utils.distance_matrix(ships, targets)
+    if numpy is not None and isinstance(distances, numpy.ndarray):
+        rounded = numpy.maximum(1, numpy.floor(distances + .5))
+        speeds = numpy.array(
+            [max(1, i.engine.speed) for i in ships], dtype=float
+        )[:, None]
+
+        def seconds(mode):
+            return numpy.floor(
+                rounded * (navigation.FLIGHT_MODE_MULTIPLIERS[mode] / speeds)
+                + navigation.HOP_SECONDS + .5
+            )
+
+        if flight_mode == 'DRIFT':
+            fuel = numpy.ones_like(rounded)
+        elif flight_mode == 'BURN':
+            fuel = 2 * rounded
+        else:
+            fuel = rounded
+        capacity = numpy.array([i.fuel.capacity for i in ships])[:, None]
+        current = numpy.array([i.fuel.current for i in ships])[:, None]
+        feasible = (capacity == 0) | (fuel <= current)
+        return numpy.where(
+            feasible, seconds(flight_mode), seconds('DRIFT')
+        ).tolist()
+    output = []
+    for ship, row in zip(ships, distances):
+        costs = []
+        for distance in row:
+            mode = flight_mode
+            if ship.fuel.capacity and (
+                navigation.fuel_cost(distance, mode) > ship.fuel.current
+            ):
+                mode = 'DRIFT'
+            costs.append(
+                navigation.travel_time(distance, ship.engine.speed, mode)
+            )
+        output.append(costs)
+    return output
+
+
+def solve(costs):
+    """
+    Returns the minimum-cost assignment of rows to columns
+
+    Uses the Hungarian algorithm, O(n²m) for n rows and m columns. When the
+    matrix is not square, every row is assigned if there are fewer rows
+    than columns; otherwise, every column is
+
+    Args:
+        costs: list of lists or a 2D numpy.ndarray
+
+    Returns:
+        list: (row, column) pairs, sorted by row
+    """
+    if numpy is not None and isinstance(costs, numpy.ndarray):
+        costs = costs.tolist()
+    rows = len(costs)
+    columns = len(costs[0]) if rows else 0
+    if not rows or not columns:
+        return []
+    if rows > columns:
+        transposed = [list(i) for i in zip(*costs)]
+        return sorted((r, c) for c, r in solve(transposed))
+
+    # Potentials and matching are 1-indexed, with 0 as a virtual column
+    u = [0.] * (rows + 1)
+    v = [0.] * (columns + 1)
+    match = [0] * (columns + 1)
+    way = [0] * (columns + 1)
+    for row in range(1, rows + 1):
+        match[0] = row
+        column = 0
+        minimum = [math.inf] * (columns + 1)
+        used = [False] * (columns + 1)
+        while True:
+            used[column] = True
+            current = match[column]
+            delta = math.inf
+            next_column = 0
+            for j in range(1, columns + 1):
+                if not used[j]:
+                    reduced = costs[current - 1][j - 1] - u[current] - v[j]
+                    if reduced < minimum[j]:
+                        minimum[j] = reduced
+                        way[j] = column
+                    if minimum[j] < delta:
+                        delta = minimum[j]
+                        next_column = j
+            for j in range(columns + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    minimum[j] -= delta
+            column = next_column
+            if match[column] == 0:
+                break
+        while column:
+            previous = way[column]
+            match[column] = match[previous]
+            column = previous
+    return sorted(
+        (match[j] - 1, j - 1) for j in range(1, columns + 1) if match[j]
+    )
+
+
+def assign(ships, targets, *, cost=None, flight_mode='CRUISE'):
+    """
+    Assigns each Ship to at most one target, and each target to at most
+    one Ship, minimizing the total cost
+
+    If there are more Ships than targets, the Ships that cost the most are
+    left out, and vice versa
+
+    >>> for probe, market in snisp.assignment.assign(probes, markets):
+    ...     probe.navigate(market)
+
+    Args:
+        ships: Iterable of Ships
+        targets: Iterable of Waypoints, Waypoint subclasses, or anything
+                 else with an x and y, e.g., Markets
+
+    Kwargs:
+        cost: callable(ships, targets) returning a cost matrix, e.g., to
+              weigh cargo capacity. Default is None for cost_matrix
+        flight_mode: Passed to cost_matrix. Default is CRUISE
+
+    Blocks:
+        False
+
+    Returns:
+        list: (Ship, target) pairs
+    """
+    ships = list(ships)
+    targets = list(targets)
+    if cost is None:
+        costs = cost_matrix(ships, targets, flight_mode=flight_mode)
+    else:
+        costs = cost(ships, targets)
+    return [(ships[i], targets[j]) for i, j in solve(costs)]
+
+
+class Assigner:
+
+    """
+    Keeps Ships assigned to targets as either change
+
+    Ships keep their targets between updates, so Ships already on their way
+    are never reshuffled. Only Ships and targets that are free are solved
+    for again, e.g., when a Ship is bought or a target is finished
+
+    >>> assigner = snisp.assignment.Assigner()
+    >>> for ship, asteroid in assigner.update(miners, asteroids):
+    ...     agent.scheduler.submit(mine, ship, asteroid)
+    >>> assigner.release(ship)  # The Ship is free for the next update
+    """
+
+    def __init__(self, *, cost=None, flight_mode='CRUISE'):
+        self.cost = cost
+        self.flight_mode = flight_mode
+        self.assignments = {}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({len(self)} assigned)'
+
+    def __len__(self):
+        return len(self.assignments)
+
+    def __contains__(self, ship):
+        return getattr(ship, 'symbol', ship) in self.assignments
+
+    def __getitem__(self, ship):
+        return self.assignments[getattr(ship, 'symbol', ship)]
+
+    def update(self, ships, targets):
+        """
+        Drops assignments whose Ship or target is gone and assigns the free
+        Ships to the free targets
+
+        Args:
+            ships: Iterable of every current Ship
+            targets: Iterable of every current target
+
+        Returns:
+            list: The new (Ship, target) pairs
+        """
+        ships = list(ships)
+        targets = list(targets)
+        ship_symbols = {i.symbol for i in ships}
+        target_symbols = {i.symbol for i in targets}
+        self.assignments = {
+            symbol: target for symbol, target in self.assignments.items()
+            if symbol in ship_symbols and target.symbol in target_symbols
+        }
+        taken = {i.symbol for i in self.assignments.values()}
+        output = assign(
+            (i for i in ships if i.symbol not in self.assignments),
+            (i for i in targets if i.symbol not in taken),
+            cost=self.cost,
+            flight_mode=self.flight_mode,
+        )
+        for ship, target in output:
+            self.assignments[ship.symbol] = target
+        return output
+
+    def release(self, ship):
+        """
+        Frees the Ship and its target
+
+        Args:
+            ship: Ship or Ship symbol
+
+        Returns:
+            The target the Ship was assigned, or None
+        """
+        return self.assignments.pop(getattr(ship, 'symbol', ship), None)
+
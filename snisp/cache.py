@@ -1,5 +1,6 @@
 import httpx
 import logging
+import threading
 import urllib.parse as urlparse
 
 import snisp
@@ -10,8 +11,34 @@ logger = logging.getLogger(__name__)
 
 # NOTE: Only waypoints work for now in DB
 
+# Caps for the in-process caches. See snisp.memory.set_caps
+MAX_FUEL_STATIONS = 64  # Systems
+MAX_FUEL_PRICES = 64  # Systems
+MAX_DISTANCE_SYSTEMS = 64
+MAX_DISTANCE_TABLES = 64  # Per System
+MAX_ROUTE_SYSTEMS = 64
+MAX_ROUTE_PLANS = 256  # Per System
+MAX_JUMP_GATES = 256  # Systems
+
 FUEL_STATIONS = {}
 
+FUEL_PRICE_LOCK = threading.Lock()
+FUEL_PRICES = {}
+
+JUMP_GATES = {}
+
+DISTANCE_LOCK = threading.Lock()
+DISTANCE_TABLES = {}
+
+ROUTE_LOCK = threading.Lock()
+ROUTE_PLANS = {}
+
+
+def evict(cache, maxsize):
+    # Oldest first, relying on dict insertion order
+    while len(cache) > maxsize:
+        del cache[next(iter(cache))]
+
 
 def get_fuel_stations(location):
     # Assumes the calling thread is already under a lock
@@ -22,13 +49,102 @@ def get_fuel_stations(location):
 def insert_fuel_stations(location, fuel_stations):
     # Assumes the calling thread is already under a lock
     # Ideally, it will be the agent's lock
+    FUEL_STATIONS.pop(location.system, None)
     FUEL_STATIONS[location.system] = list(fuel_stations)
+    evict(FUEL_STATIONS, MAX_FUEL_STATIONS)
+    # Routes planned over the previous Fuel Stations may no longer apply
+    reset_route_plans(location)
 
 
 def reset_fuel_stations(location):
     # Assumes the calling thread is already under a lock
     # Ideally, it will be the agent's lock
     FUEL_STATIONS[location.system] = []
+    reset_route_plans(location)
+
+
+def get_fuel_prices(system):
+    # {waypoint_symbol: (purchase_price, sell_price)} for a unit of FUEL
+    with FUEL_PRICE_LOCK:
+        return dict(FUEL_PRICES.get(system, {}))
+
+
+def insert_fuel_price(
+    system, waypoint_symbol, purchase_price=None, sell_price=None
+):
+    # Prices left as None keep the last known price
+    with FUEL_PRICE_LOCK:
+        prices = FUEL_PRICES.pop(system, {})
+        FUEL_PRICES[system] = prices
+        purchase, sell = prices.get(waypoint_symbol, (None, None))
+        prices[waypoint_symbol] = (
+            purchase if purchase_price is None else purchase_price,
+            sell if sell_price is None else sell_price,
+        )
+        evict(FUEL_PRICES, MAX_FUEL_PRICES)
+
+
+def reset_fuel_prices(location):
+    with FUEL_PRICE_LOCK:
+        FUEL_PRICES.pop(location.system, None)
+
+
+def get_jump_gate(system):
+    # Assumes the calling thread is already under a lock
+    # Ideally, it will be the agent's lock
+    return JUMP_GATES.get(system)
+
+
+def insert_jump_gate(system, jump_gate):
+    # Assumes the calling thread is already under a lock
+    # Ideally, it will be the agent's lock
+    JUMP_GATES.pop(system, None)
+    JUMP_GATES[system] = jump_gate
+    evict(JUMP_GATES, MAX_JUMP_GATES)
+
+
+def reset_jump_gate(location):
+    # Assumes the calling thread is already under a lock
+    # Ideally, it will be the agent's lock
+    JUMP_GATES.pop(location.system, None)
+
+
+def get_distance_table(system, key):
+    with DISTANCE_LOCK:
+        return DISTANCE_TABLES.get(system, {}).get(key)
+
+
+def insert_distance_table(system, table):
+    with DISTANCE_LOCK:
+        tables = DISTANCE_TABLES.pop(system, {})
+        DISTANCE_TABLES[system] = tables
+        tables[table.key] = table
+        evict(tables, MAX_DISTANCE_TABLES)
+        evict(DISTANCE_TABLES, MAX_DISTANCE_SYSTEMS)
+
+
+def reset_distance_tables(location):
+    with DISTANCE_LOCK:
+        DISTANCE_TABLES.pop(location.system, None)
+
+
+def get_route_plan(system, key):
+    with ROUTE_LOCK:
+        return ROUTE_PLANS.get(system, {}).get(key)
+
+
+def insert_route_plan(system, key, route):
+    with ROUTE_LOCK:
+        plans = ROUTE_PLANS.pop(system, {})
+        ROUTE_PLANS[system] = plans
+        plans[key] = route
+        evict(plans, MAX_ROUTE_PLANS)
+        evict(ROUTE_PLANS, MAX_ROUTE_SYSTEMS)
+
+
+def reset_route_plans(location):
+    with ROUTE_LOCK:
+        ROUTE_PLANS.pop(location.system, None)
 
 
 def lookup(*args, **kwargs):
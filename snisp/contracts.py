@@ -117,6 +117,8 @@ class Contract(utils.AbstractJSONItem):
                 f'/my/contracts/{self.id}/accept'
             )
             self.update_data_item('accepted', True)
+            # The advance payment is not in the response
+            self.agent.ledger.invalidate()
             logger.info(f'Contract {self.id} accepted')
 
     @retry()
@@ -203,6 +205,7 @@ class Contract(utils.AbstractJSONItem):
             )
             data = response.json()['data']
             self.update_data_item('fulfilled', data['contract']['fulfilled'])
+            self.agent.ledger.record(data.get('agent'))
             logger.info(f'Contract {self.id} fulfilled!')
             return data
 
@@ -1,3 +1,4 @@
+import contextlib
 import dateutil
 import functools
 import httpx
@@ -5,14 +6,31 @@ import itertools
 import logging
 import threading
 import time
+import weakref
 
 import snisp
 
-from datetime import datetime, timezone
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
 
 
 logger = logging.getLogger(__name__)
 
+NON_BLOCKING = threading.local()
+# The wrappers made by precondition, so stacking them merges into one
+GUARDS = weakref.WeakSet()
+
+Preconditions = namedtuple(
+    'Preconditions', ('transit', 'cooldown', 'status'),
+    defaults=(False, False, None),
+)
+Preconditions.__doc__ = """
+What every Ship passed to an action must be ready for before it runs
+
+transit waits out an arrival, cooldown waits out the reactor Cooldown, and
+status is 'DOCKED', 'IN_ORBIT', or None if either will do
+"""
+
 
 class CachedRateLimiter:
 
@@ -47,45 +65,177 @@ class CachedRateLimiter:
         return inner
 
 
-def cooldown(func):
+@contextlib.contextmanager
+def non_blocking():
+    """
+    Within the context, waits in the current thread raise WaitRequiredError
+    with the deadline to resume at instead of sleeping
 
-    @functools.wraps(func)
-    def inner(*args, **kwargs):
-        for ship in itertools.chain(args, kwargs.values()):
-            if isinstance(ship, snisp.fleet.Ship):
-                if expires := ship.cooldown.expiration:
-                    expires = dateutil.parser.parse(expires)
-                    delta = expires - datetime.now(timezone.utc)
-                    if delta.days >= 0:  # pragma: no cover aka impatient
-                        time.sleep(delta.seconds)
-        return func(*args, **kwargs)
-    return inner
+    Used by the Scheduler so a few threads can drive the whole fleet
+    """
+    previous = getattr(NON_BLOCKING, 'enabled', False)
+    NON_BLOCKING.enabled = True
+    try:
+        yield
+    finally:
+        NON_BLOCKING.enabled = previous
 
 
-def docked(func):
+def wait(seconds):
+    """
+    Sleeps for seconds or, within non_blocking, raises WaitRequiredError
 
-    @functools.wraps(func)
-    def inner(*args, **kwargs):
-        for ship in itertools.chain(args, kwargs.values()):
-            if isinstance(ship, snisp.fleet.Ship):
-                if ship.nav.status != 'DOCKED':
-                    ship.dock()
-        return func(*args, **kwargs)
-    return inner
+    Raises:
+        WaitRequiredError: Within non_blocking and seconds > 0
+    """
+    if seconds <= 0:
+        return
+    if getattr(NON_BLOCKING, 'enabled', False):
+        raise snisp.exceptions.WaitRequiredError(
+            datetime.now(timezone.utc) + timedelta(seconds=seconds)
+        )
+    time.sleep(seconds)  # pragma: no cover
 
 
-def in_orbit(func):
+def precondition(func, *, transit=False, cooldown=False, status=None):
+    """
+    Wraps func so every Ship in its arguments meets the Preconditions
+    before func runs
+
+    transit, cooldown, docked, and in_orbit are all preconditions. Stacked
+    on one another they merge into a single wrapper, so the arguments are
+    searched for Ships once and each Ship's nav is read once per call
+
+    Args:
+        func: Function or method taking one or more Ships
+
+    Kwargs:
+        transit: Wait until the Ships arrive. Default is False
+        cooldown: Wait out the Ships' reactor Cooldowns. Default is False
+        status: 'DOCKED' or 'IN_ORBIT' to move the Ships to first.
+                Default is None
+    """
+    requires = Preconditions(transit, cooldown, status)
+    if func in GUARDS:
+        requires = Preconditions(
+            requires.transit or func.preconditions.transit,
+            requires.cooldown or func.preconditions.cooldown,
+            func.preconditions.status or requires.status,
+        )
+        func = func.__wrapped__
 
     @functools.wraps(func)
     def inner(*args, **kwargs):
         for ship in itertools.chain(args, kwargs.values()):
             if isinstance(ship, snisp.fleet.Ship):
-                if ship.nav.status != 'IN_ORBIT':
-                    ship.orbit()
+                satisfy(ship, requires)
         return func(*args, **kwargs)
+    # Copied onto any outer decorators by functools.wraps
+    inner.preconditions = requires
+    if requires.cooldown:
+        inner.uses_reactor = True
+    GUARDS.add(inner)
     return inner
 
 
+def satisfy(ship, requires):
+    """
+    Brings the Ship to the Preconditions, waiting and changing its status
+    only where it is not already there
+
+    Args:
+        ship: Ship
+        requires: Preconditions
+    """
+    status = ship.nav.status
+    if requires.transit and status == 'IN_TRANSIT':
+        if arrives_in := ship.arrival:  # pragma: no cover
+            wait(arrives_in)
+        ship.arrived_at_destination()
+        status = 'IN_ORBIT'
+    if requires.cooldown:
+        if expires := ship.cooldown.expiration:
+            expires = dateutil.parser.parse(expires)
+            delta = expires - datetime.now(timezone.utc)
+            wait(delta.total_seconds())
+    if requires.status is not None and requires.status != status:
+        if requires.status == 'DOCKED':
+            ship.dock()
+        else:
+            ship.orbit()
+
+
+def preconditions(action):
+    """
+    Returns the Preconditions of the action
+
+    Args:
+        action: Ship method, Waypoints method, or a functools.partial of one
+    """
+    while isinstance(action, functools.partial):
+        action = action.func
+    return getattr(action, 'preconditions', Preconditions())
+
+
+def plan_transitions(status, actions):
+    """
+    Returns the status to move the Ship to before each action, or None
+    where the action can run as is
+
+    The Ship's status is followed through the actions, so a run of docked
+    actions docks once and the next action in orbit orbits once. Actions
+    that do not need either status never move the Ship. The actions keep
+    their order, as later ones often depend on earlier ones, e.g., selling
+    what was just extracted
+
+    Args:
+        status: The Ship's nav status before the first action
+        actions: Iterable of Ship methods or functools.partials of them
+
+    Returns:
+        list: 'DOCKED', 'IN_ORBIT', or None for each action
+    """
+    if status == 'IN_TRANSIT':
+        # Every status change waits out the arrival first
+        status = 'IN_ORBIT'
+    output = []
+    for action in actions:
+        required = preconditions(action).status
+        if required is None or required == status:
+            output.append(None)
+        else:
+            output.append(required)
+            status = required
+    return output
+
+
+def transit(func):
+    return precondition(func, transit=True)
+
+
+def cooldown(func):
+    return precondition(func, cooldown=True)
+
+
+def uses_reactor(action):
+    """
+    Returns True if the action needs the Ship's reactor, i.e., it waits on
+    and starts a cooldown, e.g., extract, siphon, survey, scan, jump, refine
+
+    Args:
+        action: Ship method, Waypoints method, or a functools.partial of one
+    """
+    return preconditions(action).cooldown
+
+
+def docked(func):
+    return precondition(func, status='DOCKED')
+
+
+def in_orbit(func):
+    return precondition(func, status='IN_ORBIT')
+
+
 def retry(jitter=.2, max_retries=5):
 
     def wrapper(func):
@@ -105,6 +255,8 @@ def retry(jitter=.2, max_retries=5):
                         f'Received {e!r}.'
                     )
                     if not agent.client.testing:  # pragma: no cover
+                        # Short enough to sleep through, even when driven
+                        # by the Scheduler
                         time.sleep((jitter * attempt) + jitter)
                     last_exception = e
                 except snisp.exceptions.ClientError as e:
@@ -116,10 +268,10 @@ def retry(jitter=.2, max_retries=5):
                         if cooldown := data.get(
                             'cooldown'
                         ):  # pragma: no cover
-                            if wait := cooldown.get('remainingSeconds'):
+                            if seconds := cooldown.get('remainingSeconds'):
                                 if not agent.client.testing:
-                                    time.sleep(float(wait))
-                        elif wait := max(
+                                    wait(float(seconds))
+                        elif seconds := max(
                             [
                                 data.get('secondsToArrival', 0),
                                 data.get('retryAfter', 0),
@@ -127,7 +279,7 @@ def retry(jitter=.2, max_retries=5):
                             ]
                         ):  # pragma: no cover
                             if not agent.client.testing:
-                                time.sleep(float(wait))
+                                wait(float(seconds))
                         elif code := data.get('code'):
                             if err := snisp.exceptions.error_codes.get(
                                 int(code)
@@ -137,17 +289,3 @@ def retry(jitter=.2, max_retries=5):
             raise last_exception
         return inner
     return wrapper
-
-
-def transit(func):
-
-    @functools.wraps(func)
-    def inner(*args, **kwargs):
-        for ship in itertools.chain(args, kwargs.values()):
-            if isinstance(ship, snisp.fleet.Ship):
-                if ship.nav.status == 'IN_TRANSIT':
-                    if arrives_in := ship.arrival:  # pragma: no cover
-                        time.sleep(arrives_in)
-                    ship.arrived_at_destination()
-        return func(*args, **kwargs)
-    return inner
@@ -30,6 +30,35 @@ class NoShipAtLocationError(SpaceBaseException):
     pass
 
 
+class SerializationError(SpaceBaseException):
+    pass
+
+
+class GatherError(SpaceBaseException):
+
+    def __init__(self, results, errors, pending, msg=None):
+        if msg is None:
+            msg = (
+                f'{len(errors)} of {len(results)} actions failed and '
+                f'{len(pending)} did not finish'
+            )
+        super().__init__(msg)
+        self.results = results
+        self.errors = errors
+        self.pending = pending
+
+
+class WaitRequiredError(BaseException):
+
+    # Not an Exception, so a broad `except Exception` within an action does
+    # not swallow it before it reaches the Scheduler
+
+    def __init__(self, deadline, msg=None):
+        msg = msg if msg is not None else f'Wait required until {deadline}'
+        super().__init__(msg)
+        self.deadline = deadline
+
+
 # General Error Codes
 class CooldownConflictError(SpaceBaseException):
     error_code = 4000
@@ -1,21 +1,55 @@
+import array
+import collections
+import concurrent.futures
 import dateutil
 import functools
+import inspect
 import itertools
 import logging
+import math
+import threading
+import time
 
 from datetime import datetime, timezone
 
-from snisp import exceptions, utils, systems
+from snisp import (
+    cache, decorators, exceptions, navigation, scheduler, utils, systems
+)
 from snisp.contracts import Contract
-from snisp.decorators import cooldown, docked, in_orbit, retry, transit
+from snisp.decorators import cooldown, docked, in_orbit, retry, transit, wait
 from snisp.markets import Markets
 from snisp.shipyards import Shipyards
 from snisp.systems import System
 from snisp.waypoints import Waypoints
 
+try:  # pragma: no cover
+    import numpy
+except ModuleNotFoundError:  # pragma: no cover
+    numpy = None
+
 
 logger = logging.getLogger(__name__)
 
+PAGE_LIMIT = 20  # Most Ships returned per page of GET /my/ships
+# The first step of composite actions that do not request anything until
+# the Ship has arrived
+TRANSIT = decorators.Preconditions(transit=True)
+
+BroadcastResult = collections.namedtuple(
+    'BroadcastResult', ('ship', 'status', 'result')
+)
+
+# Whether a Ship is already where a broadcast action would put it, from its
+# local nav and fuel
+BROADCAST_SKIPS = {
+    'dock': lambda ship, **kwargs: ship.nav.status == 'DOCKED',
+    'orbit': lambda ship, **kwargs: ship.nav.status == 'IN_ORBIT',
+    'refuel': lambda ship, **kwargs: ship.fuel.current >= ship.fuel.capacity,
+    'update_flight_mode': lambda ship, **kwargs: (
+        ship.nav.flight_mode == str(kwargs.get('mode', '')).strip().upper()
+    ),
+}
+
 
 class Fleet:
 
@@ -23,16 +57,49 @@ class Fleet:
 
     def __init__(self, agent):
         self.agent = agent
+        self.states = ShipStateStore(agent)
         self._command_ship = None
+        self._snapshot_lock = threading.Lock()
 
     def __repr__(self):
         return f'{self.__class__.__name__}({self.agent!r})'
 
+    @property
+    def arrays(self):
+        """
+        Property that returns the FleetState struct-of-arrays view of
+        every Ship in fleet.states
+
+        Blocks:
+            False
+
+        Returns:
+            FleetState
+        """
+        return self.states.arrays
+
     @property
     def command_ship(self):
+        """
+        Property that returns the Agent's first Ship
+
+        The shared Ship from fleet.states is returned as is, unless its nav
+        is stale, in which case it is refreshed from the server
+
+        Blocks:
+            False
+
+        Returns:
+            Ship
+        """
         if self._command_ship is None:
             self._command_ship = next(iter(self))
-        return self._command_ship.refresh()
+        symbol = self._command_ship.symbol
+        if (ship := self.states.get(symbol)) is not None:
+            if not self.states.is_stale(symbol, 'nav'):
+                return ship
+        self._command_ship = self._command_ship.refresh()
+        return self._command_ship
 
     @retry()
     def __call__(self, ship_symbol):
@@ -47,12 +114,15 @@ class Fleet:
         """
         ship_symbol = ship_symbol.upper()
         response = self.agent.client.get(f'/my/ships/{ship_symbol}')
-        return Ship(self.agent, response.json()['data'])
+        return self.states.update(response.json()['data'])
 
     def __iter__(self):
         """
         Iterates over the current Agent's Fleet
 
+        Every Ship yielded is the shared instance held in fleet.states, so
+        all handles to the same Ship see the same state
+
         Yields:
             Ship
         """
@@ -61,63 +131,921 @@ class Fleet:
         while data := response.json()['data']:
             for ship in data:
                 if ship['symbol'] not in self.agent.dead_ships:
-                    yield Ship(self.agent, ship)
+                    yield self.states.update(ship)
             page += 1
             response = self.get_page(page=page)
 
     @retry()
-    def get_page(self, page=1, limit=20):
+    def get_page(self, page=1, limit=PAGE_LIMIT):
         params = {'limit': int(limit), 'page': int(page)}
         return self.agent.client.get('/my/ships', params=params)
 
+    def snapshot(self, refresh=False):
+        """
+        Returns the FleetIndex of every known Ship, paging /my/ships first
+        if the Fleet has not been loaded yet
+
+        After the first load, the index is kept current from action
+        responses and purchases, so filters like Fleet.drones run against
+        memory instead of re-paging the Fleet
+
+        Kwargs:
+            refresh: Re-page the whole Fleet first, dropping any Ships that
+                     are no longer returned. Default is False
+
+        Blocks:
+            False: unless the Fleet has to be paged
+
+        Returns:
+            FleetIndex
+        """
+        with self._snapshot_lock:
+            if refresh or self.states.loaded is None:
+                self._page_fleet()
+        return self.states.index
+
+    def refresh_all(self):
+        """
+        Re-pages the whole Fleet, PAGE_LIMIT Ships per request, and applies
+        the results to the shared Ships in place
+
+        Ships that are no longer returned, e.g., scrapped elsewhere, are
+        dropped from fleet.states
+
+        Blocks:
+            False
+
+        Returns:
+            list: Ships
+        """
+        with self._snapshot_lock:
+            return self._page_fleet()
+
+    def refresh(self, ships):
+        """
+        Refreshes the Ships in place with whichever is fewer requests: one
+        GET per Ship, or paging the whole Fleet
+
+        The Fleet is always paged if it has not been loaded yet, as its size
+        is unknown
+
+        >>> agent.fleet.refresh(agent.fleet.mining_drones())
+
+        Args:
+            ships: Iterable of Ships
+
+        Blocks:
+            False
+
+        Returns:
+            list: The refreshed Ships. Ships that no longer exist are omitted
+        """
+        ships = list(ships)
+        if not ships:
+            return []
+        if self.states.loaded is not None:
+            fleet_size = max(len(self.states), len(ships))
+            if len(ships) <= math.ceil(fleet_size / PAGE_LIMIT):
+                return [
+                    ship for ship in map(self._refresh_ship, ships)
+                    if ship is not None
+                ]
+        self.refresh_all()
+        return [
+            self.states.get(ship.symbol) for ship in ships
+            if ship.symbol in self.states
+        ]
+
+    def _page_fleet(self):
+        # Callers hold self._snapshot_lock
+        ships = list(self)
+        seen = {ship.symbol for ship in ships}
+        for symbol in set(self.states._ships) - seen:
+            if symbol not in self.agent.dead_ships:
+                self.states.remove(symbol)
+        self.states.loaded = datetime.now(timezone.utc)
+        return ships
+
+    @retry()
+    def _refresh_ship(self, ship):
+        try:
+            response = self.agent.client.get(f'/my/ships/{ship.symbol}')
+        except exceptions.ClientError as e:
+            if data := e.data:
+                if data.get('code') == 404:
+                    logger.warning(f'{ship.symbol} no longer exists')
+                    self.states.remove(ship.symbol)
+                    return None
+            raise e
+        return self.states.update(response.json()['data'])
+
     def drones(self):
         """Yields Ships where ship.frame.symbol == 'FRAME_DRONE'"""
-        for ship in self:
-            if ship.frame.symbol == 'FRAME_DRONE':
-                yield ship
+        yield from self.snapshot().select(frame='FRAME_DRONE')
 
     def freighters(self):
         """Yields Ships where 'FREIGHTER' in ship.frame.symbol"""
-        for ship in self:
-            if 'FREIGHTER' in ship.frame.symbol:
-                yield ship
+        yield from self.snapshot().select(frame=lambda x: 'FREIGHTER' in x)
 
     def mining_drones(self):
         """Yields Ships that are Drones and have a Mining Laser Mount"""
-        for drone in self.drones():
-            if any(
-                mount.symbol.upper().startswith('MOUNT_MINING_LASER_')
-                for mount in drone.mounts
-            ):
-                yield drone
+        yield from self.snapshot().select(
+            frame='FRAME_DRONE',
+            mount=lambda x: x.startswith('MOUNT_MINING_LASER_'),
+        )
 
     def siphon_drones(self):
         """Yields Ships that are Drones and have a Gas Siphon MountShip"""
-        for drone in self.drones():
-            if any(
-                mount.symbol.upper().startswith('MOUNT_GAS_SIPHON_')
-                for mount in drone.mounts
-            ):
-                yield drone
+        yield from self.snapshot().select(
+            frame='FRAME_DRONE',
+            mount=lambda x: x.startswith('MOUNT_GAS_SIPHON_'),
+        )
 
     def probes(self):
         """Yields Ships where ship.frame.symbol == 'FRAME_PROBE'"""
-        for ship in self:
-            if ship.frame.symbol == 'FRAME_PROBE':
-                yield ship
+        yield from self.snapshot().select(frame='FRAME_PROBE')
 
     def ships(self):
         """Yields Ships that are neither Drone nor Probes"""
-        for ship in self:
-            if 'DRONE' not in ship.frame.symbol:
-                if 'PROBE' not in ship.frame.symbol:
-                    yield ship
+        yield from self.snapshot().select(
+            frame=lambda x: 'DRONE' not in x and 'PROBE' not in x
+        )
 
     def shuttles(self):
         """Yields Ships where 'SHUTTLE' in ship.frame.symbol"""
-        for ship in self:
-            if 'SHUTTLE' in ship.frame.symbol:
-                yield ship
+        yield from self.snapshot().select(frame=lambda x: 'SHUTTLE' in x)
+
+    def wait_any(self, ships, until='ready', *, timeout=None):
+        """
+        Waits until at least one of the Ships has arrived, finished its
+        cooldown, or both, and returns every Ship that is ready
+
+        Readiness is computed from the Ships' known arrival and cooldown
+        expiration, so the API is not polled. Ships that have arrived are
+        marked as IN_ORBIT
+
+        >>> for probe in agent.fleet.wait_any(probes, 'arrival'):
+        ...     probe.markets.market_data()
+
+        Args:
+            ships: Iterable of Ships
+
+        Kwargs:
+            until: 'arrival', 'cooldown', or 'ready' for both.
+                   Default is 'ready'
+            timeout: Maximum seconds to wait. Default is None
+
+        Blocks:
+            True: until a Ship is ready or the timeout has passed
+
+        Returns:
+            list: Ships that are ready, which may be empty after a timeout
+        """
+        return self._wait(ships, until, timeout, min)
+
+    def wait_all(self, ships, until='ready', *, timeout=None):
+        """
+        Waits until every Ship has arrived, finished its cooldown, or both
+
+        See Fleet.wait_any
+
+        Blocks:
+            True: until every Ship is ready or the timeout has passed
+
+        Returns:
+            list: Ships that are ready, which is every Ship unless the
+                  timeout has passed
+        """
+        return self._wait(ships, until, timeout, max)
+
+    def gather(self, futures, *, timeout=None, return_exceptions=False):
+        """
+        Waits for the Futures returned by the Ships' *_async actions and
+        returns their results in order
+
+        >>> futures = [i.navigate_async(asteroid) for i in drones]
+        >>> agent.fleet.gather(futures, timeout=300)
+
+        Args:
+            futures: Iterable of Futures
+
+        Kwargs:
+            timeout: Maximum seconds to wait for all of them. Default is None
+            return_exceptions: Return the exception raised by an action in
+                               place of its result instead of raising.
+                               Default is False
+
+        Blocks:
+            True: until every Future is done or the timeout has passed
+
+        Raises:
+            GatherError: If any action raised, unless return_exceptions,
+                         or did not finish before the timeout. Its results
+                         has the result of every action that finished, in
+                         order and None otherwise, its errors is a dict of
+                         {index: exception}, and its pending is a list of
+                         the indexes that did not finish
+
+        Returns:
+            list: The actions' results
+        """
+        futures = list(futures)
+        concurrent.futures.wait(futures, timeout=timeout)
+        results, errors, pending = [], {}, []
+        for index, future in enumerate(futures):
+            if not future.done():
+                pending.append(index)
+                results.append(None)
+            elif (error := future.exception()) is not None:
+                errors[index] = error
+                results.append(error if return_exceptions else None)
+            else:
+                results.append(future.result())
+        if pending or (errors and not return_exceptions):
+            raise exceptions.GatherError(results, errors, pending)
+        return results
+
+    def broadcast(self, action, ships, *, timeout=None, **kwargs):
+        """
+        Runs the Ship action on every Ship at once and returns how each
+        went
+
+        Ships already in the state the action would put them in are
+        skipped, judged from their local nav and fuel, so no request is
+        made for them. That covers dock, orbit, refuel, and
+        update_flight_mode. The rest are queued with their *_async action,
+        those ready soonest first and then those with the least fuel, and
+        run concurrently through the shared rate limiter
+
+        >>> results = agent.fleet.broadcast(
+        ...     'update_flight_mode', agent.fleet.probes(), mode='CRUISE'
+        ... )
+        >>> [i.ship.symbol for i in results.values() if i.status == 'done']
+        ['PROBE-3', 'PROBE-7']
+
+        Args:
+            action: Name of the Ship action, e.g., 'dock' or 'refuel'
+            ships: Iterable of Ships
+
+        Kwargs:
+            timeout: Maximum seconds to wait. Default is None
+            kwargs: Passed to each Ship's action
+
+        Blocks:
+            True: until every action is done or the timeout has passed
+
+        Returns:
+            dict: {ship_symbol: BroadcastResult(ship, status, result)} in
+                  the order of ships. status is 'skipped', 'done', 'failed'
+                  with the exception as the result, or 'pending' if the
+                  action was still running at the timeout
+
+        Raises:
+            SpaceAttributeError: The action cannot be broadcast, or the
+                                 kwargs do not fit it
+        """
+        if not callable(getattr(Ship, f'{action}_async', None)):
+            raise exceptions.SpaceAttributeError(
+                f'{action!r} is not a Ship action that can be broadcast'
+            )
+        try:
+            inspect.signature(getattr(Ship, action)).bind(None, **kwargs)
+        except TypeError as e:
+            raise exceptions.SpaceAttributeError(
+                f'Cannot broadcast {action!r}: {e}'
+            ) from None
+        ships = list(ships)
+        skip = BROADCAST_SKIPS.get(action)
+        output = {}
+        queued = []
+        for ship in ships:
+            if skip is not None and skip(ship, **kwargs):
+                output[ship.symbol] = BroadcastResult(ship, 'skipped', None)
+            else:
+                output[ship.symbol] = None
+                queued.append(ship)
+        now = time.time()
+        queued.sort(
+            key=lambda x: (
+                max(scheduler.ready_at(x).timestamp(), now),
+                ratio(x.fuel.current, x.fuel.capacity),
+            )
+        )
+        futures = [getattr(i, f'{action}_async')(**kwargs) for i in queued]
+        try:
+            results = self.gather(
+                futures, timeout=timeout, return_exceptions=True
+            )
+            pending = []
+        except exceptions.GatherError as e:
+            results, pending = e.results, e.pending
+        for index, (ship, result) in enumerate(zip(queued, results)):
+            if index in pending:
+                status = 'pending'
+            elif isinstance(result, Exception):
+                status = 'failed'
+            else:
+                status = 'done'
+            output[ship.symbol] = BroadcastResult(ship, status, result)
+        return output
+
+    def _wait(self, ships, until, timeout, choose):
+        ships = list(ships)
+        if not ships:
+            return []
+        deadlines = [
+            scheduler.ready_at(ship, until).timestamp() for ship in ships
+        ]
+        deadline = choose(deadlines)
+        if timeout is not None:
+            deadline = min(deadline, time.time() + timeout)
+        # Raises WaitRequiredError instead when run by the Scheduler
+        wait(deadline - time.time())
+        now = time.time()
+        ready = [i for i, j in zip(ships, deadlines) if j <= now]
+        for ship in ready:
+            if until != 'cooldown' and ship.nav.status == 'IN_TRANSIT':
+                ship.arrived_at_destination()
+        return ready
+
+
+class ShipStateStore:
+
+    """
+    Identity map of the Agent's Ships keyed by Ship symbol
+
+    Every Ship returned by the Fleet is the single instance held here, so
+    the nav, fuel, cargo, and cooldown updated by one action response are
+    seen by every handle to that Ship without an additional GET
+
+    Staleness is tracked per top-level field (nav, fuel, cargo, etc.) as the
+    time the field was last set from a server response
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.lock = threading.RLock()
+        self._ships = {}
+        self._updated = {}
+        self.arrays = FleetState(self)
+        self.index = FleetIndex(self)
+        self.loaded = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.agent!r})'
+
+    def __contains__(self, ship_symbol):
+        return ship_symbol.upper() in self._ships
+
+    def __iter__(self):
+        with self.lock:
+            ships = list(self._ships.values())
+        yield from ships
+
+    def __len__(self):
+        return len(self._ships)
+
+    def get(self, ship_symbol, default=None):
+        """
+        Returns the known Ship for ship_symbol without making a request
+
+        Args:
+            ship_symbol: The symbol of the Ship
+
+        Kwargs:
+            default: Returned if the Ship is not known. Default is None
+
+        Returns:
+            Ship or default
+        """
+        return self._ships.get(ship_symbol.upper(), default)
+
+    def update(self, ship_data):
+        """
+        Applies a full Ship payload to the shared Ship instance, creating it
+        if it does not exist yet
+
+        Args:
+            ship_data: The JSON data for a Ship, e.g., from GET /my/ships
+
+        Returns:
+            Ship: The shared Ship instance
+        """
+        with self.lock:
+            ship = self._ships.get(ship_data['symbol'])
+            if ship is None:
+                ship = Ship(self.agent, ship_data)
+                self._ships[ship_data['symbol']] = ship
+                for name in ship_data.keys():
+                    self.touch(ship.symbol, name)
+                self.arrays.update(ship)
+                self.index.update(ship)
+                return ship
+            with utils.ATTRIBUTE_LOCK:
+                for name in set(ship._data.keys()) - set(ship_data.keys()):
+                    del ship._data[name]
+                    vars(ship).pop(name, None)
+            for name, value in ship_data.items():
+                if name in ship._data.keys():
+                    # Skips Ship.update_data_item so the arrays and index
+                    # are synced once below instead of once per field
+                    utils.AbstractJSONItem.update_data_item(ship, name, value)
+                else:
+                    with utils.ATTRIBUTE_LOCK:
+                        ship._data[name] = value
+                self.touch(ship.symbol, name)
+            self.arrays.update(ship)
+            self.index.update(ship)
+            return ship
+
+    def remove(self, ship_symbol):
+        """Drops the Ship from the store, e.g., after it has been scrapped"""
+        with self.lock:
+            self._ships.pop(ship_symbol, None)
+            self._updated.pop(ship_symbol, None)
+            self.arrays.remove(ship_symbol)
+            self.index.remove(ship_symbol)
+
+    def touch(self, ship_symbol, name):
+        """Marks the field name for the Ship as updated from the server"""
+        self._updated.setdefault(ship_symbol, {})[name] = datetime.now(
+            timezone.utc
+        )
+
+    def invalidate(self, ship_symbol, name):
+        """
+        Marks the field name for the Ship as stale. Used when the Library
+        had to estimate a field locally instead of reading it from a response
+        """
+        self._updated.get(ship_symbol, {}).pop(name, None)
+
+    def last_updated(self, ship_symbol, name):
+        """
+        Returns the datetime the Ship's field was last set from a server
+        response or None if it has never been set or has been invalidated
+        """
+        return self._updated.get(ship_symbol, {}).get(name)
+
+    def is_stale(self, ship_symbol, name, max_age=60):
+        """
+        Returns True if the Ship's field has not been set from a server
+        response in the past max_age seconds; else, False
+
+        Args:
+            ship_symbol: The symbol of the Ship
+            name: The top-level field, e.g., 'nav', 'fuel', 'cargo'
+
+        Kwargs:
+            max_age: Number of seconds before a field is stale. Default is 60
+        """
+        if (updated := self.last_updated(ship_symbol, name)) is None:
+            return True
+        delta = datetime.now(timezone.utc) - updated
+        return delta.total_seconds() > max_age
+
+
+class FleetState:
+
+    """
+    Struct-of-arrays view of the Ships in a ShipStateStore
+
+    Positions, fuel, cargo, cooldown expiration, arrival, and nav status are
+    kept in contiguous arrays indexed by Ship, so fleet-wide questions like
+    "all Ships within R of a Waypoint with less than half their cargo" are
+    answered without touching each Ship. The arrays are kept in sync from the
+    same action responses that update the ShipStateStore
+
+    Queries are vectorized with NumPy if it is installed; otherwise, they
+    fall back to pure Python over the same arrays
+    """
+
+    NAV_STATUSES = ('DOCKED', 'IN_ORBIT', 'IN_TRANSIT')
+
+    # column: array typecode
+    COLUMNS = {
+        'x': 'd',
+        'y': 'd',
+        'fuel_current': 'd',
+        'fuel_capacity': 'd',
+        'cargo_units': 'd',
+        'cargo_capacity': 'd',
+        'cooldown': 'd',
+        'arrival': 'd',
+        'status': 'b',
+    }
+
+    def __init__(self, states):
+        self.states = states
+        self.lock = states.lock
+        self.symbols = []
+        self.systems = []
+        self.waypoints = []
+        self.index = {}
+        self.columns = {k: array.array(v) for k, v in self.COLUMNS.items()}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.states!r})'
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def update(self, ship):
+        """
+        Writes the Ship's current state to its row, adding a row if needed
+
+        Args:
+            ship: Ship
+        """
+        nav = ship.nav
+        row = {
+            'x': nav.route.destination.x or 0,
+            'y': nav.route.destination.y or 0,
+            'fuel_current': ship.fuel.current or 0,
+            'fuel_capacity': ship.fuel.capacity or 0,
+            'cargo_units': ship.cargo.units or 0,
+            'cargo_capacity': ship.cargo.capacity or 0,
+            'cooldown': timestamp(ship.cooldown.expiration),
+            'arrival': timestamp(nav.route.arrival),
+            'status': self.status_code(nav.status),
+        }
+        with self.lock:
+            if (index := self.index.get(ship.symbol)) is None:
+                self.index[ship.symbol] = len(self.symbols)
+                self.symbols.append(ship.symbol)
+                self.systems.append(nav.system_symbol)
+                self.waypoints.append(nav.waypoint_symbol)
+                for name, column in self.columns.items():
+                    column.append(row[name])
+            else:
+                self.systems[index] = nav.system_symbol
+                self.waypoints[index] = nav.waypoint_symbol
+                for name, column in self.columns.items():
+                    column[index] = row[name]
+
+    def remove(self, ship_symbol):
+        """Removes the Ship's row by moving the last row into its place"""
+        with self.lock:
+            if (index := self.index.pop(ship_symbol, None)) is None:
+                return
+            last = len(self.symbols) - 1
+            if index != last:
+                for values in (self.symbols, self.systems, self.waypoints):
+                    values[index] = values[last]
+                for column in self.columns.values():
+                    column[index] = column[last]
+                self.index[self.symbols[index]] = index
+            for values in (self.symbols, self.systems, self.waypoints):
+                values.pop()
+            for column in self.columns.values():
+                column.pop()
+
+    def status_code(self, status):
+        try:
+            return self.NAV_STATUSES.index(status)
+        except ValueError:
+            return -1
+
+    def query(
+        self,
+        *,
+        near=None,
+        radius=None,
+        min_cargo=None,
+        max_cargo=None,
+        min_fuel=None,
+        max_fuel=None,
+        status=None,
+        ready=None,
+    ):
+        """
+        Returns the Ships matching every supplied filter
+
+        Cargo and fuel filters are ratios of current / capacity between 0 and
+        1. Ships without a cargo hold or fuel tank count as full
+
+        >>> agent.fleet.arrays.query(near=asteroid, radius=50, max_cargo=.5)
+
+        Kwargs:
+            near: Waypoint. Only Ships in its System. Default is None
+            radius: Only Ships within radius of near. Default is None
+            min_cargo: Minimum cargo ratio. Default is None
+            max_cargo: Maximum cargo ratio, exclusive. Default is None
+            min_fuel: Minimum fuel ratio. Default is None
+            max_fuel: Maximum fuel ratio, exclusive. Default is None
+            status: Nav status, e.g., 'DOCKED'. Default is None
+            ready: If True, only Ships that have arrived and are not in a
+                   cooldown; if False, only Ships that are not ready.
+                   Default is None
+
+        Blocks:
+            False
+
+        Returns:
+            list: Ships
+        """
+        if near is not None:
+            near = (near.system_symbol, near.x, near.y)
+        with self.lock:
+            if numpy is not None:
+                matches = numpy.flatnonzero(
+                    self._mask(
+                        near, radius, min_cargo, max_cargo, min_fuel,
+                        max_fuel, status, ready,
+                    )
+                )
+            else:  # pragma: no cover
+                matches = self._python_matches(
+                    near, radius, min_cargo, max_cargo, min_fuel,
+                    max_fuel, status, ready,
+                )
+            symbols = [self.symbols[i] for i in matches]
+        return [self.states.get(i) for i in symbols]
+
+    def closest(self, waypoint, **filters):
+        """
+        Returns the Ship in the Waypoint's System closest to the Waypoint
+
+        Args:
+            waypoint: Waypoint or Waypoint subclass
+
+        Kwargs:
+            **filters: Any kwarg accepted by FleetState.query
+
+        Returns:
+            Ship if a Ship matches; else, None
+        """
+        ships = self.query(near=waypoint, **filters)
+        return min(
+            ships,
+            key=lambda x: utils.calculate_distance(x, waypoint),
+            default=None,
+        )
+
+    def full(self):
+        """Returns the Ships whose cargo is at capacity"""
+        return self.query(min_cargo=1)
+
+    def needs_fuel(self, threshold=.25):
+        """Returns the Ships with less than threshold of their fuel"""
+        return self.query(max_fuel=threshold)
+
+    def _mask(
+        self, near, radius, min_cargo, max_cargo, min_fuel, max_fuel,
+        status, ready,
+    ):
+        cols = {
+            k: numpy.frombuffer(v, dtype=numpy.float64 if k != 'status'
+                                else numpy.int8)
+            for k, v in self.columns.items()
+        }
+        mask = numpy.ones(len(self.symbols), dtype=bool)
+        if near is not None:
+            system, x, y = near
+            mask &= numpy.fromiter(
+                (i == system for i in self.systems), bool, len(self.systems)
+            )
+            if radius is not None:
+                mask &= numpy.hypot(cols['x'] - x, cols['y'] - y) <= radius
+        if min_cargo is not None or max_cargo is not None:
+            cargo = ratio_array(cols['cargo_units'], cols['cargo_capacity'])
+            if min_cargo is not None:
+                mask &= cargo >= min_cargo
+            if max_cargo is not None:
+                mask &= cargo < max_cargo
+        if min_fuel is not None or max_fuel is not None:
+            fuel = ratio_array(cols['fuel_current'], cols['fuel_capacity'])
+            if min_fuel is not None:
+                mask &= fuel >= min_fuel
+            if max_fuel is not None:
+                mask &= fuel < max_fuel
+        if status is not None:
+            mask &= cols['status'] == self.status_code(status)
+        if ready is not None:
+            now = time.time()
+            in_transit = cols['status'] == self.status_code('IN_TRANSIT')
+            is_ready = (
+                ~(in_transit & (cols['arrival'] > now)) &
+                (cols['cooldown'] <= now)
+            )
+            mask &= is_ready if ready else ~is_ready
+        return mask
+
+    def _python_matches(
+        self, near, radius, min_cargo, max_cargo, min_fuel, max_fuel,
+        status, ready,
+    ):  # pragma: no cover
+        cols = self.columns
+        now = time.time()
+        status = self.status_code(status) if status is not None else None
+        in_transit = self.status_code('IN_TRANSIT')
+        for i in range(len(self.symbols)):
+            if near is not None:
+                system, x, y = near
+                if self.systems[i] != system:
+                    continue
+                if radius is not None:
+                    dist = math.hypot(cols['x'][i] - x, cols['y'][i] - y)
+                    if dist > radius:
+                        continue
+            cargo = ratio(cols['cargo_units'][i], cols['cargo_capacity'][i])
+            if min_cargo is not None and cargo < min_cargo:
+                continue
+            if max_cargo is not None and cargo >= max_cargo:
+                continue
+            fuel = ratio(cols['fuel_current'][i], cols['fuel_capacity'][i])
+            if min_fuel is not None and fuel < min_fuel:
+                continue
+            if max_fuel is not None and fuel >= max_fuel:
+                continue
+            if status is not None and cols['status'][i] != status:
+                continue
+            if ready is not None:
+                is_ready = cols['cooldown'][i] <= now and not (
+                    cols['status'][i] == in_transit and
+                    cols['arrival'][i] > now
+                )
+                if is_ready != ready:
+                    continue
+            yield i
+
+
+class FleetIndex:
+
+    """
+    Indexes of the Ships in a ShipStateStore by frame, role, mount, current
+    Waypoint, and nav status
+
+    Kept in sync from the same responses that update the ShipStateStore.
+    See Fleet.snapshot
+    """
+
+    FIELDS = ('frame', 'role', 'mount', 'waypoint', 'status')
+
+    def __init__(self, states):
+        self.states = states
+        self.lock = states.lock
+        self.indexes = {k: collections.defaultdict(set) for k in self.FIELDS}
+        self._keys = {}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.states!r})'
+
+    def __len__(self):
+        return len(self._keys)
+
+    def update(self, ship):
+        """Re-indexes the Ship under its current values"""
+        data = ship._data
+        keys = {
+            'frame': {raw(data.get('frame'), 'symbol')},
+            'role': {raw(data.get('registration'), 'role')},
+            'mount': {raw(i, 'symbol') for i in data.get('mounts') or []},
+            'waypoint': {raw(data.get('nav'), 'waypointSymbol')},
+            'status': {raw(data.get('nav'), 'status')},
+        }
+        with self.lock:
+            self.remove(ship.symbol)
+            for field, values in keys.items():
+                for value in values:
+                    if value is not None:
+                        self.indexes[field][value].add(ship.symbol)
+            self._keys[ship.symbol] = keys
+
+    def remove(self, ship_symbol):
+        """Removes the Ship from every index"""
+        with self.lock:
+            if (keys := self._keys.pop(ship_symbol, None)) is None:
+                return
+            for field, values in keys.items():
+                index = self.indexes[field]
+                for value in values:
+                    if value is not None:
+                        index[value].discard(ship_symbol)
+                        if not index[value]:
+                            del index[value]
+
+    def select(self, **filters):
+        """
+        Returns the Ships matching every filter, in the order they were
+        first seen
+
+        Each filter is either the exact value or a callable that accepts
+        the value and returns True to match
+
+        >>> agent.fleet.snapshot().select(
+        ...     frame='FRAME_DRONE',
+        ...     mount=lambda x: x.startswith('MOUNT_MINING_LASER_'),
+        ...     status='IN_ORBIT',
+        ... )
+
+        Kwargs:
+            frame: Frame symbol, e.g., 'FRAME_DRONE'
+            role: Registration role, e.g., 'EXCAVATOR'
+            mount: Any installed Mount symbol
+            waypoint: Current Waypoint symbol
+            status: Nav status, e.g., 'DOCKED'
+
+        Returns:
+            list: Ships
+        """
+        for field in filters:
+            if field not in self.FIELDS:
+                raise exceptions.SpaceAttributeError(
+                    f'{field!r} is not an indexed field. '
+                    f'Acceptable fields are {self.FIELDS}'
+                )
+        dead_ships = self.states.agent.dead_ships
+        with self.lock:
+            matches = None
+            for field, wanted in filters.items():
+                index = self.indexes[field]
+                if callable(wanted):
+                    symbols = set()
+                    for value, value_symbols in index.items():
+                        if wanted(value):
+                            symbols |= value_symbols
+                else:
+                    symbols = index.get(wanted, set())
+                matches = symbols if matches is None else matches & symbols
+            return [
+                ship for symbol, ship in self.states._ships.items()
+                if (matches is None or symbol in matches) and
+                symbol not in dead_ships
+            ]
+
+    def values(self, field):
+        """Returns the number of Ships for each value of the field"""
+        with self.lock:
+            return {k: len(v) for k, v in self.indexes[field].items()}
+
+
+def async_action(name):
+    """
+    Returns a Ship method that queues Ship.<name> on the Agent's Scheduler
+
+    Composite actions with a Ship.<name>_steps are queued step by step
+    with Scheduler.enqueue_task, so a step that has to wait is resumed on
+    its own instead of the action starting over. The Scheduler is started
+    if it is not already running
+    """
+
+    def action(self, *args, **kwargs):
+        scheduler = self.agent.scheduler
+        if (steps := getattr(self, f'{name}_steps', None)) is not None:
+            future = scheduler.enqueue_task(self, steps(*args, **kwargs))
+        else:
+            future = scheduler.enqueue(
+                self, getattr(self, name), *args, **kwargs
+            )
+        # A second worker keeps a request queued behind the one in flight
+        scheduler.start(workers=2)
+        return future
+
+    action.__name__ = f'{name}_async'
+    action.__qualname__ = f'Ship.{name}_async'
+    action.__doc__ = (
+        f"""
+        Queues Ship.{name} on the Agent's Scheduler and returns right away
+
+        Actions queued for the same Ship run in order. See Scheduler.enqueue
+
+        Returns:
+            Future: Resolves to what Ship.{name} returns
+        """
+    )
+    return action
+
+
+def run_steps(steps):
+    """
+    Runs the steps of a composite action in the current thread
+
+    Each callable the generator yields is called, and its return value is
+    sent back into the generator, or its exception thrown into it
+
+    Args:
+        steps: generator, e.g., Ship.autopilot_steps(waypoint)
+
+    Returns:
+        The generator's return value
+    """
+    value = error = None
+    while True:
+        try:
+            if error is not None:
+                step = steps.throw(error)
+            else:
+                step = steps.send(value)
+        except StopIteration as e:
+            return e.value
+        try:
+            value, error = step(), None
+        except exceptions.WaitRequiredError:
+            # The Scheduler runs the whole action again after the wait
+            steps.close()
+            raise
+        except Exception as e:
+            value, error = None, e
 
 
 class Ship(utils.AbstractJSONItem):
@@ -128,6 +1056,20 @@ class Ship(utils.AbstractJSONItem):
         self.agent = agent
         self._data = ship_data
 
+    def update_data_item(self, name, value):
+        """Updates top-level items found in the `_data` dict and records
+        the field as fresh in agent.fleet.states.
+        Not intended to be used by a user."""
+        super().update_data_item(name, value)
+        if self.agent is not None:
+            states = self.agent.fleet.states
+            # Detached copies, e.g., unpickled or built directly, must not
+            # mark the shared Ship's fields as fresh
+            if states.get(self.symbol) is self:
+                states.touch(self.symbol, name)
+                states.arrays.update(self)
+                states.index.update(self)
+
     @property
     def arrival(self):
         """
@@ -353,6 +1295,7 @@ class Ship(utils.AbstractJSONItem):
         current_nav = self.nav.to_dict()
         current_nav['status'] = 'IN_ORBIT'
         self.update_data_item('nav', current_nav)
+        self.agent.fleet.states.invalidate(self.symbol, 'nav')
 
     def closest(self, *iterables):
         """
@@ -369,11 +1312,10 @@ class Ship(utils.AbstractJSONItem):
             Waypoint or Waypoint subclass if *iterables return at least one
             Waypoint or Waypoint subclass; else, None
         """
-        return min(
-            (i for i in itertools.chain(*iterables)),
-            key=self.distance,
-            default=None
-        )
+        waypoints = list(itertools.chain(*iterables))
+        if waypoints:
+            table = utils.distance_table(waypoints)
+            return waypoints[table.closest(*utils.position(self))]
 
     def farthest(self, *iterables):
         """
@@ -390,11 +1332,61 @@ class Ship(utils.AbstractJSONItem):
             Waypoint or Waypoint subclass if *iterables return at least one
             Waypoint or Waypoint subclass; else, None
         """
-        return max(
-            (i for i in itertools.chain(*iterables)),
-            key=self.distance,
-            default=None
+        waypoints = list(itertools.chain(*iterables))
+        if waypoints:
+            table = utils.distance_table(waypoints)
+            return waypoints[table.farthest(*utils.position(self))]
+
+    def fastest(self, *iterables, flight_mode=None):
+        """
+        Iterates over supplied *iterables and returns the Waypoint the Ship
+        can reach soonest with the fuel on hand
+
+        Args:
+            *iterables: Waypoints or Waypoint subclass types
+
+        Kwargs:
+            flight_mode: Default is None to use the Ship's current flight mode
+
+        Blocks:
+            False
+
+        Returns:
+            Waypoint or Waypoint subclass if any can be reached directly;
+            else, None
+        """
+        estimates = (
+            (self.estimate(i, flight_mode=flight_mode), i)
+            for i in itertools.chain(*iterables)
         )
+        return min(
+            ((e.seconds, i) for e, i in estimates if e.feasible),
+            key=lambda x: x[0],
+            default=(None, None),
+        )[1]
+
+    def estimate(self, destination, flight_mode=None):
+        """
+        Returns the fuel and seconds it would take the Ship to navigate to
+        the destination, from the Ship's engine speed and the game's
+        navigation formulas. Nothing is sent to the server
+
+        >>> ship.estimate(asteroid, 'BURN')
+        Estimate(fuel=84, seconds=540, feasible=True)
+
+        Args:
+            destination: Waypoint or Waypoint subclass type
+
+        Kwargs:
+            flight_mode: Default is None to use the Ship's current flight mode
+
+        Blocks:
+            False
+
+        Returns:
+            snisp.navigation.Estimate
+        """
+        return navigation.estimate(self, destination, flight_mode=flight_mode)
 
     def distance(self, destination):
         """Returns the distance between the Ship and Waypoint
@@ -425,6 +1417,52 @@ class Ship(utils.AbstractJSONItem):
         """
         return self.closest(self.markets.fuel_stations())
 
+    def batch(self, *actions):
+        """
+        Runs the actions in order with the fewest docks and orbits
+
+        The transitions are planned up front from the Ship's nav status
+        with snisp.decorators.plan_transitions, so consecutive docked
+        actions share one dock and consecutive actions in orbit share one
+        orbit
+
+        >>> ship.batch(
+        ...     functools.partial(ship.sell, 'IRON_ORE', 30),
+        ...     functools.partial(ship.purchase, 'FUEL', 5),
+        ...     ship.refuel,
+        ...     functools.partial(ship.navigate, asteroid),
+        ... )
+
+        Args:
+            actions: Ship methods, or functools.partials of them, that take
+                     no further arguments
+
+        Blocks:
+            True: Until every action is done
+
+        Returns:
+            list: What each action returned
+        """
+        return run_steps(self.batch_steps(*actions))
+
+    def batch_steps(self, *actions):
+        """
+        Yields the transitions and actions of batch one at a time, for
+        Scheduler.spawn or yield from in a task
+
+        An action that has to wait is resumed on its own, so the actions
+        before it are not run again. See batch
+        """
+        transitions = decorators.plan_transitions(self.nav.status, actions)
+        output = []
+        for action, status in zip(actions, transitions):
+            if status == 'DOCKED':
+                yield self.dock
+            elif status == 'IN_ORBIT':
+                yield self.orbit
+            output.append((yield action))
+        return output
+
     @retry()
     @transit
     def dock(self):
@@ -568,6 +1606,7 @@ class Ship(utils.AbstractJSONItem):
             data = response.json()['data']
             self.update_data_item('cargo', data['cargo'])
             self.update_data_item('mounts', data['mounts'])
+            self.agent.ledger.record(data.get('agent'))
             logger.info(
                 f'{self.registration.role}: {self.symbol} | '
                 f'Installed mount {data["transaction"]["tradeSymbol"]} '
@@ -635,128 +1674,167 @@ class Ship(utils.AbstractJSONItem):
         waypoint,
         flight_mode='BURN',
         done_callback=None,
+        refuel_policy=None,
     ):
         """
         Navigates the Ship to the destination Waypoint.
 
         The method will block until the Ship has reached the destination.
 
-        The method will automatically attempt to refuel and modify the Ship's
-        flight_mode as needed.
+        The route is planned before the Ship departs with
+        snisp.navigation.plan_route, so the Ship only stops at the Fuel
+        Stations it needs, refuels only where the next leg requires it, and
+        never attempts a navigate it does not have the fuel for. Legs that
+        cannot be flown in flight_mode fall back to slower flight modes.
+        How much Fuel is bought at each stop, and where, is decided by the
+        refuel_policy
 
         done_callback accepteds a callback function that will be performed
         before returning control to the thread
 
-        Failed attempts to reach intermediate Waypoints or refuel attempts
-        will be logged at level INFO
-
-        Ships that cannot reach their destinations will be added to the Ship's
-        agent.dead_ships dictionary. Dead Ships will not be returned on further
-        agent.fleet iterations
-
         Args:
             waypoint: Waypoint or Waypoint subclass type
 
         Kwargs:
-            flight_mode: Starting flight_mode. Default is BURN
+            flight_mode: Fastest flight_mode to use. Default is BURN
             done_callback: callable() item that will be executed before
                            returning
+            refuel_policy: snisp.navigation.RefuelPolicy. Default is None
+                           for RefuelPolicy()
 
         Blocks:
             True: until Ship reaches destination
 
         Raises:
-            NavigateInsufficientFuelError: Ran out of Fuel
-        """
-        def navigate_to_next_waypoint():
-            for index, wp in enumerate(waypoints, start=1):
-                if wp.symbol == self.nav.waypoint_symbol:
-                    return False
-                if self.navigate(wp, raise_error=False):
-                    logger.info(
-                        f'{self.registration.role}: {self.symbol} | '
-                        f'Failed to navigate to {wp.symbol} | '
-                        f'{index}/{len(waypoints)}'
-                    )
-                else:
-                    self.refuel(ignore_errors=True)
-                    return True
-            return False
-
-        def drift_to_closest_fuel():
-            cur_wp = next(
-                (i for i in waypoints if i.symbol == self.nav.waypoint_symbol),
-                self.closest(waypoints)
-            )
-            try:
-                next_wp = waypoints[waypoints.index(cur_wp) - 1]
-            except IndexError:
-                next_wp = waypoints[0]
-            self.update_flight_mode('DRIFT')
-            if self.navigate(next_wp, raise_error=False):
-                return False
-            if self.refuel(ignore_errors=True):
-                return True
-            return False
+            NavigateInsufficientFuelError: The destination cannot be reached
+        """
+        return run_steps(self.autopilot_steps(
+            waypoint,
+            flight_mode=flight_mode,
+            done_callback=done_callback,
+            refuel_policy=refuel_policy,
+        ))
+
+    def autopilot_steps(
+        self,
+        waypoint,
+        flight_mode='BURN',
+        done_callback=None,
+        refuel_policy=None,
+    ):
+        """
+        Yields the steps of autopilot one request at a time, for
+        Scheduler.spawn or yield from in a task
 
+        A step that has to wait is resumed on its own, so autopilot does
+        not start over after every wait. See autopilot for the arguments
+        """
         if self.nav.waypoint_symbol == waypoint.symbol:
             return
 
+        if refuel_policy is None:
+            refuel_policy = navigation.RefuelPolicy()
         starting_flight_mode = self.nav.flight_mode
-        current_nav = self.nav.to_dict()
-        current_nav['status'] = 'IN_TRANSIT'
-        self.update_data_item('nav', current_nav)
-        if starting_flight_mode != flight_mode:
-            self.update_flight_mode(flight_mode)
-        self.refuel(ignore_errors=True)
-        self.orbit()
-
-        # Can make it to the dest as is. No need to do anything else
-        if not self.navigate(waypoint, raise_error=False):
-            if self.nav.flight_mode != starting_flight_mode:
-                self.update_flight_mode(starting_flight_mode)
-            self.refuel(ignore_errors=True)
-            self.orbit()
-            if callable(done_callback):
-                done_callback()
-            return
-
-        waypoints = sorted(
-            self.markets.fuel_stations(),
-            key=lambda x: utils.calculate_waypoint_distance(waypoint, x)
+        route = yield functools.partial(
+            navigation.plan_route, self, waypoint, flight_mode=flight_mode
         )
-        waypoints.insert(0, waypoint)
-
-        while True:
-            if navigate_to_next_waypoint():
-                if self.nav.waypoint_symbol == waypoint.symbol:
-                    # Reached destination
-                    self.orbit()
-                    if self.nav.flight_mode != starting_flight_mode:
-                        self.update_flight_mode(starting_flight_mode)
-                    if callable(done_callback):
-                        done_callback()
-                    return
-                else:
-                    # A waypoint on the chain was reached
-                    # Ship has been refueled
-                    # Retry with default flight_mode
-                    self.update_flight_mode(flight_mode)
+        refuels = refuel_policy.plan(self, route)
+        for leg, refuel in zip(route.legs, refuels):
+            if refuel is not None:
+                yield functools.partial(
+                    self.refuel,
+                    units=refuel.units,
+                    from_cargo=refuel.from_cargo,
+                )
+            yield functools.partial(self.update_flight_mode, leg.flight_mode)
+            yield functools.partial(self.navigate, leg.waypoint)
+        yield functools.partial(self.update_flight_mode, starting_flight_mode)
+        if (refuel := refuel_policy.arrive(self, waypoint)) is not None:
+            yield functools.partial(
+                self.refuel, units=refuel.units, from_cargo=refuel.from_cargo
+            )
+        yield self.orbit
+        if callable(done_callback):
+            yield done_callback
+
+    def travel(
+        self,
+        waypoint,
+        flight_mode='BURN',
+        done_callback=None,
+        refuel_policy=None,
+    ):
+        """
+        Sends the Ship to a Waypoint in any System
+
+        Waypoints in the Ship's System are reached with autopilot. Otherwise,
+        the Ship autopilots to its System's JumpGate and jumps along the
+        fewest gates to the destination System, waiting out each jump's
+        cooldown, before autopiloting to the Waypoint. If no gates connect
+        the Systems, Ships with a Warp Drive warp to the Waypoint instead,
+        in their current flight mode
+
+        Args:
+            waypoint: Waypoint or Waypoint subclass type
+
+        Kwargs:
+            flight_mode: Fastest flight_mode to use. Default is BURN
+            done_callback: callable() item that will be executed before
+                           returning
+            refuel_policy: snisp.navigation.RefuelPolicy for autopilot.
+                           Default is None for RefuelPolicy()
+
+        Blocks:
+            True: until Ship reaches destination
+
+        Raises:
+            NavigateOutsideSystemError: The destination System cannot be
+                                        reached
+        """
+        return run_steps(self.travel_steps(
+            waypoint,
+            flight_mode=flight_mode,
+            done_callback=done_callback,
+            refuel_policy=refuel_policy,
+        ))
+
+    def travel_steps(
+        self,
+        waypoint,
+        flight_mode='BURN',
+        done_callback=None,
+        refuel_policy=None,
+    ):
+        """
+        Yields the steps of travel one request at a time, for
+        Scheduler.spawn or yield from in a task. See travel
+        """
+        if waypoint.system_symbol != self.nav.system_symbol:
+            gates = yield functools.partial(
+                navigation.plan_jumps, self, waypoint.system_symbol
+            )
+            if gates is not None:
+                yield from self.autopilot_steps(
+                    gates[0],
+                    flight_mode=flight_mode,
+                    refuel_policy=refuel_policy,
+                )
+                for gate in gates[1:]:
+                    yield functools.partial(self.jump, gate)
+            elif navigation.has_warp_drive(self):
+                yield functools.partial(self.warp, waypoint)
             else:
-                if self.nav.flight_mode == 'BURN':
-                    self.update_flight_mode('CRUISE')
-                elif self.nav.flight_mode == 'CRUISE':
-                    if drift_to_closest_fuel():
-                        self.update_flight_mode(flight_mode)
-                elif self.nav.flight_mode == 'DRIFT':
-                    raise exceptions.NavigateInsufficientFuelError
-                else:
-                    logger.warning(
-                        f'{self.registration.role}: {self.symbol} | '
-                        f'Unsupported flight_mode {self.nav.flight_mode!r}. '
-                        'Defaulting to DRIFT.'
-                    )
-                    self.update_flight_mode('DRIFT')
+                raise exceptions.NavigateOutsideSystemError(
+                    f'{self.symbol} cannot jump or warp from '
+                    f'{self.nav.system_symbol} to {waypoint.system_symbol}'
+                )
+        yield from self.autopilot_steps(
+            waypoint, flight_mode=flight_mode, refuel_policy=refuel_policy
+        )
+        # Waits out a warp that ended at the Waypoint
+        yield self.orbit
+        if callable(done_callback):
+            yield done_callback
 
     @retry()
     @transit
@@ -771,6 +1849,10 @@ class Ship(utils.AbstractJSONItem):
         Optional raise_error kwarg can suppress or raise Exceptions.
         Default is True
 
+        Navigates that the Ship does not have the fuel for, per
+        ship.estimate, raise NavigateInsufficientFuelError without
+        contacting the server
+
         Args:
             waypoint: Waypoint or Waypoint subclass type
 
@@ -787,7 +1869,14 @@ class Ship(utils.AbstractJSONItem):
         """
         if self.nav.waypoint_symbol == waypoint.symbol:
             return
+        expected = self.estimate(waypoint)
         try:
+            if not expected.feasible:
+                raise exceptions.NavigateInsufficientFuelError(
+                    f'{self.symbol} needs {expected.fuel:,} fuel to reach '
+                    f'{waypoint.symbol} via {self.nav.flight_mode} and has '
+                    f'{self.fuel.current:,}'
+                )
             response = self.agent.client.post(
                 f'/my/ships/{self.symbol}/navigate',
                 json={'waypointSymbol': waypoint.symbol}
@@ -800,6 +1889,7 @@ class Ship(utils.AbstractJSONItem):
         data = response.json()['data']
         self.update_data_item('fuel', data['fuel'])
         self.update_data_item('nav', data['nav'])
+        navigation.validate(self, expected)
         logger.info(
             f'{self.registration.role}: {self.symbol} | '
             f'Navigating to {waypoint.symbol} via '
@@ -853,7 +1943,6 @@ class Ship(utils.AbstractJSONItem):
             )
             return data
 
-    @transit
     def autopurchase(self, trade_symbol, max_units=0, buffer=200_000):
         """
         Purchases up to max_units of trade_symbol, depending on the Ship's
@@ -869,6 +1958,9 @@ class Ship(utils.AbstractJSONItem):
         agent.data.credits - buffer >= purchase price.
         To remove the buffer, just pass a 0
 
+        The credits are reconciled with agent.ledger once before buying;
+        the balance after each purchase comes from its response
+
         Args:
             trade_symbol: Symbol of item to purchase.
 
@@ -885,6 +1977,15 @@ class Ship(utils.AbstractJSONItem):
         Returns:
             Transactions:  List of successful Transactions or an empty list
         """
+        return run_steps(self.autopurchase_steps(
+            trade_symbol, max_units=max_units, buffer=buffer
+        ))
+
+    def autopurchase_steps(self, trade_symbol, max_units=0, buffer=200_000):
+        """
+        Yields the steps of autopurchase one request at a time, for
+        Scheduler.spawn or yield from in a task. See autopurchase
+        """
         trade_symbol = trade_symbol.upper()
         if trade_symbol not in utils.GOODS_TYPES:
             raise exceptions.SpaceAttributeError(
@@ -895,7 +1996,8 @@ class Ship(utils.AbstractJSONItem):
         if max_units <= 0:
             max_units = self.cargo.capacity
         transactions = []
-        market_data = self.markets()
+        yield functools.partial(decorators.satisfy, self, TRANSIT)
+        market_data = yield self.markets
         if not market_data:
             logger.warning(
                 f'{self.registration.role}: {self.symbol} | '
@@ -914,38 +2016,44 @@ class Ship(utils.AbstractJSONItem):
                 f'longer trading {trade_symbol}'
             )
             return transactions
+        # Reconciled once; each purchase records the new balance
+        yield self.agent.ledger.reconcile
+        while max_units > 0:
+            purchased = yield functools.partial(
+                self._purchase_next,
+                trade_symbol,
+                min(max_units, trade_volume),
+                buffer,
+            )
+            if purchased is None:
+                return transactions
+            buy_units, transaction = purchased
+            transactions.append(transaction)
+            max_units -= buy_units
+        return transactions
+
+    def _purchase_next(self, trade_symbol, max_units, buffer):
+        # One purchase of autopurchase, priced and paid under the lock
         with self.agent.lock:
-            while max_units > 0:
-                unit_price = None
-                for t_good in self.markets().trade_goods:
-                    if t_good.symbol == trade_symbol:
-                        unit_price = t_good.purchase_price
-                        break
-                if unit_price is None:
-                    logger.warning(
-                        f'Market {self.location.waypoint} no longer '
-                        f'trading {trade_symbol}'
-                    )
-                    return transactions
-                buy_units = max_units
-                if buy_units > trade_volume:
-                    buy_units = trade_volume
-                buy_units = min(
-                    buy_units,
-                    self.cargo.capacity - self.cargo.units
+            unit_price = None
+            for t_good in self.markets().trade_goods:
+                if t_good.symbol == trade_symbol:
+                    unit_price = t_good.purchase_price
+                    break
+            if unit_price is None:
+                logger.warning(
+                    f'Market {self.location.waypoint} no longer '
+                    f'trading {trade_symbol}'
                 )
-                if buy_units <= 0:
-                    return transactions
-                purchase_amount = buy_units * unit_price
-                cash = self.agent.data.credits
-                while purchase_amount > cash - buffer:
-                    buy_units -= 1
-                    if buy_units == 0:
-                        return transactions
-                    purchase_amount = buy_units * unit_price
-                transactions.append(self.purchase(trade_symbol, buy_units))
-                max_units -= buy_units
-        return transactions
+                return None
+            buy_units = min(
+                max_units,
+                self.cargo.capacity - self.cargo.units,
+                self.agent.ledger.affordable(unit_price, buffer=buffer),
+            )
+            if buy_units <= 0:
+                return None
+            return buy_units, self.purchase(trade_symbol, buy_units)
 
     @retry()
     @transit
@@ -980,6 +2088,7 @@ class Ship(utils.AbstractJSONItem):
             )
             data = response.json()['data']
             self.update_data_item('cargo', data['cargo'])
+            self.agent.ledger.record(data.get('agent'))
             logger.info(
                 f'{self.registration.role}: {self.symbol} | Purchased '
                 f'{data["transaction"]["units"]:,}'
@@ -1032,6 +2141,7 @@ class Ship(utils.AbstractJSONItem):
                 raise e
             data = response.json()['data']
             self.update_data_item('fuel', data['fuel'])
+            self.agent.ledger.record(data.get('agent'))
             if from_cargo:
                 cargo = self.to_dict()['cargo']
                 units = data['transaction']['units']
@@ -1041,6 +2151,12 @@ class Ship(utils.AbstractJSONItem):
                         if item['units'] == 0:
                             del cargo['inventory'][index]
                 self.update_data_item('cargo', cargo)
+            elif data['transaction'].get('pricePerUnit') is not None:
+                cache.insert_fuel_price(
+                    self.location.system,
+                    data['transaction']['waypointSymbol'],
+                    purchase_price=data['transaction']['pricePerUnit'],
+                )
             logger.info(
                 f'{self.registration.role}: {self.symbol} | Refueled '
                 f'{data["transaction"]["units"]:,} '
@@ -1054,7 +2170,7 @@ class Ship(utils.AbstractJSONItem):
     def refine(self, produce):
         """Refine Ore into a product
 
-        Converts 30 units of Ore into 1 inut of Product
+        Converts 30 units of Ore into 10 units of Product
 
         Args:
             produce: The symbol to produce. i.e., "IRON".
@@ -1076,20 +2192,22 @@ class Ship(utils.AbstractJSONItem):
         self.update_data_item('cooldown', data['cooldown'])
         logger.info(
             f'{self.registration.role}: {self.symbol} | Refined '
-            f'{data["produced"][0]["units"]:,} units of'
+            f'{data["produced"][0]["units"]:,} units of '
             f'{data["produced"][0]["tradeSymbol"]}'
         )
         return data
 
     @retry()
     def refresh(self):
-        """Returns a new Ship class object of the current ship
+        """Updates the Ship from the server
+
+        Every handle to the Ship shares the refreshed state
 
         Returns:
-            A new Ship instance from self
+            The shared Ship instance from agent.fleet.states
         """
         response = self.agent.client.get(f'/my/ships/{self.symbol}')
-        return Ship(self.agent, response.json()['data'])
+        return self.agent.fleet.states.update(response.json()['data'])
 
     @retry()
     @transit
@@ -1116,6 +2234,7 @@ class Ship(utils.AbstractJSONItem):
         data = response.json()['data']
         self.update_data_item('cargo', data['cargo'])
         self.update_data_item('mounts', data['mounts'])
+        self.agent.ledger.record(data.get('agent'))
         logger.info(
             f'{self.registration.role}: {self.symbol} | '
             'Removed mount {mount_symbol}'
@@ -1164,6 +2283,7 @@ class Ship(utils.AbstractJSONItem):
         self.update_data_item('frame', data['ship']['frame'])
         self.update_data_item('reactor', data['ship']['reactor'])
         self.update_data_item('engine', data['ship']['engine'])
+        self.agent.ledger.record(data.get('agent'))
         logger.info(
             f'{self.registration.role}: {self.symbol} | '
             f'Repaired ship for ${data["transaction"]["totalPrice"]:,.2f}'
@@ -1200,6 +2320,13 @@ class Ship(utils.AbstractJSONItem):
         for ship in data['ships']:
             yield Ship(self.agent, ship)
 
+    def scan_steps(self):
+        """
+        Yields scan as a single step for Scheduler.spawn or yield from in
+        a task, and returns the scanned Ships as a list
+        """
+        return (yield lambda: list(self.scan()))
+
     @retry()
     @transit
     @docked
@@ -1239,6 +2366,8 @@ class Ship(utils.AbstractJSONItem):
             f'/my/ships/{self.symbol}/scrap', json=payload
         )
         data = response.json()['data']
+        self.agent.fleet.states.remove(self.symbol)
+        self.agent.ledger.record(data.get('agent'))
         logger.info(
             f'{self.registration.role}: {self.symbol} | '
             f'Scraped ship for ${data["transaction"]["totalPrice"]:,.2f}'
@@ -1247,7 +2376,6 @@ class Ship(utils.AbstractJSONItem):
         self.agent.recent_transactions.appendleft(transaction)
         return transaction
 
-    @transit
     def sell_all(self, trade_symbol, units=0):
         """
         Sell goods from the Ship's cargo.
@@ -1265,7 +2393,15 @@ class Ship(utils.AbstractJSONItem):
         Returns:
             Transactions:  List of successful Transactions or an empty list
         """
+        return run_steps(self.sell_all_steps(trade_symbol, units=units))
+
+    def sell_all_steps(self, trade_symbol, units=0):
+        """
+        Yields the steps of sell_all one request at a time, for
+        Scheduler.spawn or yield from in a task. See sell_all
+        """
         transactions = []
+        yield functools.partial(decorators.satisfy, self, TRANSIT)
         units = int(units)
         if units <= 0:
             units = next(
@@ -1281,7 +2417,7 @@ class Ship(utils.AbstractJSONItem):
                     'is not currently in its cargo hold'
                 )
                 return transactions
-        market_data = self.markets()
+        market_data = yield self.markets
         if not market_data:
             logger.warning(
                 f'{self.registration.role}: {self.symbol} | '
@@ -1308,14 +2444,21 @@ class Ship(utils.AbstractJSONItem):
                 sell_units = trade_volume
             else:
                 units = 0
-            transactions.append(self.sell(trade_symbol, sell_units))
+            transactions.append((yield functools.partial(
+                self.sell, trade_symbol, sell_units
+            )))
         self.agent.recent_transactions.extendleft(transactions)
         return transactions
 
     def sell_off_cargo(self, trade_symbol=None):
         """
-        Sell all goods from the Ship's cargo. Will automatically navigate
-        to closest Market which sells the respective goods
+        Sell all goods from the Ship's cargo.
+
+        The whole hold is planned at once with
+        ship.markets.liquidation_plan, so the Ship makes as few stops as
+        possible, visits them nearest first, and sells at co-located
+        Markets together. Goods that no Market in the System buys are
+        jettisoned, as are goods a Market no longer buys on arrival
 
         Kwargs:
             trade_symbol: Good type. Symbol of item to sell otherwise sells
@@ -1327,25 +2470,34 @@ class Ship(utils.AbstractJSONItem):
         Returns:
             Transactions:  List of successful Transactions or an empty list
         """
+        return run_steps(self.sell_off_cargo_steps(trade_symbol))
 
+    def sell_off_cargo_steps(self, trade_symbol=None):
+        """
+        Yields the steps of sell_off_cargo one request at a time, for
+        Scheduler.spawn or yield from in a task. See sell_off_cargo
+        """
         transactions = []
-        for item in self.cargo.inventory:
-            if trade_symbol and item.symbol != trade_symbol:
-                continue
-            markets = (i for i in self.markets.imports(item.symbol))
-            if market := self.closest(markets):
-                self.autopilot(market)
-                last_transactions = self.sell_all(item.symbol, item.units)
-                if not last_transactions:
-                    self.jettison(item.symbol, item.units)
-                else:
+        plan = yield functools.partial(
+            self.markets.liquidation_plan, trade_symbol
+        )
+        for symbol, units in plan.jettison.items():
+            logger.info(
+                f'{self.registration.role}: {self.symbol} | '
+                f'No market buys {symbol}'
+            )
+            yield functools.partial(self.jettison, symbol, units)
+        for stop in plan.stops:
+            yield from self.autopilot_steps(stop.market)
+            for sale in stop.sales:
+                if last_transactions := (yield from self.sell_all_steps(
+                    sale.trade_symbol, sale.units
+                )):
                     transactions.extend(last_transactions)
-            else:
-                logger.info(
-                    f'{self.registration.role}: {self.symbol} | '
-                    f'No market buys {item.symbol}'
-                )
-                self.jettison(item.symbol, item.units)
+                else:
+                    yield functools.partial(
+                        self.jettison, sale.trade_symbol, sale.units
+                    )
         return transactions
 
     @retry()
@@ -1378,6 +2530,7 @@ class Ship(utils.AbstractJSONItem):
             )
             data = response.json()['data']
             self.update_data_item('cargo', data['cargo'])
+            self.agent.ledger.record(data.get('agent'))
             logger.info(
                 f'{self.registration.role}: {self.symbol} | '
                 f'Sold {data["transaction"]["units"]:,} '
@@ -1460,37 +2613,43 @@ class Ship(utils.AbstractJSONItem):
         #       transferring ship after the transfer is complete.
         data = response.json()['data']
         self.update_data_item('cargo', data['cargo'])
-        new_cargo = receive_ship.cargo.to_dict()
-        if not new_cargo.get('inventory'):
-            # Placeholder name and description
-            new_cargo['inventory'] = [
-                {
-                    'symbol': symbol,
-                    'units': units,
-                    'name': symbol,
-                    'description': symbol,
-                }
-            ]
-        else:
-            if exists := next(
-                (
-                    i for i in new_cargo['inventory']
-                    if i['symbol'] == symbol
-                ), None
-            ):
-                exists['units'] += units
-                new_cargo['units'] += units
-            else:
-                new_cargo['inventory'].append(
+        # Concurrent transfers into the same Ship must not overwrite
+        # each other's units
+        with self.agent.lock:
+            new_cargo = receive_ship.cargo.to_dict()
+            if not new_cargo.get('inventory'):
+                # Placeholder name and description
+                new_cargo['inventory'] = [
                     {
                         'symbol': symbol,
                         'units': units,
                         'name': symbol,
                         'description': symbol,
                     }
-                )
-                new_cargo['units'] += units
-        receive_ship.update_data_item('cargo', new_cargo)
+                ]
+                new_cargo['units'] = units
+            else:
+                if exists := next(
+                    (
+                        i for i in new_cargo['inventory']
+                        if i['symbol'] == symbol
+                    ), None
+                ):
+                    exists['units'] += units
+                    new_cargo['units'] += units
+                else:
+                    new_cargo['inventory'].append(
+                        {
+                            'symbol': symbol,
+                            'units': units,
+                            'name': symbol,
+                            'description': symbol,
+                        }
+                    )
+                    new_cargo['units'] += units
+            receive_ship.update_data_item('cargo', new_cargo)
+        # Placeholder names/descriptions are local estimates
+        self.agent.fleet.states.invalidate(receive_ship.symbol, 'cargo')
         logger.info(
             f'{self.registration.role}: {self.symbol} | '
             f'Transferred {units:,} of {symbol} '
@@ -1558,6 +2717,62 @@ class Ship(utils.AbstractJSONItem):
             )
             return data
 
+    # Non-blocking variants that return a Future. Gather with Fleet.gather
+    autopilot_async = async_action('autopilot')
+    autopurchase_async = async_action('autopurchase')
+    batch_async = async_action('batch')
+    dock_async = async_action('dock')
+    extract_async = async_action('extract')
+    extract_with_survey_async = async_action('extract_with_survey')
+    install_mount_async = async_action('install_mount')
+    jettison_async = async_action('jettison')
+    jump_async = async_action('jump')
+    navigate_async = async_action('navigate')
+    negotiate_contract_async = async_action('negotiate_contract')
+    orbit_async = async_action('orbit')
+    purchase_async = async_action('purchase')
+    refuel_async = async_action('refuel')
+    refine_async = async_action('refine')
+    remove_mount_async = async_action('remove_mount')
+    repair_async = async_action('repair')
+    scan_async = async_action('scan')
+    scrap_async = async_action('scrap')
+    sell_async = async_action('sell')
+    sell_all_async = async_action('sell_all')
+    sell_off_cargo_async = async_action('sell_off_cargo')
+    siphon_async = async_action('siphon')
+    transfer_async = async_action('transfer')
+    travel_async = async_action('travel')
+    update_flight_mode_async = async_action('update_flight_mode')
+    warp_async = async_action('warp')
+
+
+def raw(value, key):
+    """Returns key from a dict or from an item's data, if either exists"""
+    if value is None:
+        return None
+    if isinstance(value, utils.AbstractJSONItem):
+        value = value._data
+    return value.get(key)
+
+
+def timestamp(value):
+    """Returns the POSIX timestamp for an ISO datetime string or 0"""
+    if not value:
+        return 0
+    return dateutil.parser.parse(value).timestamp()
+
+
+def ratio(current, capacity):
+    """Returns current / capacity, where no capacity counts as full"""
+    return current / capacity if capacity else 1
+
+
+def ratio_array(current, capacity):
+    output = numpy.ones(len(current))
+    numpy.divide(current, capacity, out=output, where=capacity > 0)
+    return output
+
 
 class Extraction(utils.AbstractJSONItem):
 
@@ -24,6 +24,17 @@ MarketDataRecord = namedtuple(
     ]
 )
 
+Sale = namedtuple(
+    'Sale',
+    ('trade_symbol', 'units', 'trade_type', 'trade_volume', 'sell_price'),
+)
+SaleStop = namedtuple('SaleStop', ('market', 'sales'))
+LiquidationPlan = namedtuple('LiquidationPlan', ('stops', 'jettison'))
+
+# Where a sell price is not known, i.e., no Ship is at the Market, Markets
+# that import a good are expected to pay the most for it
+TRADE_TYPE_RANK = {'IMPORT': 2, 'EXCHANGE': 1, 'EXPORT': 0}
+
 
 class Markets:
 
@@ -119,6 +130,7 @@ class Markets:
         )
         if not data.get('tradeGoods'):
             data['tradeGoods'] = []
+        record_fuel_price(system_symbol, waypoint_symbol, data['tradeGoods'])
         return MarketData(self.agent, data)
 
     def cheapest(self, trade_symbol):
@@ -482,6 +494,32 @@ class Markets:
                     if exchange.symbol == trade_symbol:
                         yield market
 
+    def liquidation_plan(self, trade_symbol=None):
+        """
+        Plans where to sell the Ship's cargo
+
+        Each Market's data is fetched once for the whole hold, instead of
+        once per Market for every good
+
+        Kwargs:
+            trade_symbol: Only plan for this good. Default is None for
+                          everything in ship.cargo.inventory
+
+        Returns:
+            LiquidationPlan: See plan_liquidation
+        """
+        cargo = {}
+        for item in self.ship.cargo.inventory:
+            if trade_symbol and item.symbol != trade_symbol:
+                continue
+            cargo[item.symbol] = cargo.get(item.symbol, 0) + item.units
+        offers = []
+        if cargo:
+            for market in self:
+                if buys := market_buys(market.data, cargo):
+                    offers.append((market, buys))
+        return plan_liquidation(self.ship, cargo, offers)
+
     def fuel_stations(self, *, system_symbol=None, traits=None):
         """
         Finds all Waypoints in the system that allow refueling
@@ -562,6 +600,9 @@ class Market(utils.AbstractJSONItem):
         data['location'] = self.location
         if not data.get('tradeGoods'):
             data['tradeGoods'] = []
+        record_fuel_price(
+            self.location.system, self.symbol, data['tradeGoods']
+        )
         return MarketData(self.agent, data)
 
     @property
@@ -658,6 +699,7 @@ def best_market_pairs(ship, market_data, price_delta=0):
         for good in market.trade_goods:
             market_pairs.setdefault(good.symbol, []).append((market, good))
     output = []
+    pairs = []
     cache = {}
 
     for trade_symbol, markets in market_pairs.items():
@@ -699,9 +741,18 @@ def best_market_pairs(ship, market_data, price_delta=0):
                     e_market.location.waypoint
                 )
             ] = e_wp
+        pairs.append((trade_symbol, i_market, e_market, i_wp, e_wp))
+    if not pairs:
+        return []
+    waypoints = list(cache.values())
+    positions = {id(i): index for index, i in enumerate(waypoints)}
+    table = utils.distance_table(waypoints)
+    for trade_symbol, i_market, e_market, i_wp, e_wp in pairs:
         output.append(
             MarketDataRecord(
-                distance=utils.calculate_waypoint_distance(i_wp, e_wp),
+                distance=table.distance(
+                    positions[id(i_wp)], positions[id(e_wp)]
+                ),
                 trade_symbol=trade_symbol,
                 import_market=i_market,
                 export_market=e_market,
@@ -712,6 +763,198 @@ def best_market_pairs(ship, market_data, price_delta=0):
     return sorted(output, key=market_delta_sort_key, reverse=True)
 
 
+def market_buys(market_data, cargo):
+    """
+    Returns the goods in cargo that the Market buys
+
+    Args:
+        market_data: The Market's MarketData
+        cargo: dict of {trade_symbol: units}
+
+    Returns:
+        dict: {trade_symbol: Sale}. trade_volume and sell_price are None
+              unless a Ship is at the Market
+    """
+    listed = {}
+    for trade_type, goods in (
+        ('IMPORT', market_data.imports),
+        ('EXCHANGE', market_data.exchange),
+        ('EXPORT', market_data.exports),
+    ):
+        for good in goods or []:
+            if good.symbol in cargo:
+                listed.setdefault(good.symbol, trade_type)
+    output = {}
+    for trade_symbol, trade_type in listed.items():
+        trade_volume = sell_price = None
+        for good in market_data.trade_goods or []:
+            if good.symbol == trade_symbol:
+                if sell_price is None or good.sell_price > sell_price:
+                    trade_volume = good.trade_volume
+                    sell_price = good.sell_price
+        output[trade_symbol] = Sale(
+            trade_symbol,
+            cargo[trade_symbol],
+            trade_type,
+            trade_volume,
+            sell_price,
+        )
+    return output
+
+
+def record_fuel_price(system_symbol, waypoint_symbol, trade_goods):
+    """
+    Caches the FUEL prices from a Market's trade goods
+
+    Read by navigation.RefuelPolicy to choose where to refuel
+
+    Args:
+        system_symbol: The Market's System symbol
+        waypoint_symbol: The Market's Waypoint symbol
+        trade_goods: The raw tradeGoods of the MarketData
+    """
+    for good in trade_goods:
+        if good.get('symbol') == 'FUEL':
+            cache.insert_fuel_price(
+                system_symbol,
+                waypoint_symbol,
+                good.get('purchasePrice'),
+                good.get('sellPrice'),
+            )
+
+
+def sell_prices(market_data, trade_symbols=None):
+    """
+    Returns the best price each good sells for across the Markets
+
+    Only Markets with a Ship or Probe present report prices
+
+    Args:
+        market_data: Iterable of MarketDatas
+
+    Kwargs:
+        trade_symbols: Only these goods. Default is None for every good
+
+    Returns:
+        dict: {trade_symbol: sell_price}
+    """
+    output = {}
+    for market in market_data:
+        for good in market.trade_goods or []:
+            if trade_symbols is not None and good.symbol not in trade_symbols:
+                continue
+            if good.sell_price > output.get(good.symbol, 0):
+                output[good.symbol] = good.sell_price
+    return output
+
+
+def plan_liquidation(ship, cargo, offers):
+    """
+    Plans the visit order and per-Market sales to sell off cargo
+
+    Markets at the same coordinates, e.g., a planet and its orbitals, are
+    visited together. Stops are chosen greedily to cover the most goods
+    each, preferring the best known sell prices and then the closest
+    stop, and are visited nearest first. A Market that exports a good
+    without a known sell price is only used if no other Market imports,
+    exchanges, or reports a price for it. Goods that no Market buys are
+    jettisoned
+
+    Args:
+        ship: Ship
+        cargo: dict of {trade_symbol: units}
+        offers: list of (Market, market_buys(...)) for Markets that buy any
+                of the cargo
+
+    Returns:
+        LiquidationPlan: stops is a list of SaleStops in visit order,
+                         jettison is a dict of {trade_symbol: units}
+    """
+    sellable = set().union(*(buys for _, buys in offers))
+    jettison = {k: v for k, v in cargo.items() if k not in sellable}
+
+    def expected(sale):
+        # Worth a stop without knowing more about the other Markets
+        return sale.sell_price is not None or sale.trade_type != 'EXPORT'
+
+    better = {
+        trade_symbol
+        for _, buys in offers
+        for trade_symbol, sale in buys.items() if expected(sale)
+    }
+    offers = [
+        (market, {
+            k: v for k, v in buys.items() if k not in better or expected(v)
+        })
+        for market, buys in offers
+    ]
+    groups = {}
+    for market, buys in offers:
+        if buys:
+            groups.setdefault(utils.position(market), []).append(
+                (market, buys)
+            )
+    groups = list(groups.values())
+    if not groups:
+        return LiquidationPlan([], jettison)
+    table = utils.distance_table([i[0][0] for i in groups])
+    from_ship = table.from_point(*utils.position(ship))
+
+    def value(sale):
+        return (sale.sell_price or 0) * sale.units
+
+    def rank(sale):
+        return sale.sell_price or 0, TRADE_TYPE_RANK[sale.trade_type]
+
+    remaining = set(sellable)
+    chosen = {}
+    while remaining:
+        best = None
+        for index, group in enumerate(groups):
+            if index in chosen:
+                continue
+            covered = remaining & set().union(*(buys for _, buys in group))
+            if not covered:
+                continue
+            score = (
+                len(covered),
+                sum(
+                    max(value(b[i]) for _, b in group if i in b)
+                    for i in covered
+                ),
+                -float(from_ship[index]),
+            )
+            if best is None or score > best[0]:
+                best = (score, index, covered)
+        _, index, covered = best
+        sales = {}
+        for trade_symbol in covered:
+            market, buys = max(
+                (i for i in groups[index] if trade_symbol in i[1]),
+                key=lambda x: rank(x[1][trade_symbol]),
+            )
+            sales.setdefault(market.symbol, []).append(buys[trade_symbol])
+        chosen[index] = [
+            (market, sales[market.symbol])
+            for market, _ in groups[index] if market.symbol in sales
+        ]
+        remaining -= covered
+
+    # Nearest stop first
+    stops = []
+    distances = from_ship
+    unvisited = list(chosen)
+    while unvisited:
+        index = min(unvisited, key=lambda x: float(distances[x]))
+        unvisited.remove(index)
+        for market, sales in chosen[index]:
+            stops.append(SaleStop(
+                market, sorted(sales, key=lambda x: x.trade_symbol)
+            ))
+        distances = table.matrix[index]
+    return LiquidationPlan(stops, jettison)
+
+
 def market_delta_sort_key(market_record):
     """
     Returns the difference between the Sell Price and Purchase Price
@@ -0,0 +1,229 @@
+import collections
+import gc
+import logging
+import os
+import sys
+import tracemalloc
+
+from collections import namedtuple
+
+from snisp import cache, database, utils
+
+
+logger = logging.getLogger(__name__)
+
+
+MemoryReport = namedtuple('MemoryReport', ('models', 'caches', 'traced'))
+
+
+def start(nframes=1):
+    """
+    Starts tracing allocations with tracemalloc so that MemoryReports
+    include the Library's allocations by file
+
+    Tracing has a noticeable overhead and should only be enabled while
+    investigating
+
+    Kwargs:
+        nframes: Frames stored per allocation. Default is 1
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(nframes)
+
+
+def stop():
+    """Stops tracing allocations and frees the traces"""
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def report(agent=None, *, limit=10):
+    """
+    Returns the current memory usage of the Library
+
+    models are the bytes held by each model type, e.g., Ship or Waypoint,
+    counted once per object. caches are the bytes held by each in-process
+    cache and, if an agent is given, the Agent's own containers. traced is
+    only populated while tracing; see snisp.memory.start
+
+    >>> snisp.memory.report(agent).caches
+    {'fuel_stations': 48210, 'distance_tables': 9120, ...}
+
+    Kwargs:
+        agent: Agent to include. Default is None
+        limit: Number of traced files to include. Default is 10
+
+    Blocks:
+        False
+
+    Returns:
+        MemoryReport
+    """
+    return MemoryReport(
+        models=model_sizes(),
+        caches=cache_sizes(agent),
+        traced=traced_sizes(limit=limit),
+    )
+
+
+def model_sizes():
+    """
+    Returns the bytes held by each AbstractJSONItem type, largest first
+
+    Nested items are counted under their own type, not their parent's
+    """
+    output = collections.Counter()
+    for obj in gc.get_objects():
+        if isinstance(obj, utils.AbstractJSONItem):
+            output[type(obj).__name__] += item_sizeof(obj)
+    return dict(output.most_common())
+
+
+def cache_sizes(agent=None):
+    """Returns the bytes held by each in-process cache"""
+    with cache.DISTANCE_LOCK:
+        distance_tables = sizeof(cache.DISTANCE_TABLES)
+    with cache.ROUTE_LOCK:
+        route_plans = sizeof(cache.ROUTE_PLANS)
+    with cache.FUEL_PRICE_LOCK:
+        fuel_prices = sizeof(cache.FUEL_PRICES)
+    output = {
+        'fuel_stations': sizeof(cache.FUEL_STATIONS),
+        'fuel_prices': fuel_prices,
+        'jump_gates': sizeof(cache.JUMP_GATES),
+        'distance_tables': distance_tables,
+        'route_plans': route_plans,
+    }
+    try:
+        output['database'] = os.path.getsize(database.DATABASE)
+    except OSError:  # pragma: no cover
+        output['database'] = 0
+    if agent is not None:
+        with agent.fleet.states.lock:
+            output['fleet_states'] = sizeof(agent.fleet.states._ships)
+            output['fleet_arrays'] = sizeof(agent.fleet.arrays.columns)
+        output['dead_ships'] = sizeof(agent.dead_ships)
+        output['recent_transactions'] = sizeof(agent.recent_transactions)
+    return output
+
+
+def traced_sizes(limit=10):
+    """Returns (filename, bytes) for the Library's largest traced files"""
+    if not tracemalloc.is_tracing():
+        return []
+    package = os.path.dirname(os.path.abspath(__file__))
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        (tracemalloc.Filter(True, os.path.join(package, '*')),)
+    )
+    return [
+        (stat.traceback[0].filename, stat.size)
+        for stat in snapshot.statistics('filename')[:limit]
+    ]
+
+
+def set_caps(
+    agent=None,
+    *,
+    fuel_stations=None,
+    fuel_prices=None,
+    jump_gates=None,
+    distance_systems=None,
+    distance_tables=None,
+    route_systems=None,
+    route_plans=None,
+    recent_transactions=None,
+):
+    """
+    Sets the maximum size of each in-process cache
+
+    Caches that are over their new cap are trimmed, oldest first. Caps left
+    as None are unchanged
+
+    agent.dead_ships is not capped, as it keeps stranded Ships out of the
+    Fleet; dropping an entry would return that Ship to every recipe
+
+    Kwargs:
+        agent: Agent whose containers are capped. Default is None
+        fuel_stations: Systems with cached Fuel Stations
+        fuel_prices: Systems with cached FUEL prices
+        jump_gates: Systems with cached Jump Gates
+        distance_systems: Systems with cached DistanceTables
+        distance_tables: DistanceTables per System
+        route_systems: Systems with cached route plans
+        route_plans: Route plans per System
+        recent_transactions: agent.recent_transactions entries
+    """
+    if fuel_stations is not None:
+        cache.MAX_FUEL_STATIONS = int(fuel_stations)
+        cache.evict(cache.FUEL_STATIONS, cache.MAX_FUEL_STATIONS)
+    if fuel_prices is not None:
+        with cache.FUEL_PRICE_LOCK:
+            cache.MAX_FUEL_PRICES = int(fuel_prices)
+            cache.evict(cache.FUEL_PRICES, cache.MAX_FUEL_PRICES)
+    if jump_gates is not None:
+        cache.MAX_JUMP_GATES = int(jump_gates)
+        cache.evict(cache.JUMP_GATES, cache.MAX_JUMP_GATES)
+    with cache.DISTANCE_LOCK:
+        if distance_tables is not None:
+            cache.MAX_DISTANCE_TABLES = int(distance_tables)
+            for tables in cache.DISTANCE_TABLES.values():
+                cache.evict(tables, cache.MAX_DISTANCE_TABLES)
+        if distance_systems is not None:
+            cache.MAX_DISTANCE_SYSTEMS = int(distance_systems)
+            cache.evict(cache.DISTANCE_TABLES, cache.MAX_DISTANCE_SYSTEMS)
+    with cache.ROUTE_LOCK:
+        if route_plans is not None:
+            cache.MAX_ROUTE_PLANS = int(route_plans)
+            for plans in cache.ROUTE_PLANS.values():
+                cache.evict(plans, cache.MAX_ROUTE_PLANS)
+        if route_systems is not None:
+            cache.MAX_ROUTE_SYSTEMS = int(route_systems)
+            cache.evict(cache.ROUTE_PLANS, cache.MAX_ROUTE_SYSTEMS)
+    if agent is None:
+        return
+    with agent.lock:
+        if recent_transactions is not None:
+            agent.recent_transactions = collections.deque(
+                agent.recent_transactions, maxlen=int(recent_transactions)
+            )
+
+
+def item_sizeof(item):
+    # The item, its attribute cache, its data dict, and any values in its
+    # data that have not been converted into items of their own
+    size = sys.getsizeof(item) + sys.getsizeof(item._data)
+    if (attributes := getattr(item, '__dict__', None)) is not None:
+        size += sys.getsizeof(attributes)
+    for value in item._data.values():
+        if not isinstance(value, utils.AbstractJSONItem):
+            size += sizeof(value, skip_items=True)
+    return size
+
+
+def sizeof(obj, *, skip_items=False, seen=None):
+    """
+    Returns the size of obj and everything it contains, counting shared
+    objects once
+
+    Kwargs:
+        skip_items: Do not descend into AbstractJSONItems. Default is False
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, utils.AbstractJSONItem):
+        if skip_items:
+            return 0
+        return sys.getsizeof(obj) + sizeof(obj._data, seen=seen)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += sizeof(key, skip_items=skip_items, seen=seen)
+            size += sizeof(value, skip_items=skip_items, seen=seen)
+    elif isinstance(obj, (list, tuple, set, frozenset, collections.deque)):
+        for value in obj:
+            size += sizeof(value, skip_items=skip_items, seen=seen)
+    elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+        size += sizeof(vars(obj), skip_items=skip_items, seen=seen)
+    return size
@@ -0,0 +1,593 @@
+import collections
+import dateutil
+import heapq
+import itertools
+import logging
+import math
+
+from collections import namedtuple
+
+from snisp import cache, exceptions, utils
+
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds per unit of distance at an engine speed of 1, before the fixed
+# overhead of each hop
+FLIGHT_MODE_MULTIPLIERS = {
+    'BURN': 12.5,
+    'CRUISE': 25,
+    'STEALTH': 30,
+    'DRIFT': 250,
+}
+# Modes autopilot may fall back to, fastest first
+FALLBACK_FLIGHT_MODES = ('BURN', 'CRUISE', 'DRIFT')
+HOP_SECONDS = 15
+# Deepest jump-gate search plan_jumps makes by default
+MAX_JUMPS = 10
+# Fuel in the tank per unit of FUEL bought or held as cargo
+FUEL_UNITS_PER_GOOD = 100
+
+Leg = namedtuple(
+    'Leg', ('waypoint', 'flight_mode', 'distance', 'fuel', 'seconds', 'refuel')
+)
+Leg.__doc__ = """
+One navigate call of a Route
+
+refuel is True if the Ship must refuel before departing on the Leg
+"""
+
+Route = namedtuple('Route', ('legs', 'fuel', 'seconds'))
+Route.__doc__ = """Legs to reach a destination with their total fuel and seconds"""
+
+Refuel = namedtuple('Refuel', ('units', 'from_cargo'))
+Refuel.__doc__ = """
+One refuel call for Ship.refuel
+
+units is 0 to fill the tank. from_cargo is True to burn the FUEL in the
+Ship's cargo instead of buying it
+"""
+
+Estimate = namedtuple('Estimate', ('fuel', 'seconds', 'feasible'))
+Estimate.__doc__ = """
+The fuel and seconds a single navigate will take
+
+feasible is False if the Ship does not have the fuel on hand
+"""
+
+
+def game_round(value):
+    # Halves round up, unlike Python's round
+    return math.floor(value + .5)
+
+
+def fuel_cost(distance, flight_mode):
+    """
+    Returns the fuel a hop of distance costs in the flight_mode
+
+    Args:
+        distance: Distance between the two Waypoints
+        flight_mode: See snisp.utils.FLIGHT_MODES
+
+    Returns:
+        int
+    """
+    if flight_mode == 'DRIFT':
+        return 1
+    distance = max(1, game_round(distance))
+    if flight_mode == 'BURN':
+        return 2 * distance
+    return distance
+
+
+def travel_time(distance, speed, flight_mode):
+    """
+    Returns the seconds a hop of distance takes in the flight_mode
+
+    Args:
+        distance: Distance between the two Waypoints
+        speed: The Ship's engine speed
+        flight_mode: See snisp.utils.FLIGHT_MODES
+
+    Returns:
+        int
+    """
+    multiplier = FLIGHT_MODE_MULTIPLIERS[flight_mode]
+    return game_round(
+        max(1, game_round(distance)) * (multiplier / max(1, speed))
+        + HOP_SECONDS
+    )
+
+
+def estimate(ship, destination, flight_mode=None):
+    """
+    Returns the fuel and seconds for the Ship to navigate directly to the
+    destination, without contacting the server
+
+    Args:
+        ship: Ship
+        destination: Waypoint or Waypoint subclass in the Ship's System
+
+    Kwargs:
+        flight_mode: Default is None to use the Ship's current flight mode
+
+    Blocks:
+        False
+
+    Returns:
+        Estimate
+    """
+    flight_mode = flight_modes(flight_mode or ship.nav.flight_mode)[0]
+    distance = utils.calculate_distance(ship, destination)
+    fuel = fuel_cost(distance, flight_mode) if ship.fuel.capacity else 0
+    return Estimate(
+        fuel,
+        travel_time(distance, ship.engine.speed, flight_mode),
+        fuel <= ship.fuel.current,
+    )
+
+
+def validate(ship, expected):
+    """
+    Compares an Estimate with the Ship's nav.route and fuel after the
+    navigate it was made for
+
+    Mismatches are logged at level WARNING, as they mean the formulas no
+    longer follow the game's
+
+    Args:
+        ship: Ship that has just navigated
+        expected: Estimate made before navigating
+
+    Returns:
+        bool: True if the Estimate was correct; else, False
+    """
+    route = ship.nav.route
+    seconds = (
+        dateutil.parser.parse(route.arrival) -
+        dateutil.parser.parse(route.departure_time)
+    ).total_seconds()
+    fuel = ship.fuel.consumed.amount if ship.fuel.capacity else 0
+    if abs(seconds - expected.seconds) <= 1 and fuel == expected.fuel:
+        return True
+    logger.warning(
+        f'{ship.registration.role}: {ship.symbol} | Navigating to '
+        f'{route.destination.symbol} took {seconds:,.0f}s and {fuel:,} fuel. '
+        f'Estimated {expected.seconds:,}s and {expected.fuel:,} fuel'
+    )
+    return False
+
+
+def flight_modes(flight_mode):
+    """Returns flight_mode and the slower modes autopilot may fall back to"""
+    flight_mode = flight_mode.strip().upper()
+    if flight_mode not in utils.FLIGHT_MODES:
+        raise exceptions.SpaceAttributeError(
+            f'{flight_mode} is not an acceptable flight mode type. '
+            'See snisp.utils.FLIGHT_MODES for acceptable flight modes.'
+        )
+    if flight_mode in FALLBACK_FLIGHT_MODES:
+        return FALLBACK_FLIGHT_MODES[FALLBACK_FLIGHT_MODES.index(flight_mode):]
+    return (flight_mode, 'DRIFT')
+
+
+def plan_route(ship, destination, fuel_stations=None, flight_mode='BURN'):
+    """
+    Returns the fastest Route for the Ship to the destination
+
+    If the destination can be reached directly in flight_mode with the fuel
+    on hand, no Fuel Stations are looked up. Otherwise, the Route is found
+    with A* over the System's Fuel Stations, where every Fuel Station on the
+    way refuels the Ship and each hop uses the fastest of flight_mode and
+    the slower modes that the fuel allows
+
+    Routes over ship.markets.fuel_stations() are cached per System until
+    its Fuel Stations change, e.g., after Waypoints.chart, so identical
+    Ships repeating a trip do not search again
+
+    Args:
+        ship: Ship
+        destination: Waypoint or Waypoint subclass in the Ship's System
+
+    Kwargs:
+        fuel_stations: Iterable of Waypoints that sell Fuel. Default is None
+                       to use ship.markets.fuel_stations()
+        flight_mode: The fastest flight mode to use. Default is BURN
+
+    Raises:
+        NavigateInsufficientFuelError: The destination cannot be reached
+
+    Blocks:
+        False
+
+    Returns:
+        Route
+    """
+    modes = flight_modes(flight_mode)
+    capacity = ship.fuel.capacity
+    current = ship.fuel.current
+    speed = ship.engine.speed
+    origin = ship.nav.waypoint_symbol
+    direct = math.hypot(
+        *(i - j for i, j in zip(utils.position(ship), utils.position(
+            destination
+        )))
+    )
+    if not capacity or fuel_cost(direct, modes[0]) <= current:
+        leg = hop(destination, direct, speed, modes[:1], math.inf)
+        return Route([leg], leg.fuel if capacity else 0, leg.seconds)
+
+    cached = fuel_stations is None
+    if cached:
+        fuel_stations = ship.markets.fuel_stations()
+    fuel_stations = list(fuel_stations)
+    origin_sells_fuel = any(i.symbol == origin for i in fuel_stations)
+    fuel = capacity if origin_sells_fuel else current
+    # Everything the legs depend on. The fuel on hand only matters when the
+    # Ship cannot refuel before departing
+    key = (
+        origin,
+        destination.symbol,
+        capacity,
+        ship.engine.symbol,
+        speed,
+        modes[0],
+        fuel,
+    )
+    system = ship.location.system
+    legs = cache.get_route_plan(system, key) if cached else None
+    if legs is None:
+        legs = search(ship, destination, fuel_stations, modes, fuel)
+        if legs is None:
+            raise exceptions.NavigateInsufficientFuelError(
+                f'{ship.symbol} cannot reach {destination.symbol} from '
+                f'{origin} with {current:,}/{capacity:,} fuel'
+            )
+        if cached:
+            cache.insert_route_plan(system, key, legs)
+    return Route(
+        refuel_stops(legs, current, capacity, origin_sells_fuel),
+        sum(i.fuel for i in legs),
+        sum(i.seconds for i in legs),
+    )
+
+
+def search(ship, destination, fuel_stations, modes, fuel):
+    """
+    Returns the fastest Legs from the Ship to the destination with A*, or
+    None if there are none
+
+    fuel is what the Ship departs with. Every Fuel Station on the way
+    refuels the Ship
+    """
+    capacity = ship.fuel.capacity
+    speed = ship.engine.speed
+    origin = ship.nav.waypoint_symbol
+    points = [destination]
+    points.extend(
+        i for i in fuel_stations if i.symbol not in (destination.symbol, origin)
+    )
+    table = utils.distance_table(points)
+    from_origin = table.from_point(*utils.position(ship))
+    # Lower bound on the seconds left from each point
+    fastest = FLIGHT_MODE_MULTIPLIERS[modes[0]] / max(1, speed)
+    to_destination = [
+        max(0., (table.distance(i, 0) - .5) * fastest)
+        for i in range(len(points))
+    ]
+
+    # Nodes are -1 for the origin and indexes into points otherwise
+    seconds = {-1: 0}
+    previous = {}
+    heap = [(to_destination[0], 0, -1)]
+    while heap:
+        _, elapsed, node = heapq.heappop(heap)
+        if node == 0:
+            break
+        if elapsed > seconds.get(node, math.inf):
+            continue
+        if node == -1:
+            on_hand, distances = fuel, from_origin
+        else:
+            on_hand, distances = capacity, table.matrix[node]
+        for index in range(len(points)):
+            if index == node:
+                continue
+            leg = hop(
+                points[index], float(distances[index]), speed, modes, on_hand
+            )
+            if leg is None:
+                continue
+            total = elapsed + leg.seconds
+            if total < seconds.get(index, math.inf):
+                seconds[index] = total
+                previous[index] = (node, leg)
+                heapq.heappush(
+                    heap, (total + to_destination[index], total, index)
+                )
+    if 0 not in previous:
+        return None
+
+    legs = []
+    node = 0
+    while node != -1:
+        node, leg = previous[node]
+        legs.append(leg)
+    legs.reverse()
+    return tuple(legs)
+
+
+def hop(waypoint, distance, speed, modes, fuel):
+    """Returns the fastest Leg to waypoint that the fuel allows, or None"""
+    for flight_mode in modes:
+        if (cost := fuel_cost(distance, flight_mode)) <= fuel:
+            return Leg(
+                waypoint,
+                flight_mode,
+                distance,
+                cost,
+                travel_time(distance, speed, flight_mode),
+                False,
+            )
+    return None
+
+
+def refuel_stops(legs, current, capacity, origin_sells_fuel):
+    """
+    Marks the Legs that must refuel before departing
+
+    Every Leg after the first departs from a Fuel Station, as does the first
+    if origin_sells_fuel. Refueling is only marked where the fuel on hand
+    does not cover the Leg
+    """
+    output = []
+    fuel = current
+    for index, leg in enumerate(legs):
+        at_station = index > 0 or origin_sells_fuel
+        refuel = at_station and fuel < leg.fuel
+        if refuel:
+            fuel = capacity
+        fuel -= leg.fuel
+        output.append(leg._replace(refuel=refuel))
+    return output
+
+
+class RefuelPolicy:
+
+    """
+    Decides where autopilot refuels along a Route, and how much
+
+    Only the stops a Route departs from that sell Fuel are considered, so
+    Waypoints without Fuel are never sent a refuel. Each stop buys just
+    enough Fuel to reach the next stop on the Route that sells it cheaper,
+    or fills up for the rest of the Route if there is none, so the Fuel is
+    bought at the cheapest stops. Stops without a known price only refuel
+    when the next Leg needs it. FUEL in the Ship's cargo is burned instead
+    when it is worth less than the stop's price
+
+    Prices are the cached FUEL prices recorded whenever MarketData or a
+    refuel is seen, unless prices are passed
+
+    >>> policy = RefuelPolicy(top_up=False)
+    >>> ship.autopilot(waypoint, refuel_policy=policy)
+
+    Kwargs:
+        prices: dict of {waypoint_symbol: FUEL purchase price}. Default is
+                None to use the cached prices of the Ship's System
+        cargo_value: What a unit of FUEL in the cargo is worth. Default is
+                     None for the best known FUEL sell price in the System,
+                     and cargo FUEL is kept if there is none
+        top_up: If True, fill up at the destination when it sells the
+                cheapest known Fuel in the System. Default is True
+    """
+
+    def __init__(self, *, prices=None, cargo_value=None, top_up=True):
+        self.prices = prices
+        self._cargo_value = cargo_value
+        self.top_up = top_up
+
+    def __repr__(self):
+        cls = self.__class__.__name__
+        return (
+            f'{cls}(prices={self.prices!r}, '
+            f'cargo_value={self._cargo_value!r}, top_up={self.top_up!r})'
+        )
+
+    def fuel_prices(self, ship):
+        """Returns {waypoint_symbol: FUEL purchase price} for the Ship"""
+        if self.prices is not None:
+            return dict(self.prices)
+        return {
+            waypoint: purchase
+            for waypoint, (purchase, _) in cache.get_fuel_prices(
+                ship.location.system
+            ).items()
+            if purchase is not None
+        }
+
+    def cargo_value(self, ship):
+        """Returns what a unit of FUEL in the Ship's cargo is worth"""
+        if self._cargo_value is not None:
+            return self._cargo_value
+        sell_prices = [
+            sell for _, sell in cache.get_fuel_prices(
+                ship.location.system
+            ).values()
+            if sell is not None
+        ]
+        return max(sell_prices, default=math.inf)
+
+    def plan(self, ship, route):
+        """
+        Returns a Refuel, or None, to make before departing on each Leg
+
+        Args:
+            ship: Ship about to fly the Route
+            route: Route from snisp.navigation.plan_route
+
+        Returns:
+            list: Refuel or None for each Leg of the Route
+        """
+        capacity = ship.fuel.capacity
+        output = [None] * len(route.legs)
+        if not capacity:
+            return output
+        prices = self.fuel_prices(ship)
+        cargo_value = self.cargo_value(ship)
+        cargo = sum(
+            i.units for i in ship.cargo.inventory if i.symbol == 'FUEL'
+        ) * FUEL_UNITS_PER_GOOD
+        stops = [ship.nav.waypoint_symbol]
+        stops.extend(i.waypoint.symbol for i in route.legs[:-1])
+        remaining = list(itertools.accumulate(
+            (i.fuel for i in reversed(route.legs))
+        ))[::-1]
+
+        fuel = ship.fuel.current
+        for index, (stop, leg) in enumerate(zip(stops, route.legs)):
+            price = prices.get(stop)
+            if price is None:
+                if leg.refuel and fuel < leg.fuel:
+                    output[index] = Refuel(0, False)
+                    fuel = capacity
+            else:
+                target = min(capacity, remaining[index])
+                reach = 0
+                for ahead in route.legs[index:-1]:
+                    reach += ahead.fuel
+                    if reach > capacity:
+                        break
+                    cheaper = prices.get(ahead.waypoint.symbol)
+                    if cheaper is not None and cheaper < price:
+                        target = reach
+                        break
+                if (units := target - fuel) > 0:
+                    # Fuel is sold by the unit of FUEL, so round up to
+                    # whole units instead of paying for fuel left behind
+                    units = min(
+                        capacity - fuel,
+                        -(-units // FUEL_UNITS_PER_GOOD) * FUEL_UNITS_PER_GOOD,
+                    )
+                    from_cargo = cargo_value < price and cargo >= units
+                    if from_cargo:
+                        cargo -= units
+                    output[index] = Refuel(units, from_cargo)
+                    fuel += units
+            fuel -= leg.fuel
+        return output
+
+    def arrive(self, ship, waypoint):
+        """
+        Returns the Refuel to make at the destination, or None
+
+        The Ship fills up only if top_up and the destination sells the
+        cheapest known Fuel in the System. No request is made to find out
+        """
+        if not self.top_up or not ship.fuel.capacity:
+            return None
+        if ship.fuel.current >= ship.fuel.capacity:
+            return None
+        prices = self.fuel_prices(ship)
+        price = prices.get(waypoint.symbol)
+        if price is None or price > min(prices.values()):
+            return None
+        return Refuel(0, False)
+
+
+def system_symbol(waypoint_symbol):
+    """Returns the System symbol for a Waypoint symbol"""
+    return '-'.join(waypoint_symbol.split('-')[:2])
+
+
+def has_warp_drive(ship):
+    return any('WARP_DRIVE' in i.symbol for i in ship.modules)
+
+
+def jump_gate(ship, system):
+    """
+    Returns the System's JumpGate and the Systems it can jump to
+
+    The JumpGate is None if the System does not have one. A JumpGate that
+    is under construction cannot be jumped to or from, so it has no
+    connections. Results are cached per System until it is charted
+
+    Args:
+        ship: Ship to look up from
+        system: System symbol
+
+    Returns:
+        tuple: (JumpGate or None, tuple of System symbols)
+    """
+    with ship.agent.lock:
+        if not ship.agent.client.testing:
+            if (output := cache.get_jump_gate(system)) is not None:
+                return output
+        gate = next(ship.waypoints.jump_gates(system_symbol=system), None)
+        connections = ()
+        if gate is not None and not gate.is_under_construction:
+            connections = tuple(
+                system_symbol(i)
+                for i in gate.data.to_dict().get('connections', [])
+            )
+        output = (gate, connections)
+        if not ship.agent.client.testing:
+            cache.insert_jump_gate(system, output)
+    return output
+
+
+def plan_jumps(ship, destination_system, max_jumps=MAX_JUMPS):
+    """
+    Returns the JumpGates the Ship passes through to reach the
+    destination_system with the fewest jumps
+
+    The jump-gate graph is explored breadth first from the Ship's System,
+    skipping gates that are under construction. Every System explored is
+    looked up from the server, so the search stops at max_jumps from the
+    Ship's System instead of crawling the whole reachable graph
+
+    Args:
+        ship: Ship
+        destination_system: System symbol
+
+    Kwargs:
+        max_jumps: The most jumps to search. Default is MAX_JUMPS
+
+    Blocks:
+        False
+
+    Returns:
+        list: JumpGates, starting with the one in the Ship's System, or None
+              if the destination_system cannot be reached in max_jumps
+    """
+    origin = ship.nav.system_symbol
+    gate, _ = jump_gate(ship, origin)
+    if gate is None:
+        return None
+    gates = {origin: gate}
+    previous = {origin: None}
+    jumps = {origin: 0}
+    queue = collections.deque([origin])
+    while queue and destination_system not in previous:
+        system = queue.popleft()
+        if jumps[system] >= max_jumps:
+            continue
+        for neighbor in jump_gate(ship, system)[1]:
+            if neighbor in previous:
+                continue
+            gate, _ = jump_gate(ship, neighbor)
+            if gate is None or gate.is_under_construction:
+                continue
+            gates[neighbor] = gate
+            previous[neighbor] = system
+            jumps[neighbor] = jumps[system] + 1
+            queue.append(neighbor)
+    if destination_system not in previous:
+        return None
+    path = []
+    system = destination_system
+    while system is not None:
+        path.append(gates[system])
+        system = previous[system]
+    path.reverse()
+    return path
@@ -0,0 +1,664 @@
+import collections
+import functools
+import logging
+import threading
+import time
+
+from snisp import markets, utils
+
+
+logger = logging.getLogger(__name__)
+
+# Units consumed and produced by a single refine
+REFINE_CONSUMES = 30
+REFINE_PRODUCES = 10
+
+
+class MiningOperation:
+
+    """
+    Keeps mining drones extracting at an Asteroid while stationed haulers
+    carry the cargo away
+
+    Instead of every drone flying off to sell whenever its hold fills, each
+    drone transfers its cargo into a hauler waiting at the Asteroid and goes
+    straight back to extracting. The transfer happens during the extraction
+    cooldown, so the drone's lasers are ready again as soon as it expires.
+    A hauler leaves to unload once it is full and returns to the Asteroid
+    afterwards, while any other haulers keep taking transfers
+
+    The operation runs as tasks on the agent's Scheduler, so the drones and
+    haulers are resumed on their cooldowns and arrivals instead of each
+    holding a thread
+
+    >>> operation = snisp.operations.MiningOperation(
+    ...     asteroid, agent.fleet.mining_drones(), [hauler]
+    ... )
+    >>> operation.start()
+    >>> agent.scheduler.run(workers=2)
+
+    Args:
+        asteroid: Waypoint to extract at
+        drones: Iterable of Ships that can_mine
+        haulers: Iterable of Ships with cargo space
+
+    Kwargs:
+        unload: callable(hauler) to empty a full hauler. Run on the
+                Scheduler, so it must be safe to repeat after waits.
+                Default is None for hauler.sell_off_cargo
+        poll: Seconds a full drone waits before checking for a stationed
+              hauler again. Default is 10
+    """
+
+    def __init__(self, asteroid, drones, haulers, *, unload=None, poll=10):
+        self.asteroid = asteroid
+        self.agent = asteroid.agent
+        self.drones = list(drones)
+        self.haulers = list(haulers)
+        self.unload = unload
+        self.poll = poll
+        self.lock = threading.Lock()
+        self.stationed = []
+        self.reserved = collections.Counter()
+        self.extracted = collections.Counter()
+        self.futures = []
+        self.stopped = False
+        self._mining = 0
+
+    def __repr__(self):
+        return (
+            f'{self.__class__.__name__}({self.asteroid.symbol!r}, '
+            f'{len(self.drones)} drones, {len(self.haulers)} haulers)'
+        )
+
+    @property
+    def running(self):
+        """True until every drone has finished"""
+        with self.lock:
+            return bool(self._mining)
+
+    def start(self):
+        """
+        Spawns the drone and hauler tasks on the agent's Scheduler
+
+        The Scheduler must be started for them to run
+
+        Returns:
+            list: Futures that resolve once each drone has finished
+        """
+        futures = []
+        with self.lock:
+            self.stopped = False
+            self._mining += len(self.drones)
+        for hauler in self.haulers:
+            self._spawn(self._station(hauler))
+        for drone in self.drones:
+            futures.append(self._spawn(self._mine(drone)))
+        return futures
+
+    def stop(self):
+        """
+        Stops extracting
+
+        Drones transfer what they hold to the stationed haulers, which
+        unload once every drone has finished. A drone keeps its cargo if
+        no hauler is left to take it
+        """
+        with self.lock:
+            self.stopped = True
+
+    def free(self, hauler):
+        """Cargo space left in the hauler, less transfers in progress"""
+        return (
+            hauler.cargo.capacity - hauler.cargo.units -
+            self.reserved[hauler.symbol]
+        )
+
+    def _spawn(self, task):
+        future = self.agent.scheduler.spawn(task)
+        with self.lock:
+            self.futures.append(future)
+        return future
+
+    def _station(self, hauler):
+        yield functools.partial(hauler.autopilot, self.asteroid)
+        with self.lock:
+            if not self.stopped or self._mining:
+                self.stationed.append(hauler)
+                logger.info(
+                    f'{hauler.registration.role}: {hauler.symbol} | '
+                    f'Stationed at {self.asteroid.symbol}'
+                )
+                return
+        if hauler.cargo.units:
+            yield from self._haul(hauler)
+
+    def _haul(self, hauler):
+        if self.unload is not None:
+            yield functools.partial(self.unload, hauler)
+        else:
+            yield hauler.sell_off_cargo
+        with self.lock:
+            if self.stopped and not self._mining:
+                return
+        yield from self._station(hauler)
+
+    def _mine(self, drone):
+        try:
+            yield functools.partial(drone.autopilot, self.asteroid)
+            while True:
+                if (
+                    not self.stopped and
+                    drone.cargo.units < drone.cargo.capacity
+                ):
+                    extraction = yield drone.extract
+                    with self.lock:
+                        self.extracted[extraction.symbol] += extraction.units
+                    if not extraction.units:
+                        logger.info(
+                            f'{drone.registration.role}: {drone.symbol} | '
+                            f'{self.asteroid.symbol} is stripped'
+                        )
+                        self.stop()
+                    continue
+                if not drone.cargo.units:
+                    return
+                hauler, transfers = self._claim(drone)
+                if hauler is None:
+                    with self.lock:
+                        if self.stopped and not self.stationed:
+                            # Every hauler has left
+                            return
+                    yield self.poll
+                    continue
+                for symbol, units in transfers:
+                    try:
+                        yield functools.partial(
+                            drone.transfer, hauler, symbol=symbol, units=units
+                        )
+                    finally:
+                        with self.lock:
+                            self.reserved[hauler.symbol] -= units
+                with self.lock:
+                    # The last transfer into a full hauler sends it off
+                    full = (
+                        self.free(hauler) <= 0 and
+                        not self.reserved[hauler.symbol]
+                    )
+                    if full and hauler in self.stationed:
+                        self.stationed.remove(hauler)
+                    else:
+                        full = False
+                if full:
+                    self._spawn(self._haul(hauler))
+        finally:
+            self._finish_drone()
+
+    def _claim(self, drone):
+        # Reserves room in the stationed hauler with the most space left
+        with self.lock:
+            haulers = [i for i in self.stationed if self.free(i) > 0]
+            if not haulers:
+                return None, []
+            hauler = max(haulers, key=self.free)
+            room = self.free(hauler)
+            transfers = []
+            for item in drone.cargo.inventory:
+                units = min(item.units, room)
+                if units <= 0:
+                    break
+                transfers.append((item.symbol, units))
+                room -= units
+            self.reserved[hauler.symbol] += sum(i for _, i in transfers)
+            return hauler, transfers
+
+    def _finish_drone(self):
+        with self.lock:
+            self._mining -= 1
+            if self._mining:
+                return
+            # The last drone is done, so nothing else is coming
+            self.stopped = True
+            haulers, self.stationed = self.stationed, []
+        for hauler in haulers:
+            if hauler.cargo.units:
+                self._spawn(self._haul(hauler))
+
+
+class Refinery:
+
+    """
+    Keeps a refining freighter's reactor busy
+
+    Ore delivered into the Ship's hold with deliver is refined as soon as the
+    Ship's cooldown expires. Each refine picks the product worth the most
+    over the ore it consumes, at the best sell prices in the Ship's System.
+    Products that are worth less than their ore are not refined. Finished
+    goods are sent to sale once the hold cannot take another load of ore,
+    after which the Ship returns to its station
+
+    The refinery runs as a task on the agent's Scheduler
+
+    >>> refinery = snisp.operations.Refinery(freighter)
+    >>> refinery.start()
+    >>> agent.scheduler.enqueue(hauler, refinery.deliver, hauler)
+    >>> agent.scheduler.run(workers=2)
+
+    Args:
+        ship: Ship with a Refinery Module
+
+    Kwargs:
+        station: Waypoint the Ship waits at for ore. Default is None for
+                 the Ship's current Waypoint
+        sell: callable(ship, trade_symbols) to sell finished goods. Run on
+              the Scheduler, so it must be safe to repeat after waits.
+              Default is None for ship.sell_off_cargo on each good
+        prices: dict of {trade_symbol: sell_price} to use instead of the
+                Markets' prices. Default is None
+        max_age: Seconds before Market prices are fetched again.
+                 Default is 900
+        poll: Seconds to wait before checking for delivered ore again.
+              Default is 10
+    """
+
+    def __init__(
+        self,
+        ship,
+        *,
+        station=None,
+        sell=None,
+        prices=None,
+        max_age=900,
+        poll=10,
+    ):
+        self.ship = ship
+        self.agent = ship.agent
+        self.station = station
+        self.sell = sell
+        self.prices = prices
+        self.max_age = max_age
+        self.poll = poll
+        self.lock = threading.Lock()
+        self.refined = collections.Counter()
+        self.future = None
+        self.stopped = False
+        self._prices = None
+        self._priced_at = 0
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.ship.symbol!r})'
+
+    def start(self):
+        """
+        Spawns the refinery task on the agent's Scheduler
+
+        The Scheduler must be started for it to run
+
+        Returns:
+            Future: Resolves once the refinery is stopped and empty
+        """
+        if self.station is None:
+            self.station = self.ship.waypoints.get()
+        self.stopped = False
+        self.future = self.agent.scheduler.spawn(self._run())
+        return self.future
+
+    def stop(self):
+        """
+        Stops waiting for ore
+
+        The ore in the hold is still refined and every finished good is
+        sold before the task finishes
+        """
+        self.stopped = True
+
+    def deliver(self, ship):
+        """
+        Transfers the ore in ship's cargo into the refinery, as much as fits
+
+        Args:
+            ship: Ship at the refinery's Waypoint
+
+        Blocks:
+            True: until both Ships reach their destinations
+
+        Returns:
+            dict: {trade_symbol: units} transferred
+        """
+        ores = set(utils.REFINING_INPUTS.values())
+        output = {}
+        with self.lock:
+            room = self.ship.cargo.capacity - self.ship.cargo.units
+            for item in list(ship.cargo.inventory):
+                units = min(item.units, room)
+                if item.symbol not in ores or units <= 0:
+                    continue
+                ship.transfer(self.ship, symbol=item.symbol, units=units)
+                output[item.symbol] = units
+                room -= units
+        return output
+
+    def market_prices(self):
+        """
+        Returns the best sell prices for refinable products and their ores
+
+        Fetched from the Markets in the Ship's System at most once every
+        max_age seconds
+
+        Returns:
+            dict: {trade_symbol: sell_price}
+        """
+        if self.prices is not None:
+            return self.prices
+        if (
+            self._prices is None or
+            time.monotonic() - self._priced_at > self.max_age
+        ):
+            symbols = set(utils.REFINING_INPUTS).union(
+                utils.REFINING_INPUTS.values()
+            )
+            self._prices = markets.sell_prices(
+                (i.data for i in self.ship.markets), symbols
+            )
+            self._priced_at = time.monotonic()
+        return self._prices
+
+    def spreads(self):
+        """
+        Returns the value a refine adds for each refinable product
+
+        The price of the products made, less the price the consumed ore
+        would have sold for. Products without a known price are left out
+
+        Returns:
+            dict: {product: spread}
+        """
+        prices = self.market_prices()
+        return {
+            product: (
+                REFINE_PRODUCES * prices[product] -
+                REFINE_CONSUMES * prices.get(ore, 0)
+            )
+            for product, ore in utils.REFINING_INPUTS.items()
+            if product in prices
+        }
+
+    def choose(self):
+        """
+        Returns the product to refine next
+
+        The product with the best spread the hold has enough ore for.
+        Products without a known price come after those with a positive
+        spread, most ore first
+
+        Returns:
+            str: Product symbol or None if nothing is worth refining
+        """
+        held = collections.Counter()
+        for item in self.ship.cargo.inventory:
+            held[item.symbol] += item.units
+        spreads = self.spreads()
+        candidates = [
+            product for product, ore in utils.REFINING_INPUTS.items()
+            if held[ore] >= REFINE_CONSUMES and spreads.get(product, 0) >= 0
+        ]
+        if not candidates:
+            return None
+        return max(
+            candidates,
+            key=lambda x: (
+                x in spreads,
+                spreads.get(x, 0),
+                held[utils.REFINING_INPUTS[x]],
+                x,
+            )
+        )
+
+    def finished_goods(self):
+        """Returns the symbols of the refined goods in the hold"""
+        return [
+            i.symbol for i in self.ship.cargo.inventory
+            if i.symbol in utils.REFINABLE_SYMBOLS and i.units
+        ]
+
+    def _run(self):
+        while True:
+            if product := self.choose():
+                data = yield functools.partial(self.ship.refine, product)
+                with self.lock:
+                    for item in data.get('produced', []):
+                        self.refined[item['tradeSymbol']] += item['units']
+                continue
+            goods = self.finished_goods()
+            room = self.ship.cargo.capacity - self.ship.cargo.units
+            if goods and (self.stopped or room < REFINE_CONSUMES):
+                yield from self._sell(goods)
+                continue
+            if self.stopped:
+                return
+            yield self.poll
+
+    def _sell(self, goods):
+        if self.sell is not None:
+            yield functools.partial(self.sell, self.ship, goods)
+        else:
+            for trade_symbol in goods:
+                yield functools.partial(
+                    self.ship.sell_off_cargo, trade_symbol
+                )
+        if not self.stopped:
+            yield functools.partial(self.ship.autopilot, self.station)
+
+
+class ContractOperation:
+
+    """
+    Sources and delivers a Contract's remaining goods with several haulers
+    at once, then fulfills it
+
+    The units left to deliver are claimed a hold at a time, so each hauler
+    takes as much as its cargo has room for and comes back for more while
+    any are left. A hauler uses what it already holds before buying more
+    at the cheapest Market exporting or exchanging the good. The Contract
+    is fulfilled by the last hauler to finish once every unit is delivered
+
+    The operation runs as tasks on the agent's Scheduler, so the haulers
+    fly, buy, and deliver concurrently without each holding a thread
+
+    >>> operation = snisp.operations.ContractOperation(
+    ...     agent.contracts.current, agent.fleet.freighters()
+    ... )
+    >>> operation.start()
+    >>> agent.scheduler.run(workers=2)
+
+    Args:
+        contract: Contract to deliver to. Accepted if it has not been
+        haulers: Iterable of Ships with cargo space
+
+    Kwargs:
+        source: callable(trade_symbol) returning the Market or Waypoint to
+                buy trade_symbol at, or None if the good cannot be bought.
+                Run on the Scheduler. Default is None for the Market from
+                ship.markets.cheapest_export_or_exchange
+        buffer: Credit buffer for each purchase. See ship.autopurchase.
+                Default is 200_000
+    """
+
+    def __init__(self, contract, haulers, *, source=None, buffer=200_000):
+        self.contract = contract
+        self.agent = contract.agent
+        self.haulers = list(haulers)
+        self.source = source
+        self.buffer = buffer
+        self.lock = threading.Lock()
+        self.remaining = collections.Counter()
+        self.claimed = collections.Counter()
+        self.delivered = collections.Counter()
+        self.futures = []
+        # Serializes Market and Waypoint lookups, so each is made once
+        self._lookup = threading.Lock()
+        self._waypoints = {}
+        self._hauling = 0
+
+    def __repr__(self):
+        return (
+            f'{self.__class__.__name__}({self.contract.id!r}, '
+            f'{len(self.haulers)} haulers)'
+        )
+
+    @property
+    def running(self):
+        """True until every hauler has finished"""
+        with self.lock:
+            return bool(self._hauling)
+
+    @property
+    def complete(self):
+        """True once every remaining unit has been delivered"""
+        with self.lock:
+            return not +self.remaining and not +self.claimed
+
+    def start(self):
+        """
+        Accepts the Contract and spawns a task for each hauler on the
+        agent's Scheduler
+
+        The Scheduler must be started for them to run
+
+        Returns:
+            list: Futures that resolve once each hauler has finished
+        """
+        self.contract.accept()
+        with self.lock:
+            self.remaining = collections.Counter({
+                i.trade_symbol: i.units_required - i.units_fulfilled
+                for i in self.contract.terms.deliver
+                if i.units_required > i.units_fulfilled
+            })
+            self._hauling += len(self.haulers)
+        futures = []
+        for hauler in self.haulers:
+            future = self.agent.scheduler.spawn(self._haul(hauler))
+            futures.append(future)
+        with self.lock:
+            self.futures.extend(futures)
+        return futures
+
+    def market(self, hauler, trade_symbol):
+        """
+        Returns where to buy trade_symbol, found once per good
+
+        Args:
+            hauler: Ship searching the Markets in its System
+            trade_symbol: Symbol of the good to buy
+
+        Returns:
+            Market, Waypoint, or None if no Market sells the good
+        """
+        key = ('source', trade_symbol)
+        with self._lookup:
+            if key not in self._waypoints:
+                if self.source is not None:
+                    market = self.source(trade_symbol)
+                elif found := hauler.markets.cheapest_export_or_exchange(
+                    trade_symbol
+                ):
+                    market = found[0]
+                else:
+                    market = None
+                self._waypoints[key] = market
+            return self._waypoints[key]
+
+    def destination(self, hauler, trade_symbol):
+        """Returns the Waypoint trade_symbol is delivered to"""
+        symbol = next(
+            i.destination_symbol for i in self.contract.terms.deliver
+            if i.trade_symbol == trade_symbol
+        )
+        with self._lookup:
+            if symbol not in self._waypoints:
+                self._waypoints[symbol] = hauler.waypoints.get(
+                    waypoint_symbol=symbol
+                )
+            return self._waypoints[symbol]
+
+    @staticmethod
+    def held(ship, trade_symbol):
+        """Units of trade_symbol in the ship's cargo"""
+        return sum(
+            i.units for i in ship.cargo.inventory if i.symbol == trade_symbol
+        )
+
+    def _claim(self, hauler):
+        # A good the hauler already holds comes first, then the good with
+        # the most units left
+        with self.lock:
+            goods = [i for i, j in self.remaining.items() if j > 0]
+            if not goods:
+                return None
+            symbol = max(
+                goods,
+                key=lambda x: (
+                    self.held(hauler, x), self.remaining[x], x
+                )
+            )
+            room = (
+                hauler.cargo.capacity - hauler.cargo.units +
+                self.held(hauler, symbol)
+            )
+            units = min(self.remaining[symbol], room)
+            if units <= 0:
+                return None
+            self.remaining[symbol] -= units
+            self.claimed[symbol] += units
+            return symbol, units
+
+    def _haul(self, hauler):
+        try:
+            while claim := self._claim(hauler):
+                symbol, units = claim
+                delivered = 0
+                try:
+                    delivered = yield from self._trip(hauler, symbol, units)
+                finally:
+                    with self.lock:
+                        self.claimed[symbol] -= units
+                        self.remaining[symbol] += units - delivered
+                        self.delivered[symbol] += delivered
+                if not delivered:
+                    # Nothing could be bought, so leave it to the others
+                    break
+        finally:
+            last = self._finish_hauler()
+        if last and self.complete:
+            yield self.contract.fulfill
+
+    def _trip(self, hauler, symbol, units):
+        if self.held(hauler, symbol) < units:
+            market = yield functools.partial(self.market, hauler, symbol)
+            if market is not None:
+                yield functools.partial(hauler.autopilot, market)
+                yield functools.partial(
+                    hauler.autopurchase,
+                    symbol,
+                    max_units=units - self.held(hauler, symbol),
+                    buffer=self.buffer,
+                )
+        units = min(units, self.held(hauler, symbol))
+        if units <= 0:
+            logger.warning(
+                f'{hauler.registration.role}: {hauler.symbol} | '
+                f'Could not buy {symbol} for CONTRACT {self.contract.id}'
+            )
+            return 0
+        waypoint = yield functools.partial(self.destination, hauler, symbol)
+        yield functools.partial(hauler.autopilot, waypoint)
+        data = yield functools.partial(
+            self.contract.deliver, hauler, symbol, max_units=units
+        )
+        return units if data is not None else 0
+
+    def _finish_hauler(self):
+        with self.lock:
+            self._hauling -= 1
+            return not self._hauling
@@ -0,0 +1,506 @@
+import collections
+import functools
+import heapq
+import inspect
+import itertools
+import logging
+import threading
+import time
+
+from concurrent.futures import Future
+from datetime import datetime, timezone
+
+from snisp import decorators, exceptions, fleet
+
+
+logger = logging.getLogger(__name__)
+
+# Queued actions never overtake a waiting reactor action with one of these,
+# otherwise, e.g., an extract would happen at the wrong Waypoint
+MOVES_SHIP = frozenset(('autopilot', 'jump', 'navigate', 'warp'))
+
+
+class Scheduler:
+
+    """
+    Runs Ship tasks from a heap of wake-up deadlines
+
+    Instead of parking one thread per Ship in time.sleep for every cooldown,
+    arrival, and retryAfter, tasks are resumed by a few worker threads once
+    their deadline is reached. Actions run by the Scheduler never sleep for
+    these waits; the action is queued again for when the wait is over
+
+    Tasks can be callbacks, generators, or awaited from asyncio
+
+    >>> def mine(ship, asteroid):
+    ...     yield from ship.autopilot_steps(asteroid)
+    ...     while ship.cargo.units < ship.cargo.capacity:
+    ...         yield ship.extract
+    ...
+    >>> for drone in agent.fleet.mining_drones():
+    ...     agent.scheduler.spawn(mine(drone, asteroid))
+    >>> agent.scheduler.run(workers=2)
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.condition = threading.Condition()
+        self._heap = []
+        self._counter = itertools.count()
+        self._threads = []
+        self._running = False
+        self._pending = 0
+        self._lanes = {}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.agent!r})'
+
+    def __len__(self):
+        """Number of tasks that have not finished"""
+        with self.condition:
+            return self._pending
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self, workers=1):
+        """
+        Starts the worker threads that run due tasks
+
+        Kwargs:
+            workers: Number of worker threads. Default is 1
+        """
+        with self.condition:
+            if self._running:
+                return
+            self._running = True
+            self._threads = [
+                threading.Thread(target=self._worker, daemon=True)
+                for _ in range(int(workers))
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Stops the worker threads. Unfinished tasks stay queued"""
+        with self.condition:
+            self._running = False
+            self.condition.notify_all()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        self._threads = []
+
+    def join(self, timeout=None):
+        """
+        Blocks until every task has finished
+
+        Kwargs:
+            timeout: Seconds to wait. Default is None, i.e., forever
+
+        Returns:
+            bool: True if every task has finished; else, False
+        """
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: not self._pending, timeout=timeout
+            )
+
+    def run(self, workers=1):
+        """
+        Starts the Scheduler, blocks until every task has finished, and
+        stops it
+
+        Kwargs:
+            workers: Number of worker threads. Default is 1
+        """
+        self.start(workers=workers)
+        try:
+            self.join()
+        finally:
+            self.stop()
+
+    def call_at(self, deadline, callback, *args, **kwargs):
+        """
+        Runs callback(*args, **kwargs) once deadline is reached
+
+        If the callback has to wait on a cooldown, arrival, or retryAfter,
+        it is run again from the start once that wait is over. Composite
+        actions, such as autopilot or sell_off_cargo, are re-run from the
+        start after every wait. Spawn their steps instead, e.g.,
+        Ship.autopilot_steps, so only the step that waited is run again
+
+        Args:
+            deadline: datetime, or seconds from now
+            callback: callable
+
+        Returns:
+            Future: Resolves to the callback's return value
+        """
+        future = self._future()
+        callback = functools.partial(callback, *args, **kwargs)
+        self._push(deadline, functools.partial(self._call, future, callback))
+        return future
+
+    def call_later(self, delay, callback, *args, **kwargs):
+        """Runs callback(*args, **kwargs) in delay seconds"""
+        return self.call_at(delay, callback, *args, **kwargs)
+
+    def submit(self, callback, *args, **kwargs):
+        """
+        Runs callback(*args, **kwargs) as soon as a worker is free
+
+        As with call_at, the callback is re-run from the start after every
+        wait, including composite actions such as autopilot
+        """
+        return self.call_at(0, callback, *args, **kwargs)
+
+    def spawn(self, task):
+        """
+        Runs the generator task, resuming it based on what it yields
+
+        A yielded callable is run as an action and its return value is sent
+        back into the generator; exceptions are thrown into it. A yielded
+        datetime or number of seconds resumes the generator at that time.
+        A yielded None resumes it as soon as a worker is free
+
+        Args:
+            task: generator
+
+        Returns:
+            Future: Resolves to the generator's return value
+        """
+        if not inspect.isgenerator(task):
+            raise exceptions.SpaceAttributeError(
+                f'{task!r} is not a generator'
+            )
+        future = self._future()
+        self._push(0, functools.partial(self._step, task, future))
+        return future
+
+    def enqueue(self, ship, action, *args, **kwargs):
+        """
+        Queues action(*args, **kwargs) to run for the Ship
+
+        Actions for the same Ship run one at a time, in order, except that
+        actions which need the reactor (extract, siphon, survey, scan, jump,
+        refine) wait for the Ship's cooldown while the actions queued behind
+        them run right away. Actions that move the Ship never overtake a
+        waiting reactor action
+
+        >>> agent.scheduler.enqueue(drone, drone.extract)
+        >>> agent.scheduler.enqueue(drone, drone.extract)
+        >>> agent.scheduler.enqueue(drone, drone.transfer, hauler, **cargo)
+
+        Here the transfer runs during the second extract's cooldown instead
+        of after it
+
+        Args:
+            ship: Ship
+            action: callable
+
+        Returns:
+            Future: Resolves to the action's return value
+        """
+        future = self._future()
+        self._queue(ship, (
+            functools.partial(action, *args, **kwargs),
+            future,
+            decorators.uses_reactor(action),
+            action_name(action) in MOVES_SHIP,
+        ))
+        return future
+
+    def enqueue_task(self, ship, task):
+        """
+        Queues the generator task to run for the Ship, in order with the
+        Ship's other queued actions
+
+        The task runs as with spawn, except that the Ship's other actions
+        wait until it returns. A step that has to wait is resumed on its
+        own, so the steps before it are not run again
+
+        >>> agent.scheduler.enqueue_task(ship, ship.autopilot_steps(market))
+        >>> agent.scheduler.enqueue(ship, ship.sell_off_cargo)
+
+        Args:
+            ship: Ship
+            task: generator, e.g., Ship.autopilot_steps(waypoint)
+
+        Returns:
+            Future: Resolves to the generator's return value
+        """
+        if not inspect.isgenerator(task):
+            raise exceptions.SpaceAttributeError(
+                f'{task!r} is not a generator'
+            )
+        future = self._future()
+        # Tasks may move the Ship, so they never overtake a reactor action
+        self._queue(ship, (task, future, False, True))
+        return future
+
+    def sleep_until(self, deadline):
+        """
+        Returns a Future that resolves to None once deadline is reached
+
+        Pair with asyncio.wrap_future to await a deadline from asyncio
+
+        >>> await asyncio.wrap_future(agent.scheduler.sleep_until(
+        ...     snisp.scheduler.ready_at(ship)
+        ... ))
+        """
+        return self.call_at(deadline, lambda: None)
+
+    def _future(self):
+        future = Future()
+        future.set_running_or_notify_cancel()
+        with self.condition:
+            self._pending += 1
+        return future
+
+    def _finish(self, future, result=None, error=None):
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        with self.condition:
+            self._pending -= 1
+            self.condition.notify_all()
+
+    def _push(self, deadline, step):
+        with self.condition:
+            heapq.heappush(
+                self._heap, (to_epoch(deadline), next(self._counter), step)
+            )
+            self.condition.notify()
+
+    def _call(self, future, callback):
+        try:
+            with decorators.non_blocking():
+                result = callback()
+        except exceptions.WaitRequiredError as e:
+            self._push(
+                e.deadline, functools.partial(self._call, future, callback)
+            )
+        except Exception as e:
+            self._finish(future, error=e)
+        else:
+            self._finish(future, result=result)
+
+    def _step(self, task, future, value=None, error=None):
+        try:
+            if error is not None:
+                item = task.throw(error)
+            else:
+                item = task.send(value)
+        except StopIteration as e:
+            self._finish(future, result=e.value)
+            return
+        except Exception as e:
+            self._finish(future, error=e)
+            return
+        if callable(item):
+            self._push(0, functools.partial(self._act, task, future, item))
+        else:
+            self._push(item, functools.partial(self._step, task, future))
+
+    def _act(self, task, future, action):
+        try:
+            with decorators.non_blocking():
+                result = action()
+        except exceptions.WaitRequiredError as e:
+            self._push(
+                e.deadline,
+                functools.partial(self._act, task, future, action)
+            )
+        except Exception as e:
+            self._step(task, future, error=e)
+        else:
+            self._step(task, future, value=result)
+
+    def _dispatch(self, ship_symbol):
+        with self.condition:
+            lane = self._lanes.get(ship_symbol)
+            if lane is None or lane.busy or not lane.queue:
+                return
+            now = time.time()
+            cooldown = ready_at(lane.ship, 'cooldown').timestamp()
+            waiting = False
+            for index, item in enumerate(lane.queue):
+                _, _, reactor, moves = item
+                if reactor and cooldown > now:
+                    waiting = True
+                    continue
+                if waiting and moves:
+                    break
+                del lane.queue[index]
+                lane.busy = True
+                self._push(
+                    0, functools.partial(self._run_lane, ship_symbol, item)
+                )
+                return
+            if waiting and lane.wakeup != cooldown:
+                lane.wakeup = cooldown
+                self._push(
+                    datetime.fromtimestamp(cooldown, timezone.utc),
+                    functools.partial(self._dispatch, ship_symbol),
+                )
+
+    def _queue(self, ship, item):
+        with self.condition:
+            lane = self._lanes.setdefault(ship.symbol, ShipLane(ship))
+            lane.ship = ship
+            lane.queue.append(item)
+        self._dispatch(ship.symbol)
+
+    def _run_lane(self, ship_symbol, item):
+        action, future, _, _ = item
+        if inspect.isgenerator(action):
+            self._lane_step(ship_symbol, item)
+            return
+        try:
+            with decorators.non_blocking():
+                result = action()
+        except exceptions.WaitRequiredError as e:
+            # e.g., still in transit. The lane stays busy so nothing
+            # overtakes it
+            self._push(
+                e.deadline,
+                functools.partial(self._run_lane, ship_symbol, item)
+            )
+            return
+        except Exception as e:
+            self._release(ship_symbol, future, error=e)
+        else:
+            self._release(ship_symbol, future, result=result)
+
+    def _lane_step(self, ship_symbol, item, value=None, error=None):
+        task, future, _, _ = item
+        try:
+            if error is not None:
+                step = task.throw(error)
+            else:
+                step = task.send(value)
+        except StopIteration as e:
+            self._release(ship_symbol, future, result=e.value)
+            return
+        except Exception as e:
+            self._release(ship_symbol, future, error=e)
+            return
+        if callable(step):
+            self._push(
+                0, functools.partial(self._lane_act, ship_symbol, item, step)
+            )
+        else:
+            self._push(
+                step, functools.partial(self._lane_step, ship_symbol, item)
+            )
+
+    def _lane_act(self, ship_symbol, item, step):
+        try:
+            with decorators.non_blocking():
+                result = step()
+        except exceptions.WaitRequiredError as e:
+            # Only this step is run again. The lane stays busy so nothing
+            # overtakes the task
+            self._push(
+                e.deadline,
+                functools.partial(self._lane_act, ship_symbol, item, step)
+            )
+        except Exception as e:
+            self._lane_step(ship_symbol, item, error=e)
+        else:
+            self._lane_step(ship_symbol, item, value=result)
+
+    def _release(self, ship_symbol, future, result=None, error=None):
+        with self.condition:
+            lane = self._lanes[ship_symbol]
+            lane.busy = False
+            if not lane.queue:
+                del self._lanes[ship_symbol]
+        self._finish(future, result=result, error=error)
+        self._dispatch(ship_symbol)
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                while True:
+                    if not self._running:
+                        return
+                    if self._heap:
+                        delay = self._heap[0][0] - time.time()
+                        if delay <= 0:
+                            _, _, step = heapq.heappop(self._heap)
+                            break
+                        self.condition.wait(delay)
+                    else:
+                        self.condition.wait()
+            try:
+                step()
+            except Exception as e:  # pragma: no cover
+                logger.exception(f'Scheduler step failed: {e!r}')
+
+
+class ShipLane:
+
+    """Actions queued for a single Ship with Scheduler.enqueue"""
+
+    def __init__(self, ship):
+        self.ship = ship
+        self.queue = collections.deque()
+        self.busy = False
+        self.wakeup = None
+
+
+def action_name(action):
+    while isinstance(action, functools.partial):
+        action = action.func
+    return getattr(action, '__name__', '')
+
+
+def ready_at(ship, kind='ready'):
+    """
+    Returns when the Ship will be ready, based on its known arrival and
+    cooldown expiration
+
+    Args:
+        ship: Ship
+
+    Kwargs:
+        kind: 'arrival', 'cooldown', or 'ready' for whichever is later.
+              Default is 'ready'
+
+    Returns:
+        datetime: In UTC. A time in the past if the Ship is already ready
+    """
+    if kind not in ('arrival', 'cooldown', 'ready'):
+        raise exceptions.SpaceAttributeError(
+            f"{kind!r} must be one of 'arrival', 'cooldown', or 'ready'"
+        )
+    arrival = cooldown = 0
+    if kind != 'cooldown' and ship.nav.status == 'IN_TRANSIT':
+        arrival = fleet.timestamp(ship.nav.route.arrival)
+    if kind != 'arrival':
+        cooldown = fleet.timestamp(ship.cooldown.expiration)
+    return datetime.fromtimestamp(max(arrival, cooldown), timezone.utc)
+
+
+def to_epoch(deadline):
+    """Returns the POSIX timestamp for a datetime, seconds from now, or None"""
+    if deadline is None:
+        return time.time()
+    if isinstance(deadline, datetime):
+        return deadline.timestamp()
+    if isinstance(deadline, (int, float)):
+        return time.time() + deadline
+    raise exceptions.SpaceAttributeError(
+        f'{deadline!r} is not a datetime or a number of seconds'
+    )
@@ -32,6 +32,32 @@ class Shipyards:
         for shipyard in waypoint(traits='SHIPYARD'):
             yield Shipyard(self.agent, shipyard.to_dict())
 
+    def listings(self, ship_type):
+        """
+        Returns every Shipyard in the Ship's System selling ship_type,
+        cheapest first and then closest to the Ship
+
+        Each Shipyard is fetched once. The same NOTE as autopurchase applies
+
+        Args:
+            ship_type: Ship type to search. See snisp.utils.SHIP_TYPES for
+                       acceptable Ship types
+
+        Returns:
+            list: (Shipyard, ShipyardShip) tuples or an empty list
+        """
+        if ship_type not in utils.SHIP_TYPES:
+            raise exceptions.SpaceAttributeError(
+                f'{ship_type} is not an acceptable Ship type. '
+                'See snisp.utils.SHIP_TYPES for acceptable types.'
+            )
+        listings = []
+        for shipyard in self:
+            if (listing := self._listing(shipyard, ship_type)) is not None:
+                listings.append((shipyard, listing))
+        listings.sort(key=self._rank)
+        return listings
+
     def autopurchase(self, *, ship_type, max_units=1, buffer=300_000):
         """
         Purchases up to max_units of ship_type, depending on
@@ -43,6 +69,10 @@ class Shipyards:
         agent.data.credits - buffer >= purchase price.
         To remove the buffer, just pass a 0
 
+        The Shipyards are ranked once with listings. Between purchases, only
+        the Shipyard just bought from is fetched again, as it is the only
+        price the purchase moved
+
         NOTE: The only way to know the type and cost of a ship available
               for purchase at a Shipyard is to have a Ship or Probe located
               at the Shipyard. Just because nothing is returned, does not
@@ -63,24 +93,44 @@ class Shipyards:
         """
         max_units = int(max_units)
         transactions = []
-        smd = self.ship.markets.shipyard_market_data
+        listings = self.listings(ship_type)
+        if not listings:
+            logger.warning(
+                f'SYSTEM: {self.location.system} | '
+                f'No Shipyard found selling {ship_type}s'
+            )
+            return transactions
         with self.agent.lock:
-            while max_units > 0:
-                shipyard, market_data = smd(ship_type)
-                if not market_data or not shipyard:
-                    logger.warning(
-                        f'SYSTEM: {self.location.system} | '
-                        f'No Shipyard found selling {ship_type}s'
-                    )
-                    return transactions
-                credits_buffer = self.agent.data.credits - buffer
-                if market_data.purchase_price <= credits_buffer:
-                    transactions.append(shipyard.purchase(ship_type))
-                    max_units -= 1
-                else:
+            # Reconciled once; each purchase records the new balance
+            self.agent.ledger.reconcile()
+            while max_units > 0 and listings:
+                shipyard, listing = listings[0]
+                credits_buffer = self.agent.ledger.credits - buffer
+                if listing.purchase_price > credits_buffer:
                     return transactions
+                transactions.append(shipyard.purchase(ship_type))
+                max_units -= 1
+                if max_units > 0:
+                    del listings[0]
+                    listing = self._listing(shipyard, ship_type)
+                    if listing is not None:
+                        listings.append((shipyard, listing))
+                        listings.sort(key=self._rank)
         return transactions
 
+    def _listing(self, shipyard, ship_type):
+        for listing in shipyard.available_ships(ship_type=ship_type):
+            # Uncharted Shipyards yield an empty ShipyardData
+            if isinstance(listing, ShipyardShip):
+                return listing
+
+    def _rank(self, item):
+        shipyard, listing = item
+        return (
+            listing.purchase_price,
+            utils.calculate_distance(self.ship, shipyard),
+        )
+
 
 class Shipyard(utils.AbstractJSONItem):
 
@@ -176,6 +226,7 @@ class Shipyard(utils.AbstractJSONItem):
         with self.agent.lock:
             response = self.agent.client.post('/my/ships', json=payload)
             data = response.json()['data']
+            self.agent.ledger.record(data.get('agent'))
             logger.info(
                 f'Purchased a {data["transaction"]["shipType"]} at '
                 f'{data["transaction"]["waypointSymbol"]} for '
@@ -184,7 +235,7 @@ class Shipyard(utils.AbstractJSONItem):
             self.agent.recent_transactions.appendleft(
                 fleet.Transaction(self.agent, data)
             )
-            return fleet.Ship(self.agent, data['ship'])
+            return self.agent.fleet.states.update(data['ship'])
 
     def transactions(self, page=1):
         """
@@ -265,12 +316,13 @@ class ShipyardShip(utils.AbstractJSONItem):
             'shipType': self.type, 'waypointSymbol': self.shipyard_symbol
         }
         with self.agent.lock:
-            if (self.agent.data.credits - buffer) > 0:
+            if (self.agent.ledger.credits - buffer) > 0:
                 response = self.agent.client.post('/my/ships', json=payload)
                 data = response.json()['data']
+                self.agent.ledger.record(data.get('agent'))
                 logger.info(
                     f'Purchased a {data["transaction"]["shipType"]} at '
                     f'{data["transaction"]["waypointSymbol"]} for '
                     f'${data["transaction"]["price"]:,.2f}'
                 )
-                return fleet.Ship(self.agent, data['ship'])
+                return self.agent.fleet.states.update(data['ship'])
@@ -1,12 +1,24 @@
 import copy
+import functools
+import importlib
+import json
 import logging
 import math
 import re
+import struct
 import threading
 import traceback
+import zlib
 
 from collections.abc import Iterable
 
+from snisp import cache, exceptions
+
+try:  # pragma: no cover
+    import numpy
+except ModuleNotFoundError:  # pragma: no cover
+    numpy = None
+
 try:  # pragma: no cover
     from rich.highlighter import Highlighter
 except ModuleNotFoundError:  # pragma: no cover
@@ -23,6 +35,13 @@ TO_SNAKE_RE = re.compile(r'[A-Z]')
 TO_CAMEL_RE = re.compile(r'([a-z])_([a-z])', re.IGNORECASE)
 DUNDER_RE = re.compile(r'__.*__')
 
+# Serialization
+SERIAL_MAGIC = b'SNSP'
+SERIAL_VERSION = 1
+SERIAL_HEADER = struct.Struct('>4sB')
+SERIAL_TAG = '__snisp__'
+LOCAL_AGENT = None
+
 
 class AbstractJSONItem:
 
@@ -47,6 +66,34 @@ class AbstractJSONItem:
     def __len__(self):
         return len(self._data)
 
+    def __reduce__(self):
+        # Only the data is sent. The agent, and its client, locks, and deque,
+        # is reattached on the other side from the process' LOCAL_AGENT
+        cls = type(self)
+        return (
+            restore_item,
+            (
+                cls.__module__,
+                cls.__name__,
+                issubclass(cls, BaseJSONItem),
+                self._data,
+            )
+        )
+
+    def __copy__(self):
+        output = object.__new__(type(self))
+        if not isinstance(self, BaseJSONItem):
+            output.agent = self.agent
+        output._data = copy.copy(self._data)
+        return output
+
+    def __deepcopy__(self, memo):
+        output = object.__new__(type(self))
+        if not isinstance(self, BaseJSONItem):
+            output.agent = self.agent
+        output._data = copy.deepcopy(self._data, memo)
+        return output
+
     def __getattribute__(self, name):
         # Slow but fight me
         if name == 'agent':
@@ -73,58 +120,44 @@ class AbstractJSONItem:
         except AttributeError:
             if name in data_dict.keys():
                 if isinstance(data_dict[name], dict):
-                    data = type(
-                        camel_case(name.capitalize()).rstrip('s'),
-                        (BaseJSONItem,),
-                        {}
+                    data = dynamic_class(
+                        camel_case(name.capitalize()).rstrip('s'), True
                     )(data_dict[name])
                     data_dict[name] = data
                     super().__setattr__(name, data)
                     return data
                 elif is_list_like(data_dict[name]):
-                    class_factory = type(
-                        camel_case(name.capitalize()).rstrip('s'),
-                        (BaseJSONItem,),
-                        {}
+                    class_factory = dynamic_class(
+                        camel_case(name.capitalize()).rstrip('s'), True
                     )
-                    data = []
                     for index, item in enumerate(data_dict[name]):
-                        if type(item) == str:
-                            data.append(item)
-                        else:
-                            base_item = class_factory(item)
-                            data_dict[name][index] = base_item
-                            data.append(base_item)
-                    super().__setattr__(name, data)
+                        # Strings are kept and items already converted,
+                        # e.g., a restored pickle, are left as is
+                        if not isinstance(item, (str, AbstractJSONItem)):
+                            data_dict[name][index] = class_factory(item)
+                    # Converted in place, so the attribute shares the list
+                    super().__setattr__(name, data_dict[name])
                 else:
                     super().__setattr__(name, data_dict[name])
                 return data_dict[name]
             name = camel_case(name)
             if name in data_dict.keys():
                 if isinstance(data_dict[name], dict):  # pragma: no cover
-                    data = type(
-                        ''.join([name[0].upper(), name[1:]]).rstrip('s'),
-                        (BaseJSONItem,),
-                        {}
+                    data = dynamic_class(
+                        ''.join([name[0].upper(), name[1:]]).rstrip('s'), True
                     )(data_dict[name])
                     data_dict[name] = data
                     super().__setattr__(name, data)
                     return data
                 elif is_list_like(data_dict[name]):
-                    class_factory = type(
-                        ''.join([name[0].upper(), name[1:]]).rstrip('s'),
-                        (BaseJSONItem,),
-                        {}
+                    class_factory = dynamic_class(
+                        ''.join([name[0].upper(), name[1:]]).rstrip('s'), True
                     )
-                    data = []
                     for index, item in enumerate(data_dict[name]):
-                        if type(item) == str:  # pragma: no cover
-                            data.append(item)
-                        else:
-                            base_item = class_factory(item)
-                            data_dict[name][index] = base_item
-                            data.append(base_item)
-                    super().__setattr__(name, data)
+                        if not isinstance(item, (str, AbstractJSONItem)):
+                            data_dict[name][index] = class_factory(item)
+                    # Converted in place, so the attribute shares the list
+                    super().__setattr__(name, data_dict[name])
                 else:
                     super().__setattr__(name, data_dict[name])
                 return data_dict[name]
@@ -161,16 +194,12 @@ class AbstractJSONItem:
                     f'{name!r} not found in {self.__class__.__name__}'
                 )
             if isinstance(value, dict):
-                value = type(
-                    camel_case(name.capitalize()).rstrip('s'),
-                    (BaseJSONItem,),
-                    {}
+                value = dynamic_class(
+                    camel_case(name.capitalize()).rstrip('s'), True
                 )(value)
             elif is_list_like(value):
-                class_factory = type(
-                    camel_case(name.capitalize()).rstrip('s'),
-                    (BaseJSONItem,),
-                    {}
+                class_factory = dynamic_class(
+                    camel_case(name.capitalize()).rstrip('s'), True
                 )
                 data = []
                 for item in value:
@@ -271,13 +300,288 @@ def calculate_waypoint_distance(origin, dest):
     return math.sqrt(pow(origin.x - dest.x, 2) + pow(origin.y - dest.y, 2))
 
 
+def position(item):
+    """
+    Returns the (x, y) of a Waypoint or, for a Ship, its nav destination
+
+    Reads the underlying data directly, as this is called once per item
+    when building a DistanceTable
+    """
+    data = item._data
+    if 'nav' in data:
+        data = item.nav.route.destination._data
+    return data['x'], data['y']
+
+
+def distance_table(waypoints):
+    """
+    Returns the DistanceTable for the waypoints, in the waypoints' order
+
+    Tables are cached per System, keyed by each waypoint's symbol and
+    coordinates, so repeated lookups over the same Waypoints reuse the
+    coordinate arrays and any pairwise distances already computed
+
+    Args:
+        waypoints: list of Waypoints or Waypoint subclasses
+
+    Returns:
+        DistanceTable
+    """
+    key = tuple((i._data.get('symbol'), *position(i)) for i in waypoints)
+    system = waypoints[0]._data.get('systemSymbol') if waypoints else None
+    if (table := cache.get_distance_table(system, key)) is None:
+        table = DistanceTable(key)
+        cache.insert_distance_table(system, table)
+    return table
+
+
+def distance_matrix(origins, destinations):
+    """
+    Returns the distances from each origin to each destination
+
+    Origins may be Ships, which are measured from their nav destination,
+    or Waypoints. matrix[i][j] is the distance from origins[i] to
+    destinations[j]
+
+    Args:
+        origins: list of Ships or Waypoints
+        destinations: list of Waypoints or Waypoint subclasses
+
+    Returns:
+        numpy.ndarray if NumPy is installed; else, a list of lists
+    """
+    table = distance_table(destinations)
+    points = [position(i) for i in origins]
+    if numpy is not None:
+        if not points:
+            return numpy.empty((0, len(table)))
+        xs, ys = numpy.array(points, dtype=float).T
+        return numpy.hypot(
+            xs[:, None] - table.xs, ys[:, None] - table.ys
+        )
+    return [table.from_point(x, y) for x, y in points]
+
+
+class DistanceTable:
+
+    """
+    Coordinates and pairwise distances for a fixed list of Waypoints
+
+    Rows and columns follow the order of the points the table was built from.
+    Distances are computed with NumPy if it is installed; otherwise, they
+    fall back to pure Python. The full matrix is only built on first use
+    """
+
+    def __init__(self, points):
+        self.key = tuple(points)
+        self.symbols = [i[0] for i in self.key]
+        self.index = {}
+        for index, symbol in enumerate(self.symbols):
+            self.index.setdefault(symbol, index)
+        xs = [i[1] for i in self.key]
+        ys = [i[2] for i in self.key]
+        if numpy is not None:
+            self.xs = numpy.array(xs, dtype=float)
+            self.ys = numpy.array(ys, dtype=float)
+        else:
+            self.xs = xs
+            self.ys = ys
+        self._matrix = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({len(self)} points)'
+
+    def __len__(self):
+        return len(self.key)
+
+    @property
+    def matrix(self):
+        """Returns the waypoints x waypoints distance matrix"""
+        if self._matrix is None:
+            if numpy is not None and isinstance(self.xs, numpy.ndarray):
+                self._matrix = numpy.hypot(
+                    self.xs[:, None] - self.xs, self.ys[:, None] - self.ys
+                )
+            else:
+                self._matrix = [
+                    self.from_point(x, y) for x, y in zip(self.xs, self.ys)
+                ]
+        return self._matrix
+
+    def distance(self, origin, dest):
+        """Returns the distance between the points at the two indexes"""
+        return float(self.matrix[origin][dest])
+
+    def from_point(self, x, y):
+        """Returns the distance from (x, y) to every point"""
+        if numpy is not None and isinstance(self.xs, numpy.ndarray):
+            return numpy.hypot(self.xs - x, self.ys - y)
+        return [math.hypot(i - x, j - y) for i, j in zip(self.xs, self.ys)]
+
+    def closest(self, x, y):
+        """Returns the index of the point closest to (x, y) or None"""
+        if not self.key:
+            return None
+        distances = self.from_point(x, y)
+        if numpy is not None and isinstance(distances, numpy.ndarray):
+            return int(numpy.argmin(distances))
+        return min(range(len(distances)), key=distances.__getitem__)
+
+    def farthest(self, x, y):
+        """Returns the index of the point farthest from (x, y) or None"""
+        if not self.key:
+            return None
+        distances = self.from_point(x, y)
+        if numpy is not None and isinstance(distances, numpy.ndarray):
+            return int(numpy.argmax(distances))
+        return max(range(len(distances)), key=distances.__getitem__)
+
+    def argsort(self, x, y):
+        """Returns the point indexes sorted by distance from (x, y)"""
+        distances = self.from_point(x, y)
+        if numpy is not None and isinstance(distances, numpy.ndarray):
+            return numpy.argsort(distances, kind='stable').tolist()
+        return sorted(range(len(distances)), key=distances.__getitem__)
+
+
 def a_ship_at_location(agent, symbol):
+    # Checked against the server rather than agent.fleet.snapshot(), as a
+    # Ship may have been moved outside of this Agent. Paging still updates
+    # the shared Ships, and stops at the first Ship found
     return any(
         s.nav.waypoint_symbol == symbol
         for s in agent.fleet if s.nav.status != 'IN_TRANSIT'
     )
 
 
+def set_local_agent(agent):
+    """
+    Sets the Agent that unpickled or loaded items will be attached to in the
+    current process. Intended to be called from a process pool's initializer
+
+    >>> def init_worker():
+    ...     snisp.utils.set_local_agent(Agent(symbol='your_symbol_here'))
+    >>> pool = ProcessPoolExecutor(initializer=init_worker)
+
+    Args:
+        agent: The Agent for the current process or None for data-only items
+    """
+    global LOCAL_AGENT
+    LOCAL_AGENT = agent
+
+
+@functools.lru_cache(maxsize=1024)
+def dynamic_class(name, is_json):
+    # Nested items have no module-level class, so one class is built per
+    # name and shared by every instance instead of one per conversion
+    return type(name, (BaseJSONItem if is_json else BaseItem,), {})
+
+
+def restore_item(module, name, is_json, data, agent=None):
+    """
+    Rebuilds an AbstractJSONItem from the output of __reduce__
+
+    Ships attached to an Agent are applied to, and returned as, the shared
+    instance in agent.fleet.states
+
+    Raises:
+        SerializationError: module is not part of the Library
+    """
+    if module != 'snisp' and not module.startswith('snisp.'):
+        raise exceptions.SerializationError(
+            f'{module!r} is not a SnakesInSpace module'
+        )
+    cls = getattr(importlib.import_module(module), name, None)
+    if not isinstance(cls, type) or not issubclass(cls, AbstractJSONItem):
+        cls = dynamic_class(name, is_json)
+    output = object.__new__(cls)
+    if not is_json:
+        output.agent = agent if agent is not None else LOCAL_AGENT
+    output._data = data
+    if (
+        module == 'snisp.fleet' and name == 'Ship'
+        and output.agent is not None
+    ):
+        return output.agent.fleet.states.update(output.to_dict())
+    return output
+
+
+def dumps(item):
+    """
+    Serializes an AbstractJSONItem, or a list of them, to a compact,
+    versioned binary form. Only the data is serialized
+
+    Args:
+        item: An AbstractJSONItem or list-like of AbstractJSONItems
+
+    Returns:
+        bytes
+    """
+    payload = json.dumps(encode_item(item), separators=(',', ':'))
+    return SERIAL_HEADER.pack(SERIAL_MAGIC, SERIAL_VERSION) + zlib.compress(
+        payload.encode('utf8')
+    )
+
+
+def loads(data, agent=None):
+    """
+    Loads the output of dumps, attaching every item to the agent
+
+    Args:
+        data: bytes from snisp.utils.dumps
+
+    Kwargs:
+        agent: The Agent to attach. Default is None for the LOCAL_AGENT
+
+    Raises:
+        SerializationError: data is not from a supported version of dumps
+
+    Returns:
+        AbstractJSONItem or a list of AbstractJSONItems
+    """
+    try:
+        magic, version = SERIAL_HEADER.unpack_from(data)
+    except struct.error:
+        raise exceptions.SerializationError('Not a SnakesInSpace payload')
+    if magic != SERIAL_MAGIC:
+        raise exceptions.SerializationError('Not a SnakesInSpace payload')
+    if version != SERIAL_VERSION:
+        raise exceptions.SerializationError(
+            f'Unsupported serialization version {version}. '
+            f'Expected {SERIAL_VERSION}'
+        )
+    payload = zlib.decompress(data[SERIAL_HEADER.size:]).decode('utf8')
+    return decode_item(json.loads(payload), agent)
+
+
+def encode_item(value):
+    if isinstance(value, AbstractJSONItem):
+        cls = type(value)
+        return {
+            SERIAL_TAG: [
+                cls.__module__, cls.__name__, issubclass(cls, BaseJSONItem)
+            ],
+            'data': encode_item(value._data),
+        }
+    if isinstance(value, dict):
+        return {k: encode_item(v) for k, v in value.items()}
+    if is_list_like(value):
+        return [encode_item(i) for i in value]
+    return value
+
+
+def decode_item(value, agent=None):
+    if isinstance(value, dict):
+        if tag := value.get(SERIAL_TAG):
+            module, name, is_json = tag
+            data = decode_item(value['data'], agent)
+            return restore_item(module, name, is_json, data, agent=agent)
+        return {k: decode_item(v, agent) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode_item(i, agent) for i in value]
+    return value
+
+
 def thread_exception_hook_logger(err):  # pragma: no cover
     logger.warning(f'ThreadExcetion: {err!r}')
     logger.warning(traceback.extract_tb(err.exc_traceback))
@@ -636,6 +940,19 @@ REFINABLE_SYMBOLS = frozenset(
     ]
 )
 
+# The good each of the REFINABLE_SYMBOLS is refined from
+REFINING_INPUTS = {
+    'ALUMINUM': 'ALUMINUM_ORE',
+    'COPPER': 'COPPER_ORE',
+    'FUEL': 'HYDROCARBON',
+    'GOLD': 'GOLD_ORE',
+    'IRON': 'IRON_ORE',
+    'MERITIUM': 'MERITIUM_ORE',
+    'PLATINUM': 'PLATINUM_ORE',
+    'SILVER': 'SILVER_ORE',
+    'URANITE': 'URANITE_ORE',
+}
+
 
 SHIP_MOUNTS = frozenset(
     [
@@ -238,6 +238,8 @@ class Waypoints:
             raise e
         with self.agent.lock:
             cache.reset_fuel_stations(ship.location)
+            cache.reset_distance_tables(ship.location)
+            cache.reset_jump_gate(ship.location)
             database.reset_system(ship.location.system)
         logger.info(
             f'{ship.registration.role}: {ship.symbol} | '
@@ -274,7 +276,11 @@ class Waypoints:
 
     def surveys(self):
         surveyed_wps = set()
-        for ship in self.agent.fleet:
+        surveyors = self.agent.fleet.snapshot().select(
+            mount=lambda x: x.upper().startswith('MOUNT_SURVEYOR_'),
+            status='IN_ORBIT',
+        )
+        for ship in surveyors:
             if ship.nav.waypoint_symbol in surveyed_wps:
                 continue
             if ship.nav.route.destination.type in utils.SURVEYABLE_WAYPOINTS:
@@ -935,17 +941,17 @@ def best_asteroid(ship, trade_symbol=None, *, contract=None):
         large_waypoints = (
             ship.waypoints.get(waypoint_symbol=i) for i in large_surveys
         )
-        return min(large_waypoints, key=lambda x: ship.distance(x))
+        return ship.closest(large_waypoints)
     if moderate_surveys:
         moderate_waypoints = (
             ship.waypoints.get(waypoint_symbol=i) for i in moderate_surveys
         )
-        return min(moderate_waypoints, key=lambda x: ship.distance(x))
+        return ship.closest(moderate_waypoints)
     if small_surveys:
         small_waypoints = (
             ship.waypoints.get(waypoint_symbol=i) for i in small_surveys
         )
-        return min(small_waypoints, key=lambda x: ship.distance(x))
+        return ship.closest(small_waypoints)
 
 
 @functools.lru_cache
@@ -1,5 +1,6 @@
 import httpx
 import json
+import math
 import pytest
 import os
 
@@ -30,3 +31,41 @@ class TestAgent:
             self.agent, json_data['data']
         )
         attribute_test(response, json_data['data'])
+
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_ledger(self, respx_mock):
+        json_data = json.load(
+            open(os.path.join(DATA_DIR, 'agent_data.json'), encoding='utf8')
+        )
+        agent_route = respx_mock.get('/my/agent').mock(
+            return_value=httpx.Response(200, json=json_data)
+        )
+        agent = snisp.agent.Agent(symbol='testing', faction='testing')
+        ledger = agent.ledger
+        assert repr(ledger) == f'Ledger({agent!r})'
+
+        # Reconciled on first use, then kept locally
+        assert ledger.credits == 10_000
+        assert ledger.credits == 10_000
+        assert agent_route.call_count == 1
+
+        ledger.record({'credits': 7_500})
+        ledger.record(None)
+        ledger.record({'symbol': 'TESTING'})
+        assert ledger.credits == 7_500
+        assert agent_route.call_count == 1
+
+        # Closed form affordable units
+        assert ledger.affordable(1_000) == 7
+        assert ledger.affordable(1_000, buffer=5_000) == 2
+        assert ledger.affordable(1_000, buffer=10_000) == 0
+        assert ledger.affordable(0) == math.inf
+
+        # Stale or invalidated balances are reconciled
+        ledger.invalidate()
+        assert ledger.credits == 10_000
+        assert agent_route.call_count == 2
+        ledger.record({'credits': 1})
+        ledger.max_age = -1
+        assert ledger.credits == 10_000
+        assert agent_route.call_count == 3
@@ -0,0 +1,152 @@
+import copy
+import itertools
+import json
+import os
+import pytest
+
+import snisp
+
+from . import DATA_DIR
+
+
+class TestAssignment:
+
+    agent = snisp.agent.Agent(symbol='testing', faction='testing')
+
+    def load_ship(self, symbol, x, y=0, *, current=100, speed=10):
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )['data']
+        ship_data['symbol'] = symbol
+        ship_data['nav']['status'] = 'IN_ORBIT'
+        ship_data['nav']['route']['destination'] |= {'x': x, 'y': y}
+        ship_data['fuel']['current'] = current
+        ship_data['fuel']['capacity'] = 100
+        ship_data['engine']['speed'] = speed
+        return snisp.fleet.Ship(self.agent, copy.deepcopy(ship_data))
+
+    def load_waypoint(self, symbol, x, y=0):
+        waypoint_data = json.load(
+            open(os.path.join(DATA_DIR, 'waypoint.json'), encoding='utf8')
+        )['data']
+        waypoint_data['symbol'] = symbol
+        waypoint_data['x'] = x
+        waypoint_data['y'] = y
+        return snisp.waypoints.Waypoint(self.agent, waypoint_data)
+
+    @pytest.mark.parametrize('use_numpy', [True, False])
+    def test_cost_matrix(self, use_numpy, monkeypatch):
+        if not use_numpy:
+            monkeypatch.setattr(snisp.utils, 'numpy', None)
+            monkeypatch.setattr(snisp.assignment, 'numpy', None)
+        elif snisp.assignment.numpy is None:  # pragma: no cover
+            pytest.skip('numpy is not installed')
+        full = self.load_ship('FULL', 0)
+        empty = self.load_ship('EMPTY', 0, current=10)
+        near = self.load_waypoint('X1-TEST-NEAR', 10)
+        far = self.load_waypoint('X1-TEST-FAR', 40)
+        costs = snisp.assignment.cost_matrix([full, empty], [near, far])
+        assert costs == [
+            [
+                snisp.navigation.travel_time(10, 10, 'CRUISE'),
+                snisp.navigation.travel_time(40, 10, 'CRUISE'),
+            ],
+            [
+                snisp.navigation.travel_time(10, 10, 'CRUISE'),
+                # Not enough fuel on hand to CRUISE
+                snisp.navigation.travel_time(40, 10, 'DRIFT'),
+            ],
+        ]
+        assert snisp.assignment.cost_matrix([full], []) == [[]]
+        assert snisp.assignment.cost_matrix([], [near]) == []
+
+    def test_solve(self):
+        costs = [
+            [4, 1, 3],
+            [2, 0, 5],
+            [3, 2, 2],
+        ]
+        assert snisp.assignment.solve(costs) == [(0, 1), (1, 0), (2, 2)]
+
+        # Matches a brute force search
+        costs = [
+            [7, 3, 9, 4, 8],
+            [2, 6, 1, 7, 3],
+            [5, 8, 4, 2, 6],
+            [9, 1, 7, 5, 2],
+        ]
+        best = min(
+            sum(costs[i][j] for i, j in enumerate(columns))
+            for columns in itertools.permutations(range(5), 4)
+        )
+        pairs = snisp.assignment.solve(costs)
+        assert len(pairs) == 4
+        assert len({j for _, j in pairs}) == 4
+        assert sum(costs[i][j] for i, j in pairs) == best
+
+        # More rows than columns leaves the costliest rows out
+        transposed = [list(i) for i in zip(*costs)]
+        pairs = snisp.assignment.solve(transposed)
+        assert [i for i, _ in pairs] == sorted(i for i, _ in pairs)
+        assert len(pairs) == 4
+        assert sum(transposed[i][j] for i, j in pairs) == best
+
+        assert snisp.assignment.solve([]) == []
+        assert snisp.assignment.solve([[]]) == []
+
+    def test_assign(self):
+        # Greedy nearest-first sends A to M1, leaving B the long way to M2
+        a = self.load_ship('A', 0)
+        b = self.load_ship('B', 10)
+        m1 = self.load_waypoint('X1-TEST-M1', 4)
+        m2 = self.load_waypoint('X1-TEST-M2', 0, -5)
+        pairs = snisp.assignment.assign([a, b], [m1, m2])
+        assert [(i.symbol, j.symbol) for i, j in pairs] == [
+            ('A', 'X1-TEST-M2'), ('B', 'X1-TEST-M1')
+        ]
+
+        # Custom costs
+        pairs = snisp.assignment.assign(
+            [a, b], [m1, m2], cost=lambda ships, targets: [[0, 1], [1, 0]]
+        )
+        assert [(i.symbol, j.symbol) for i, j in pairs] == [
+            ('A', 'X1-TEST-M1'), ('B', 'X1-TEST-M2')
+        ]
+        assert snisp.assignment.assign([], [m1]) == []
+
+    def test_assigner(self):
+        a = self.load_ship('A', 0)
+        b = self.load_ship('B', 100)
+        m1 = self.load_waypoint('X1-TEST-M1', 10)
+        m2 = self.load_waypoint('X1-TEST-M2', 90)
+        m3 = self.load_waypoint('X1-TEST-M3', 50)
+        assigner = snisp.assignment.Assigner()
+        pairs = assigner.update([a], [m1, m2, m3])
+        assert [(i.symbol, j.symbol) for i, j in pairs] == [
+            ('A', 'X1-TEST-M1')
+        ]
+        assert 'A' in assigner and a in assigner
+        assert assigner[a].symbol == 'X1-TEST-M1'
+
+        # A keeps its target, even if B is closer to it
+        c = self.load_ship('C', 10)
+        pairs = assigner.update([a, b, c], [m1, m2, m3])
+        assert sorted((i.symbol, j.symbol) for i, j in pairs) == [
+            ('B', 'X1-TEST-M2'), ('C', 'X1-TEST-M3')
+        ]
+        assert len(assigner) == 3
+        assert repr(assigner) == 'Assigner(3 assigned)'
+
+        # Nothing new to assign
+        assert assigner.update([a, b, c], [m1, m2, m3]) == []
+
+        # Finished targets and Ships that are gone are dropped
+        m4 = self.load_waypoint('X1-TEST-M4', 0)
+        pairs = assigner.update([a, c], [m2, m3, m4])
+        assert [(i.symbol, j.symbol) for i, j in pairs] == [
+            ('A', 'X1-TEST-M4')
+        ]
+        assert 'B' not in assigner
+        assert assigner.release(c).symbol == 'X1-TEST-M3'
+        assert assigner.release('C') is None
+        assert len(assigner) == 1
@@ -1,11 +1,13 @@
 import copy
 import dateutil
+import functools
 import httpx
 import inspect
 import itertools
 import json
 import os
 import pytest
+import time
 
 from datetime import datetime, timedelta, timezone
 from respx.patterns import M
@@ -19,6 +21,10 @@ class TestFleet:
 
     agent = snisp.agent.Agent(symbol='testing', faction='testing')
 
+    def setup_method(self):
+        # Each test pages a different Fleet into the snapshot
+        self.agent.fleet.states.loaded = None
+
     def test_repr(self, respx_mock):
         assert repr(self.agent.fleet) == f'Fleet({self.agent!r})'
 
@@ -1258,6 +1264,122 @@ class TestFleetShip:
         ship.orbit()
         assert ship.nav.status == 'IN_ORBIT'
 
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_batch(self, respx_mock):
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )
+        ship_data['data']['nav']['status'] = 'IN_ORBIT'
+        respx_mock.get('/my/ships/TEST_SHIP_SYMBOL').mock(
+            return_value=httpx.Response(200, json=ship_data)
+        )
+        nav = ship_data['data']['nav']
+
+        def move(status):
+            def side_effect(request, route):
+                nav['status'] = status
+                return httpx.Response(200, json={'data': {'nav': nav}})
+            return side_effect
+
+        dock_route = respx_mock.post('/my/ships/TEST_SHIP_SYMBOL/dock')
+        dock_route.side_effect = move('DOCKED')
+        orbit_route = respx_mock.post('/my/ships/TEST_SHIP_SYMBOL/orbit')
+        orbit_route.side_effect = move('IN_ORBIT')
+
+        # Stacked preconditions merge into a single wrapper
+        Preconditions = snisp.decorators.Preconditions
+        ship = self.agent.fleet('TEST_SHIP_SYMBOL')
+        assert snisp.decorators.preconditions(ship.refuel) == (
+            Preconditions(transit=True, status='DOCKED')
+        )
+        assert snisp.decorators.preconditions(ship.scan) == (
+            Preconditions(True, True, 'IN_ORBIT')
+        )
+        assert snisp.decorators.preconditions(ship.refresh) == (
+            Preconditions()
+        )
+        assert snisp.fleet.Ship.refuel.__wrapped__.__wrapped__.__name__ == (
+            'refuel'
+        )
+        assert not hasattr(
+            snisp.fleet.Ship.refuel.__wrapped__.__wrapped__, '__wrapped__'
+        )
+
+        statuses = []
+
+        @snisp.decorators.transit
+        @snisp.decorators.docked
+        def sell(ship, good):
+            statuses.append((good, ship.nav.status))
+            return good
+
+        @snisp.decorators.transit
+        @snisp.decorators.in_orbit
+        def extract(ship):
+            statuses.append(('extract', ship.nav.status))
+
+        def note(ship):
+            statuses.append(('note', ship.nav.status))
+
+        actions = [
+            functools.partial(sell, ship, 'IRON'),
+            functools.partial(note, ship),
+            functools.partial(sell, ship, 'COPPER'),
+            functools.partial(extract, ship),
+            functools.partial(extract, ship),
+            functools.partial(sell, ship, 'ICE'),
+        ]
+        assert snisp.decorators.plan_transitions('IN_ORBIT', actions) == [
+            'DOCKED', None, None, 'IN_ORBIT', None, 'DOCKED'
+        ]
+        # Arriving leaves the Ship in orbit
+        assert snisp.decorators.plan_transitions(
+            'IN_TRANSIT', actions[3:]
+        ) == [None, None, 'DOCKED']
+        results = ship.batch(*actions)
+        assert results == ['IRON', None, 'COPPER', None, None, 'ICE']
+        assert statuses == [
+            ('IRON', 'DOCKED'),
+            ('note', 'DOCKED'),
+            ('COPPER', 'DOCKED'),
+            ('extract', 'IN_ORBIT'),
+            ('extract', 'IN_ORBIT'),
+            ('ICE', 'DOCKED'),
+        ]
+        assert dock_route.call_count == 2
+        assert orbit_route.call_count == 1
+
+    def test_batch_async(self):
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )['data']
+        agent = snisp.agent.Agent(symbol='testing', faction='testing')
+        ship = snisp.fleet.Ship(agent, ship_data)
+        calls = []
+
+        @snisp.decorators.cooldown
+        def extract(ship):
+            calls.append(time.monotonic())
+            cooldown = ship.cooldown.to_dict()
+            cooldown['expiration'] = (
+                datetime.now(timezone.utc) + timedelta(seconds=.3)
+            ).isoformat()
+            ship.update_data_item('cooldown', cooldown)
+            return len(calls)
+
+        future = ship.batch_async(
+            functools.partial(extract, ship),
+            functools.partial(extract, ship),
+        )
+        try:
+            # The second extract waits out the first one's cooldown and is
+            # resumed on its own, without running the first again
+            assert future.result(timeout=5) == [1, 2]
+        finally:
+            agent.scheduler.stop()
+        assert len(calls) == 2
+        assert calls[1] - calls[0] >= .2
+
     @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
     def test_siphon(self, respx_mock):
         waypoint_data = json.load(
@@ -1450,6 +1572,13 @@ class TestFleetShip:
             assert ship.cooldown.total_seconds == 60
             assert ship.cooldown.remaining_seconds == 59
 
+            # Resolves to the scanned Ships, not an unrun generator
+            scans = ship.scan_async().result(timeout=5)
+            ship.agent.scheduler.stop()
+            assert [i.symbol for i in scans] == [
+                'TEST-SCAN-SHIP-01', 'TEST-SCAN-SHIP-02'
+            ]
+
         # Cooldown is caught in the decorator
         # 4000: CooldownConflictError,
 
@@ -1902,9 +2031,13 @@ class TestFleetShip:
         ship = self.agent.fleet('TEST_SHIP_SYMBOL')
         # Purchase up to cargo limit
         with p_side_effect:
+            calls = agent_route.call_count
             transactions = ship.autopurchase(
                 trade_symbol, max_units=amount_to_purchase, buffer=0
             )
+            # The balance is only read once, not per purchase
+            assert len(transactions) > 1
+            assert agent_route.call_count == calls + 1
             assert ship.cargo.units == amount_to_purchase
             assert ship.cargo.inventory[0].symbol == trade_symbol
             assert ship.cargo.inventory[0].units == amount_to_purchase
@@ -2913,6 +3046,591 @@ class TestFleetShip:
             from_ship.transfer(to_ship, symbol='INVALID', units=30)
 
 
+class TestShipStateStore:
+
+    agent = snisp.agent.Agent(symbol='testing', faction='testing')
+
+    def test_repr(self, respx_mock):
+        assert repr(self.agent.fleet.states) == (
+            f'ShipStateStore({self.agent!r})'
+        )
+
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_identity(self, respx_mock):
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )
+        ship_data['data']['nav']['status'] = 'IN_ORBIT'
+        respx_mock.get('/my/ships/TEST_SHIP_SYMBOL').mock(
+            return_value=httpx.Response(200, json=ship_data)
+        )
+        respx_mock.get(
+            '/my/ships', params={'page': 1, 'limit': 20}
+        ).mock(
+            return_value=httpx.Response(
+                200, json={'data': [copy.deepcopy(ship_data['data'])]}
+            )
+        )
+        respx_mock.get(
+            '/my/ships', params={'page': 2, 'limit': 20}
+        ).mock(
+            return_value=httpx.Response(200, json={'data': []})
+        )
+        dock_data = json.load(
+            open(os.path.join(DATA_DIR, 'dock.json'), encoding='utf8')
+        )
+        respx_mock.post('/my/ships/TEST_SHIP_SYMBOL/dock').mock(
+            return_value=httpx.Response(200, json=dock_data)
+        )
+
+        ship = self.agent.fleet('TEST_SHIP_SYMBOL')
+        assert ship is self.agent.fleet('TEST_SHIP_SYMBOL')
+        assert [ship] == list(self.agent.fleet)
+        assert ship is next(iter(self.agent.fleet))
+        assert ship is ship.refresh()
+        assert ship is self.agent.fleet.states.get('test_ship_symbol')
+        assert 'TEST_SHIP_SYMBOL' in self.agent.fleet.states
+        assert len(self.agent.fleet.states) == 1
+
+        other = next(iter(self.agent.fleet))
+        assert other.nav.status == 'IN_ORBIT'
+        ship.dock()
+        assert other.nav.status == 'DOCKED'
+
+        # A full refresh replaces the Ship's data for every handle
+        ship_data['data']['fuel']['current'] = 1
+        respx_mock.get('/my/ships/TEST_SHIP_SYMBOL').mock(
+            return_value=httpx.Response(200, json=ship_data)
+        )
+        assert self.agent.fleet('TEST_SHIP_SYMBOL').fuel.current == 1
+        assert other.fuel.current == 1
+
+        self.agent.fleet.states.remove('TEST_SHIP_SYMBOL')
+        assert self.agent.fleet.states.get('TEST_SHIP_SYMBOL') is None
+        assert self.agent.fleet('TEST_SHIP_SYMBOL') is not ship
+
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_staleness(self, respx_mock):
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )
+        respx_mock.get('/my/ships/TEST_SHIP_SYMBOL').mock(
+            return_value=httpx.Response(200, json=ship_data)
+        )
+        states = self.agent.fleet.states
+        assert states.is_stale('UNKNOWN_SHIP_SYMBOL', 'nav')
+        assert states.last_updated('UNKNOWN_SHIP_SYMBOL', 'nav') is None
+
+        ship = self.agent.fleet('TEST_SHIP_SYMBOL')
+        for field in ('nav', 'fuel', 'cargo', 'cooldown'):
+            assert states.last_updated(ship.symbol, field) is not None
+            assert not states.is_stale(ship.symbol, field)
+            assert states.is_stale(ship.symbol, field, max_age=-1)
+
+        ship.arrived_at_destination()
+        assert states.is_stale(ship.symbol, 'nav')
+        assert not states.is_stale(ship.symbol, 'fuel')
+
+        ship.refresh()
+        assert not states.is_stale(ship.symbol, 'nav')
+
+        # Updates to a detached copy do not mark the shared Ship as fresh
+        states.invalidate(ship.symbol, 'fuel')
+        detached = snisp.fleet.Ship(self.agent, ship.to_dict())
+        detached.update_data_item('fuel', detached.fuel.to_dict())
+        assert states.is_stale(ship.symbol, 'fuel')
+
+    def test_update_syncs_once(self, monkeypatch):
+        agent = snisp.agent.Agent(symbol='testing', faction='testing')
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )['data']
+        ship = agent.fleet.states.update(copy.deepcopy(ship_data))
+        calls = []
+        for target in (agent.fleet.states.arrays, agent.fleet.states.index):
+            monkeypatch.setattr(
+                target, 'update', lambda ship, target=target: calls.append(
+                    type(target).__name__
+                )
+            )
+        ship_data['fuel']['current'] = 1
+        assert agent.fleet.states.update(copy.deepcopy(ship_data)) is ship
+        assert calls == ['FleetState', 'FleetIndex']
+        assert ship.fuel.current == 1
+        assert not agent.fleet.states.is_stale(ship.symbol, 'fuel')
+
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_command_ship(self, respx_mock):
+        agent = snisp.agent.Agent(symbol='testing', faction='testing')
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )
+        ship_route = respx_mock.get('/my/ships/TEST_SHIP_SYMBOL').mock(
+            return_value=httpx.Response(200, json=ship_data)
+        )
+        respx_mock.get(
+            '/my/ships', params={'page': 1, 'limit': 20}
+        ).mock(
+            return_value=httpx.Response(
+                200, json={'data': [copy.deepcopy(ship_data['data'])]}
+            )
+        )
+        command_ship = agent.fleet.command_ship
+        assert command_ship is agent.fleet.states.get('TEST_SHIP_SYMBOL')
+        assert agent.fleet.command_ship is command_ship
+        assert not ship_route.called
+
+        # Only a stale nav is refreshed from the server
+        agent.fleet.states.invalidate(command_ship.symbol, 'nav')
+        assert agent.fleet.command_ship is command_ship
+        assert ship_route.call_count == 1
+
+
+class TestFleetState:
+
+    def load_ships(self, agent):
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )['data']
+        ships = []
+        rows = (
+            # symbol, x, y, cargo units, fuel current, status
+            ('NEAR_EMPTY', 3, 4, 1, 100, 'IN_ORBIT'),
+            ('NEAR_FULL', 0, 1, 40, 100, 'DOCKED'),
+            ('FAR_EMPTY', 300, 400, 0, 10, 'IN_ORBIT'),
+        )
+        for symbol, x, y, units, fuel, status in rows:
+            data = copy.deepcopy(ship_data)
+            data['symbol'] = symbol
+            data['nav']['systemSymbol'] = 'TEST-SYSTEM'
+            data['nav']['status'] = status
+            data['nav']['route']['destination'].update({'x': x, 'y': y})
+            data['cargo']['units'] = units
+            data['fuel'].update({'current': fuel, 'capacity': 100})
+            ships.append(agent.fleet.states.update(data))
+        return ships
+
+    @pytest.mark.parametrize('use_numpy', [True, False])
+    def test_query(self, use_numpy, monkeypatch):
+        if not use_numpy:
+            monkeypatch.setattr(snisp.fleet, 'numpy', None)
+        elif snisp.fleet.numpy is None:
+            pytest.skip('numpy is not installed')
+        agent = snisp.agent.Agent(symbol='testing', faction='testing')
+        near_empty, near_full, far_empty = self.load_ships(agent)
+        arrays = agent.fleet.arrays
+        assert arrays is agent.fleet.states.arrays
+        assert len(arrays) == 3
+        waypoint = snisp.waypoints.Waypoint(
+            agent,
+            {'symbol': 'W', 'systemSymbol': 'TEST-SYSTEM', 'x': 0, 'y': 0},
+        )
+
+        assert arrays.query(near=waypoint, radius=10) == [
+            near_empty, near_full
+        ]
+        assert arrays.query(near=waypoint, radius=10, max_cargo=.5) == [
+            near_empty
+        ]
+        assert arrays.query(near=waypoint, max_cargo=.5) == [
+            near_empty, far_empty
+        ]
+        assert arrays.query(status='DOCKED') == [near_full]
+        assert arrays.full() == [near_full]
+        assert arrays.needs_fuel() == [far_empty]
+        assert arrays.closest(waypoint) is near_full
+        assert arrays.closest(waypoint, max_cargo=.5) is near_empty
+        assert arrays.query(ready=True) == [near_empty, near_full, far_empty]
+        assert arrays.query(ready=False) == []
+
+        other = snisp.waypoints.Waypoint(
+            agent, {'symbol': 'O', 'systemSymbol': 'OTHER', 'x': 0, 'y': 0}
+        )
+        assert arrays.query(near=other) == []
+        assert arrays.closest(other) is None
+
+        # Action responses keep the arrays in sync
+        near_empty.update_data_item(
+            'cargo', {**near_empty.cargo.to_dict(), 'units': 40}
+        )
+        assert arrays.full() == [near_empty, near_full]
+        near_empty.update_data_item(
+            'nav', {**near_empty.nav.to_dict(), 'status': 'DOCKED'}
+        )
+        assert arrays.query(status='DOCKED') == [near_empty, near_full]
+
+        agent.fleet.states.remove('NEAR_EMPTY')
+        assert len(arrays) == 2
+        assert arrays.query(near=waypoint) == [far_empty, near_full]
+        assert arrays.index == {'FAR_EMPTY': 0, 'NEAR_FULL': 1}
+
+
+class TestFleetIndex:
+
+    def load_ships(self, agent):
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )['data']
+        rows = (
+            # symbol, frame, role, mounts, waypoint, status
+            ('DRONE_1', 'FRAME_DRONE', 'EXCAVATOR',
+             ['MOUNT_MINING_LASER_I'], 'WP-A', 'IN_ORBIT'),
+            ('DRONE_2', 'FRAME_DRONE', 'EXCAVATOR',
+             ['MOUNT_GAS_SIPHON_I'], 'WP-B', 'IN_TRANSIT'),
+            ('HAULER', 'FRAME_LIGHT_FREIGHTER', 'HAULER',
+             [], 'WP-A', 'DOCKED'),
+            ('PROBE', 'FRAME_PROBE', 'SATELLITE',
+             [], 'WP-B', 'DOCKED'),
+        )
+        ships = []
+        for symbol, frame, role, mounts, waypoint, status in rows:
+            data = copy.deepcopy(ship_data)
+            data['symbol'] = symbol
+            data['frame']['symbol'] = frame
+            data['registration']['role'] = role
+            data['mounts'] = [
+                m for m in data['mounts'] if m['symbol'] in mounts
+            ]
+            data['nav']['waypointSymbol'] = waypoint
+            data['nav']['status'] = status
+            ships.append(agent.fleet.states.update(data))
+        agent.fleet.states.loaded = datetime.now(timezone.utc)
+        return ships
+
+    def test_select(self):
+        agent = snisp.agent.Agent(symbol='testing', faction='testing')
+        drone_1, drone_2, hauler, probe = self.load_ships(agent)
+        index = agent.fleet.snapshot()
+        assert index is agent.fleet.states.index
+        assert len(index) == 4
+
+        assert list(agent.fleet.drones()) == [drone_1, drone_2]
+        assert list(agent.fleet.mining_drones()) == [drone_1]
+        assert list(agent.fleet.siphon_drones()) == [drone_2]
+        assert list(agent.fleet.freighters()) == [hauler]
+        assert list(agent.fleet.probes()) == [probe]
+        assert list(agent.fleet.ships()) == [hauler]
+        assert list(agent.fleet.shuttles()) == []
+
+        assert index.select() == [drone_1, drone_2, hauler, probe]
+        assert index.select(waypoint='WP-A') == [drone_1, hauler]
+        assert index.select(role='HAULER', status='DOCKED') == [hauler]
+        assert index.select(status=lambda x: x != 'IN_TRANSIT') == [
+            drone_1, hauler, probe
+        ]
+        assert index.values('frame') == {
+            'FRAME_DRONE': 2, 'FRAME_LIGHT_FREIGHTER': 1, 'FRAME_PROBE': 1
+        }
+        with pytest.raises(snisp.exceptions.SpaceAttributeError):
+            index.select(fuel=100)
+
+        # Action responses keep the index current
+        nav = drone_2.nav.to_dict()
+        nav['status'] = 'IN_ORBIT'
+        nav['waypointSymbol'] = 'WP-A'
+        drone_2.update_data_item('nav', nav)
+        assert index.select(waypoint='WP-A', status='IN_ORBIT') == [
+            drone_1, drone_2
+        ]
+        assert 'WP-B' in index.values('waypoint')
+        drone_1.update_data_item('mounts', [])
+        assert list(agent.fleet.mining_drones()) == []
+
+        agent.dead_ships[probe.symbol] = probe
+        assert list(agent.fleet.probes()) == []
+        agent.fleet.states.remove(hauler.symbol)
+        assert index.select(waypoint='WP-A') == [drone_1, drone_2]
+        assert 'HAULER' not in index.values('role')
+
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_snapshot_refresh(self, respx_mock):
+        agent = snisp.agent.Agent(symbol='testing', faction='testing')
+        self.load_ships(agent)
+        drone_data = json.load(
+            open(
+                os.path.join(DATA_DIR, 'fleet_list_drones.json'),
+                encoding='utf8'
+            )
+        )
+        page_1 = respx_mock.get(
+            '/my/ships', params={'page': 1, 'limit': 20}
+        ).mock(
+            return_value=httpx.Response(200, json=drone_data)
+        )
+        respx_mock.get(
+            '/my/ships', params={'page': 2, 'limit': 20}
+        ).mock(
+            return_value=httpx.Response(200, json={'data': []})
+        )
+        # Already loaded, so no requests are made
+        assert len(list(agent.fleet.drones())) == 2
+        assert not page_1.called
+
+        index = agent.fleet.snapshot(refresh=True)
+        assert page_1.call_count == 1
+        assert len(index) == len(drone_data['data'])
+        assert [i.symbol for i in agent.fleet.drones()] == [
+            i['symbol'] for i in drone_data['data']
+            if i['frame']['symbol'] == 'FRAME_DRONE'
+        ]
+        assert 'HAULER' not in agent.fleet.states
+        agent.fleet.snapshot()
+        assert page_1.call_count == 1
+
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_refresh(self, respx_mock):
+        agent = snisp.agent.Agent(symbol='testing', faction='testing')
+        drone_1, drone_2, hauler, probe = self.load_ships(agent)
+        drone_data = drone_1.to_dict()
+        drone_data['fuel']['current'] = 1
+        drone_route = respx_mock.get('/my/ships/DRONE_1').mock(
+            return_value=httpx.Response(200, json={'data': drone_data})
+        )
+        probe_route = respx_mock.get('/my/ships/PROBE').mock(
+            return_value=httpx.Response(
+                404, json={'error': {'message': 'Not found', 'code': 404}}
+            )
+        )
+        fleet_data = [
+            ship.to_dict() for ship in (drone_1, drone_2, hauler)
+        ]
+        page_1 = respx_mock.get(
+            '/my/ships', params={'page': 1, 'limit': 20}
+        ).mock(
+            return_value=httpx.Response(200, json={'data': fleet_data})
+        )
+        respx_mock.get(
+            '/my/ships', params={'page': 2, 'limit': 20}
+        ).mock(
+            return_value=httpx.Response(200, json={'data': []})
+        )
+
+        # One Ship out of a single page of Ships is a single GET
+        assert agent.fleet.refresh([drone_1]) == [drone_1]
+        assert drone_route.call_count == 1
+        assert drone_1.fuel.current == 1
+        assert not page_1.called
+
+        # Ships that no longer exist are omitted
+        assert agent.fleet.refresh([probe]) == []
+        assert probe_route.call_count == 1
+        assert 'PROBE' not in agent.fleet.states
+
+        # More Ships than pages of the Fleet pages the Fleet instead
+        assert agent.fleet.refresh([drone_1, drone_2]) == [drone_1, drone_2]
+        assert page_1.call_count == 1
+        assert drone_route.call_count == 1
+
+        # The size of a Fleet that has not been loaded is unknown
+        agent.fleet.states.loaded = None
+        assert agent.fleet.refresh([hauler]) == [hauler]
+        assert page_1.call_count == 2
+
+        ships = agent.fleet.refresh_all()
+        assert ships == [drone_1, drone_2, hauler]
+        assert page_1.call_count == 3
+        assert agent.fleet.refresh([]) == []
+
+
+class TestFleetWait:
+
+    agent = snisp.agent.Agent(symbol='testing', faction='testing')
+
+    def load_ship(self, symbol, arrival, expiration):
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )['data']
+        now = datetime.now(timezone.utc)
+        ship_data['symbol'] = symbol
+        ship_data['nav']['status'] = 'IN_TRANSIT'
+        ship_data['nav']['route']['arrival'] = (
+            now + timedelta(seconds=arrival)
+        ).isoformat()
+        ship_data['cooldown']['expiration'] = (
+            now + timedelta(seconds=expiration)
+        ).isoformat()
+        return snisp.fleet.Ship(self.agent, ship_data)
+
+    def test_wait_any(self):
+        fast = self.load_ship('FAST', .05, 60)
+        slow = self.load_ship('SLOW', .3, -1)
+        assert self.agent.fleet.wait_any([]) == []
+
+        assert self.agent.fleet.wait_any([slow, fast], 'arrival') == [fast]
+        assert fast.nav.status == 'IN_ORBIT'
+        assert slow.nav.status == 'IN_TRANSIT'
+        assert self.agent.fleet.wait_any([slow, fast], 'cooldown') == [slow]
+        assert slow.nav.status == 'IN_TRANSIT'
+
+        # Neither is ready, and won't be for a while
+        assert self.agent.fleet.wait_any([slow, fast], timeout=.01) == []
+
+    def test_wait_all(self):
+        fast = self.load_ship('FAST', .05, -1)
+        slow = self.load_ship('SLOW', .15, -1)
+        ready = self.agent.fleet.wait_all([fast, slow], 'arrival')
+        assert ready == [fast, slow]
+        assert all(i.nav.status == 'IN_ORBIT' for i in ready)
+
+        fast = self.load_ship('FAST', .05, -1)
+        slow = self.load_ship('SLOW', 60, -1)
+        ready = self.agent.fleet.wait_all([fast, slow], timeout=.1)
+        assert ready == [fast]
+
+    def test_wait_in_scheduler(self):
+        ship = self.load_ship('SCHEDULED', .1, -1)
+        scheduler = snisp.scheduler.Scheduler(self.agent)
+        with scheduler:
+            future = scheduler.submit(
+                self.agent.fleet.wait_any, [ship], 'arrival'
+            )
+            assert future.result(timeout=5) == [ship]
+
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_gather(self, respx_mock):
+        agent = snisp.agent.Agent(symbol='testing', faction='testing')
+        ships = [
+            self.load_ship('FAST', .05, -1),
+            self.load_ship('ORBITING', -1, -1),
+        ]
+        ships = [snisp.fleet.Ship(agent, i.to_dict()) for i in ships]
+        ships[1].nav.update_data_item('status', 'IN_ORBIT')
+
+        def dock(request):
+            nav = {'status': 'DOCKED', 'waypointSymbol': 'TEST-WAYPOINT'}
+            return httpx.Response(200, json={'data': {'nav': nav}})
+
+        dock_route = respx_mock.route(
+            M(method='POST', path__regex=r'/my/ships/\w+/dock')
+        )
+        dock_route.side_effect = dock
+
+        futures = [i.dock_async() for i in ships]
+        assert agent.scheduler.running
+        results = agent.fleet.gather(futures, timeout=5)
+        assert [i['nav']['status'] for i in results] == ['DOCKED', 'DOCKED']
+        assert all(i.nav.status == 'DOCKED' for i in ships)
+        assert dock_route.call_count == 2
+        assert snisp.fleet.Ship.dock_async.__name__ == 'dock_async'
+
+        # Errors are collected instead of stopping at the first
+        futures = [
+            ships[0].update_flight_mode_async('INVALID'),
+            ships[1].dock_async(),
+        ]
+        with pytest.raises(snisp.exceptions.GatherError) as e:
+            agent.fleet.gather(futures, timeout=5)
+        assert list(e.value.errors) == [0]
+        assert isinstance(
+            e.value.errors[0], snisp.exceptions.SpaceAttributeError
+        )
+        assert e.value.results == [None, None]
+        assert not e.value.pending
+        results = agent.fleet.gather(futures, return_exceptions=True)
+        assert results[0] is e.value.errors[0]
+        assert results[1] is None
+
+        # Actions that have not finished by the timeout are pending
+        slow = self.load_ship('SLOW', 60, -1)
+        slow = snisp.fleet.Ship(agent, slow.to_dict())
+        futures = [ships[0].dock_async(), slow.dock_async()]
+        with pytest.raises(snisp.exceptions.GatherError) as e:
+            agent.fleet.gather(futures, timeout=.1)
+        assert e.value.pending == [1]
+        assert not e.value.errors
+        assert str(e.value) == '0 of 2 actions failed and 1 did not finish'
+        agent.scheduler.stop()
+        assert not futures[1].done()
+
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_broadcast(self, respx_mock):
+        agent = snisp.agent.Agent(symbol='testing', faction='testing')
+        ships = []
+        for symbol, status, fuel in (
+            ('DOCKED', 'DOCKED', 100),
+            ('FULL', 'IN_ORBIT', 100),
+            ('EMPTY', 'IN_ORBIT', 0),
+        ):
+            ship = self.load_ship(symbol, -1, -1)
+            ship = snisp.fleet.Ship(agent, ship.to_dict())
+            ship.nav.update_data_item('status', status)
+            ship.nav.update_data_item('flightMode', 'CRUISE')
+            ship.update_data_item('fuel', {'current': fuel, 'capacity': 100})
+            ships.append(ship)
+
+        docked = []
+
+        def dock(request):
+            symbol = request.url.path.split('/')[-2]
+            docked.append(symbol)
+            ship = next(i for i in ships if i.symbol == symbol)
+            nav = ship.nav.to_dict()
+            nav['status'] = 'DOCKED'
+            return httpx.Response(200, json={'data': {'nav': nav}})
+
+        respx_mock.route(
+            M(method='POST', path__regex=r'/my/ships/\w+/dock')
+        ).side_effect = dock
+        respx_mock.post('/my/ships/EMPTY/refuel').mock(
+            return_value=httpx.Response(200, json={'data': {
+                'fuel': {'current': 100, 'capacity': 100},
+                'transaction': {
+                    'units': 100,
+                    'waypointSymbol': 'TEST-WAYPOINT',
+                    'totalPrice': 7_200,
+                },
+            }})
+        )
+
+        # Ships already docked are skipped, and the emptiest tank goes first.
+        # One worker runs them in the order they were queued
+        agent.scheduler.start(workers=1)
+        results = agent.fleet.broadcast('dock', ships, timeout=5)
+        assert list(results) == ['DOCKED', 'FULL', 'EMPTY']
+        assert results['DOCKED'] == snisp.fleet.BroadcastResult(
+            ships[0], 'skipped', None
+        )
+        assert results['FULL'].status == results['EMPTY'].status == 'done'
+        assert docked == ['EMPTY', 'FULL']
+
+        # Nothing is requested when every Ship is already in the state
+        results = agent.fleet.broadcast(
+            'update_flight_mode', ships, mode='cruise'
+        )
+        assert {i.status for i in results.values()} == {'skipped'}
+        results = agent.fleet.broadcast('refuel', ships)
+        assert {i: j.status for i, j in results.items()} == {
+            'DOCKED': 'skipped', 'FULL': 'skipped', 'EMPTY': 'done'
+        }
+        assert ships[2].fuel.current == 100
+
+        # Failures are reported per Ship
+        results = agent.fleet.broadcast(
+            'update_flight_mode', ships, mode='INVALID'
+        )
+        assert {i.status for i in results.values()} == {'failed'}
+        assert all(
+            isinstance(i.result, snisp.exceptions.SpaceAttributeError)
+            for i in results.values()
+        )
+
+        slow = self.load_ship('SLOW', 60, -1)
+        slow = snisp.fleet.Ship(agent, slow.to_dict())
+        results = agent.fleet.broadcast('orbit', [slow], timeout=.05)
+        assert results['SLOW'].status == 'pending'
+        agent.scheduler.stop()
+
+        with pytest.raises(snisp.exceptions.SpaceAttributeError):
+            agent.fleet.broadcast('fly_to_the_moon', ships)
+        # Missing or unknown kwargs are caught before any Ship is checked
+        with pytest.raises(
+            snisp.exceptions.SpaceAttributeError, match="'mode'"
+        ):
+            agent.fleet.broadcast('update_flight_mode', ships)
+        with pytest.raises(snisp.exceptions.SpaceAttributeError):
+            agent.fleet.broadcast('dock', ships, mode='CRUISE')
+
+
 class PurchaseSideEffect:
 
     def __init__(
@@ -160,6 +160,51 @@ class TestMarkets:
             with pytest.raises(snisp.exceptions.ClientError):
                 market.data
 
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_fuel_prices(self, respx_mock, monkeypatch):
+        monkeypatch.setattr(snisp.cache, 'FUEL_PRICES', {})
+        market_data = json.load(
+            open(os.path.join(DATA_DIR, 'market_data.json'), encoding='utf8')
+        )
+        market_data['data']['tradeGoods'].append({
+            'symbol': 'FUEL',
+            'type': 'EXCHANGE',
+            'tradeVolume': 100,
+            'supply': 'MODERATE',
+            'activity': 'WEAK',
+            'purchasePrice': 72,
+            'sellPrice': 68,
+        })
+        market_route = respx_mock.get(
+            '/systems/TEST-SYSTEM/waypoints/TEST-SYSTEM-WAYPOINT/market'
+        )
+        market_route.mock(
+            return_value=httpx.Response(200, json=market_data)
+        )
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )
+        ship_data['data']['nav']['systemSymbol'] = 'TEST-SYSTEM'
+        ship_data['data']['nav']['waypointSymbol'] = 'TEST-SYSTEM-WAYPOINT'
+        respx_mock.get('/my/ships/TEST_SHIP_SYMBOL').mock(
+            return_value=httpx.Response(200, json=ship_data)
+        )
+        ship = self.agent.fleet('TEST_SHIP_SYMBOL')
+
+        # Recorded whenever the MarketData lists FUEL
+        ship.markets()
+        assert snisp.cache.get_fuel_prices('TEST-SYSTEM') == {
+            'TEST-SYSTEM-WAYPOINT': (72, 68)
+        }
+        market_data['data']['tradeGoods'][-1]['purchasePrice'] = 80
+        market_route.mock(
+            return_value=httpx.Response(200, json=market_data)
+        )
+        ship.markets(waypoint_symbol='TEST-SYSTEM-WAYPOINT')
+        assert snisp.cache.get_fuel_prices('TEST-SYSTEM') == {
+            'TEST-SYSTEM-WAYPOINT': (80, 68)
+        }
+
     @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
     def test_search(self, respx_mock):
         waypoints_data = json.load(
@@ -1417,6 +1462,100 @@ class TestMarkets:
             with pytest.raises(snisp.exceptions.SpaceAttributeError):
                 shipyard_data = ship.markets.shipyard_market_data('INVALID')
 
+    def test_plan_liquidation(self):
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )['data']
+        ship = snisp.fleet.Ship(self.agent, ship_data)
+        cargo = {'IRON_ORE': 30, 'COPPER_ORE': 20, 'GOLD': 5, 'JUNK': 3}
+
+        def market(symbol, x, imports=(), exports=(), exchange=(), goods=()):
+            waypoint = snisp.markets.Market(
+                self.agent,
+                {'symbol': symbol, 'systemSymbol': 'X1-T', 'x': x, 'y': 0},
+            )
+            market_data = snisp.markets.MarketData(self.agent, {
+                'symbol': symbol,
+                'imports': [{'symbol': i} for i in imports],
+                'exports': [{'symbol': i} for i in exports],
+                'exchange': [{'symbol': i} for i in exchange],
+                'tradeGoods': [
+                    {
+                        'symbol': i,
+                        'type': t,
+                        'tradeVolume': 10,
+                        'purchasePrice': p * 2,
+                        'sellPrice': p,
+                    }
+                    for i, t, p in goods
+                ],
+            })
+            return waypoint, snisp.markets.market_buys(market_data, cargo)
+
+        offers = [
+            market(
+                'X1-T-NEAR',
+                5,
+                exchange=['IRON_ORE'],
+                exports=['GOLD'],
+                goods=[('IRON_ORE', 'EXCHANGE', 20)],
+            ),
+            market(
+                'X1-T-PLANET',
+                10,
+                imports=['IRON_ORE'],
+                goods=[('IRON_ORE', 'IMPORT', 50)],
+            ),
+            # An orbital of the planet, without a Ship to report prices
+            market('X1-T-MOON', 10, imports=['COPPER_ORE']),
+            market(
+                'X1-T-FAR', 50, imports=['GOLD'], goods=[('GOLD', 'IMPORT', 100)]
+            ),
+        ]
+        assert offers[0][1]['GOLD'] == ('GOLD', 5, 'EXPORT', None, None)
+
+        plan = snisp.markets.plan_liquidation(ship, cargo, offers)
+        assert plan.jettison == {'JUNK': 3}
+        # The planet and its moon buy two goods in one stop, the far Market
+        # pays more for GOLD, and nothing is sold at the nearest Market
+        assert [
+            (stop.market.symbol, [i.trade_symbol for i in stop.sales])
+            for stop in plan.stops
+        ] == [
+            ('X1-T-PLANET', ['IRON_ORE']),
+            ('X1-T-MOON', ['COPPER_ORE']),
+            ('X1-T-FAR', ['GOLD']),
+        ]
+        assert plan.stops[0].sales[0] == (
+            'IRON_ORE', 30, 'IMPORT', 10, 50
+        )
+
+        plan = snisp.markets.plan_liquidation(ship, {'JUNK': 3}, [])
+        assert plan == ([], {'JUNK': 3})
+
+        # Without prices, a far Market exporting both goods does not beat
+        # the nearby Markets importing them
+        offers = [
+            market('A-EXPORTS', 500, exports=['IRON_ORE', 'COPPER_ORE']),
+            market('B-IRON', 50, imports=['IRON_ORE']),
+            market('C-COPPER', 60, imports=['COPPER_ORE']),
+        ]
+        plan = snisp.markets.plan_liquidation(ship, cargo, offers)
+        assert [
+            (stop.market.symbol, [
+                (i.trade_symbol, i.trade_type) for i in stop.sales
+            ])
+            for stop in plan.stops
+        ] == [
+            ('B-IRON', [('IRON_ORE', 'IMPORT')]),
+            ('C-COPPER', [('COPPER_ORE', 'IMPORT')]),
+        ]
+        # An exporter is still used for goods nothing else buys
+        offers.append(market('D-GOLD', 900, exports=['GOLD']))
+        plan = snisp.markets.plan_liquidation(ship, cargo, offers)
+        assert plan.stops[-1].market.symbol == 'D-GOLD'
+        assert plan.jettison == {'JUNK': 3}
+
     @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
     def test_best_market_pairs(self, respx_mock):
         waypoints_data = json.load(
@@ -0,0 +1,128 @@
+import collections
+import copy
+import json
+import os
+import tracemalloc
+
+import snisp
+
+from . import DATA_DIR
+
+
+class TestMemory:
+
+    agent = snisp.agent.Agent(symbol='testing', faction='testing')
+
+    def test_report(self):
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )['data']
+        ship = self.agent.fleet.states.update(copy.deepcopy(ship_data))
+        assert ship.nav.route.destination.symbol
+
+        report = snisp.memory.report(self.agent)
+        assert report.models['Ship'] > 0
+        assert report.models['Nav'] > 0
+        assert report.traced == []
+        for name in (
+            'fuel_stations',
+            'fuel_prices',
+            'jump_gates',
+            'distance_tables',
+            'route_plans',
+            'database',
+            'fleet_states',
+            'fleet_arrays',
+            'dead_ships',
+            'recent_transactions',
+        ):
+            assert name in report.caches
+        assert 'fleet_states' not in snisp.memory.report().caches
+
+        snisp.memory.start()
+        try:
+            snisp.fleet.Ship(self.agent, copy.deepcopy(ship_data)).nav
+            traced = snisp.memory.report(limit=5).traced
+            assert 0 < len(traced) <= 5
+            assert all(i.startswith(os.path.dirname(snisp.__file__))
+                       for i, _ in traced)
+        finally:
+            snisp.memory.stop()
+        assert not tracemalloc.is_tracing()
+
+    def test_nested_classes_are_shared(self):
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )['data']
+        first = snisp.fleet.Ship(self.agent, copy.deepcopy(ship_data))
+        second = snisp.fleet.Ship(self.agent, copy.deepcopy(ship_data))
+        assert type(first.nav) is type(second.nav)
+        assert type(first.cargo.inventory[0]) is type(
+            second.cargo.inventory[0]
+        )
+        assert first.nav == second.nav
+        # The attribute and the data share the converted list
+        assert first.cargo.inventory is first._data['cargo'].inventory
+
+        # Action responses reuse the same classes
+        first.update_data_item('nav', copy.deepcopy(ship_data['nav']))
+        second.update_data_item('nav', copy.deepcopy(ship_data['nav']))
+        assert type(first.nav) is type(second.nav)
+        assert type(first.nav) is snisp.utils.dynamic_class('Nav', True)
+        first.update_data_item('mounts', copy.deepcopy(ship_data['mounts']))
+        assert type(first.mounts[0]) is type(second.mounts[0])
+
+    def test_set_caps(self, monkeypatch):
+        monkeypatch.setattr(snisp.cache, 'FUEL_STATIONS', {})
+        monkeypatch.setattr(snisp.cache, 'DISTANCE_TABLES', {})
+        monkeypatch.setattr(snisp.cache, 'MAX_FUEL_STATIONS', 64)
+        monkeypatch.setattr(snisp.cache, 'FUEL_PRICES', {})
+        monkeypatch.setattr(snisp.cache, 'MAX_FUEL_PRICES', 64)
+        monkeypatch.setattr(snisp.cache, 'MAX_DISTANCE_SYSTEMS', 64)
+        monkeypatch.setattr(snisp.cache, 'MAX_DISTANCE_TABLES', 64)
+        monkeypatch.setattr(snisp.cache, 'ROUTE_PLANS', {})
+        monkeypatch.setattr(snisp.cache, 'MAX_ROUTE_SYSTEMS', 64)
+        monkeypatch.setattr(snisp.cache, 'MAX_ROUTE_PLANS', 256)
+        agent =  snisp.agent.Agent(symbol='testing', faction='testing')
+
+        for system in ('A', 'B', 'C'):
+            location = snisp.systems.Location(
+                agent, {'headquarters': f'X1-{system}-W'}
+            )
+            snisp.cache.insert_fuel_stations(location, [])
+            snisp.cache.insert_fuel_price(f'X1-{system}', f'X1-{system}-W', 70)
+            waypoint = snisp.waypoints.Waypoint(
+                agent,
+                {'symbol': system, 'systemSymbol': system, 'x': 0, 'y': 0}
+            )
+            snisp.utils.distance_table([waypoint])
+            for key in range(3):
+                snisp.cache.insert_route_plan(f'X1-{system}', key, ())
+        for symbol in ('ONE', 'TWO', 'THREE'):
+            agent.dead_ships[symbol] = None
+        agent.recent_transactions.extend(range(10))
+
+        snisp.memory.set_caps(
+            agent,
+            fuel_stations=2,
+            fuel_prices=1,
+            distance_systems=1,
+            distance_tables=1,
+            route_systems=2,
+            route_plans=1,
+            recent_transactions=5,
+        )
+        assert list(snisp.cache.FUEL_STATIONS) == ['X1-B', 'X1-C']
+        assert snisp.cache.FUEL_PRICES == {'X1-C': {'X1-C-W': (70, None)}}
+        assert list(snisp.cache.DISTANCE_TABLES) == ['C']
+        assert list(snisp.cache.ROUTE_PLANS) == ['X1-B', 'X1-C']
+        assert list(snisp.cache.ROUTE_PLANS['X1-C']) == [2]
+        # Dead Ships are never dropped, otherwise they would rejoin the Fleet
+        assert list(agent.dead_ships) == ['ONE', 'TWO', 'THREE']
+        assert agent.recent_transactions == collections.deque(
+            range(5, 10), maxlen=5
+        )
+
+        location = snisp.systems.Location(agent, {'headquarters': 'X1-D-W'})
+        snisp.cache.insert_fuel_stations(location, [])
+        assert list(snisp.cache.FUEL_STATIONS) == ['X1-C', 'X1-D']
@@ -0,0 +1,661 @@
+import copy
+import httpx
+import json
+import math
+import os
+import pytest
+
+from datetime import datetime, timedelta, timezone
+from respx.patterns import M
+
+import snisp
+
+from . import DATA_DIR
+
+
+class TestNavigation:
+
+    agent = snisp.agent.Agent(symbol='testing', faction='testing')
+
+    def load_ship(self, *, current=60, capacity=100, speed=10):
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )['data']
+        ship_data['nav']['status'] = 'IN_ORBIT'
+        ship_data['nav']['systemSymbol'] = 'TEST-SYSTEM'
+        ship_data['nav']['waypointSymbol'] = 'TEST-SYSTEM-ORIGIN'
+        ship_data['nav']['flightMode'] = 'CRUISE'
+        for key in ('origin', 'destination'):
+            ship_data['nav']['route'][key] |= {
+                'symbol': 'TEST-SYSTEM-ORIGIN',
+                'systemSymbol': 'TEST-SYSTEM',
+                'x': 0,
+                'y': 0,
+            }
+        ship_data['fuel']['current'] = current
+        ship_data['fuel']['capacity'] = capacity
+        ship_data['engine']['speed'] = speed
+        return ship_data
+
+    def load_waypoint(self, symbol, x, y=0, **kwargs):
+        waypoint_data = json.load(
+            open(os.path.join(DATA_DIR, 'waypoint.json'), encoding='utf8')
+        )['data']
+        waypoint_data['symbol'] = symbol
+        waypoint_data['systemSymbol'] = snisp.navigation.system_symbol(symbol)
+        waypoint_data['x'] = x
+        waypoint_data['y'] = y
+        waypoint_data['isUnderConstruction'] = False
+        waypoint_data |= kwargs
+        return snisp.waypoints.Waypoint(self.agent, waypoint_data)
+
+    def test_formulas(self):
+        # Halves round up
+        assert snisp.navigation.fuel_cost(10.5, 'CRUISE') == 11
+        assert snisp.navigation.fuel_cost(10.5, 'BURN') == 22
+        assert snisp.navigation.fuel_cost(10.5, 'DRIFT') == 1
+        assert snisp.navigation.fuel_cost(0, 'CRUISE') == 1
+        assert snisp.navigation.fuel_cost(.2, 'BURN') == 2
+        assert snisp.navigation.travel_time(40, 10, 'CRUISE') == 115
+        assert snisp.navigation.travel_time(40, 10, 'BURN') == 65
+        assert snisp.navigation.travel_time(40, 10, 'DRIFT') == 1_015
+        assert snisp.navigation.travel_time(0, 30, 'BURN') == 15
+        assert snisp.navigation.flight_modes('cruise') == ('CRUISE', 'DRIFT')
+        assert snisp.navigation.flight_modes('STEALTH') == (
+            'STEALTH', 'DRIFT'
+        )
+        with pytest.raises(snisp.exceptions.SpaceAttributeError):
+            snisp.navigation.flight_modes('WARP')
+
+    def test_plan_route(self, monkeypatch):
+        ship = snisp.fleet.Ship(self.agent, self.load_ship())
+        first = self.load_waypoint('TEST-SYSTEM-FIRST', 40)
+        second = self.load_waypoint('TEST-SYSTEM-SECOND', 80)
+        destination = self.load_waypoint('TEST-SYSTEM-DESTINATION', 120)
+        stations = [second, first]
+
+        route = snisp.navigation.plan_route(
+            ship, destination, fuel_stations=stations
+        )
+        assert [i.waypoint.symbol for i in route.legs] == [
+            'TEST-SYSTEM-FIRST', 'TEST-SYSTEM-SECOND', 'TEST-SYSTEM-DESTINATION'
+        ]
+        # 60 fuel is not enough to BURN the first 40
+        assert [i.flight_mode for i in route.legs] == [
+            'CRUISE', 'BURN', 'BURN'
+        ]
+        assert [i.refuel for i in route.legs] == [False, True, True]
+        assert route.fuel == 40 + 80 + 80
+        assert route.seconds == 115 + 65 + 65
+
+        # Starting at a Fuel Station refuels before the first leg
+        ship_data = self.load_ship()
+        ship_data['nav']['waypointSymbol'] = 'TEST-SYSTEM-FIRST'
+        ship_data['nav']['route']['destination']['x'] = 40
+        ship = snisp.fleet.Ship(self.agent, ship_data)
+        route = snisp.navigation.plan_route(
+            ship, destination, fuel_stations=stations
+        )
+        assert [i.waypoint.symbol for i in route.legs] == [
+            'TEST-SYSTEM-SECOND', 'TEST-SYSTEM-DESTINATION'
+        ]
+        assert [i.refuel for i in route.legs] == [True, True]
+
+        # Direct routes do not look up Fuel Stations
+        def fuel_stations(self):  # pragma: no cover
+            raise AssertionError('Fuel Stations were looked up')
+
+        monkeypatch.setattr(
+            snisp.markets.Markets, 'fuel_stations', fuel_stations
+        )
+        ship = snisp.fleet.Ship(self.agent, self.load_ship(current=100))
+        route = snisp.navigation.plan_route(ship, first)
+        assert len(route.legs) == 1
+        assert route.legs[0].flight_mode == 'BURN'
+        assert route.legs[0].refuel is False
+        assert route.fuel == 80
+
+        # Ships without a fuel tank always fly direct
+        probe = snisp.fleet.Ship(
+            self.agent, self.load_ship(current=0, capacity=0)
+        )
+        route = snisp.navigation.plan_route(probe, destination)
+        assert len(route.legs) == 1
+        assert route.fuel == 0
+
+        # Out of fuel and nowhere to refuel
+        ship = snisp.fleet.Ship(self.agent, self.load_ship(current=0))
+        with pytest.raises(snisp.exceptions.NavigateInsufficientFuelError):
+            snisp.navigation.plan_route(
+                ship, destination, fuel_stations=stations
+            )
+
+    def test_route_plan_cache(self, monkeypatch):
+        monkeypatch.setattr(snisp.cache, 'FUEL_STATIONS', {})
+        monkeypatch.setattr(snisp.cache, 'ROUTE_PLANS', {})
+        first = self.load_waypoint('TEST-SYSTEM-FIRST', 40)
+        second = self.load_waypoint('TEST-SYSTEM-SECOND', 80)
+        destination = self.load_waypoint('TEST-SYSTEM-DESTINATION', 120)
+        monkeypatch.setattr(
+            snisp.markets.Markets,
+            'fuel_stations',
+            lambda self: [first, second],
+        )
+        searches = []
+        search = snisp.navigation.search
+
+        def counted(*args):
+            searches.append(args)
+            return search(*args)
+
+        monkeypatch.setattr(snisp.navigation, 'search', counted)
+
+        ship = snisp.fleet.Ship(self.agent, self.load_ship())
+        route = snisp.navigation.plan_route(ship, destination)
+        assert snisp.navigation.plan_route(ship, destination) == route
+        assert len(searches) == 1
+
+        # A second hull of the same type reuses the plan
+        other = self.load_ship()
+        other['symbol'] = 'OTHER_SHIP'
+        other = snisp.fleet.Ship(self.agent, other)
+        assert snisp.navigation.plan_route(other, destination) == route
+        assert len(searches) == 1
+
+        # Plans from a Fuel Station do not depend on the fuel on hand, but
+        # whether to refuel before departing does
+        ship_data = self.load_ship(current=100)
+        ship_data['nav']['waypointSymbol'] = 'TEST-SYSTEM-FIRST'
+        ship_data['nav']['route']['destination']['x'] = 40
+        full = snisp.navigation.plan_route(
+            snisp.fleet.Ship(self.agent, ship_data), destination
+        )
+        ship_data = self.load_ship(current=10)
+        ship_data['nav']['waypointSymbol'] = 'TEST-SYSTEM-FIRST'
+        ship_data['nav']['route']['destination']['x'] = 40
+        empty = snisp.navigation.plan_route(
+            snisp.fleet.Ship(self.agent, ship_data), destination
+        )
+        assert len(searches) == 2
+        assert [i.refuel for i in full.legs] == [False, True]
+        assert [i.refuel for i in empty.legs] == [True, True]
+
+        # Different fuel on hand away from a Fuel Station plans again
+        snisp.navigation.plan_route(
+            snisp.fleet.Ship(self.agent, self.load_ship(current=50)),
+            destination,
+        )
+        assert len(searches) == 3
+
+        # Explicit Fuel Stations are never cached
+        snisp.navigation.plan_route(
+            ship, destination, fuel_stations=[first, second]
+        )
+        assert len(searches) == 4
+
+        # Charting resets the System's Fuel Stations and its plans
+        with self.agent.lock:
+            snisp.cache.reset_fuel_stations(ship.location)
+        assert 'TEST-SYSTEM' not in snisp.cache.ROUTE_PLANS
+        snisp.navigation.plan_route(ship, destination)
+        assert len(searches) == 5
+
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_estimate(self, respx_mock, caplog):
+        ship = snisp.fleet.Ship(self.agent, self.load_ship())
+        first = self.load_waypoint('TEST-SYSTEM-FIRST', 40)
+        second = self.load_waypoint('TEST-SYSTEM-SECOND', 80)
+
+        assert ship.estimate(first) == (40, 115, True)
+        assert ship.estimate(first, 'burn') == (80, 65, False)
+        assert ship.estimate(second, 'DRIFT') == (1, 2_015, True)
+        probe = snisp.fleet.Ship(
+            self.agent, self.load_ship(current=0, capacity=0)
+        )
+        assert probe.estimate(second, 'BURN') == (0, 115, True)
+
+        # Ranked by time with the fuel on hand
+        assert ship.fastest([second, first]) is first
+        assert ship.fastest([second, first], flight_mode='BURN') is None
+        assert ship.fastest([second], flight_mode='DRIFT') is second
+        assert probe.fastest([second, first], flight_mode='BURN') is first
+
+        # Infeasible navigates never reach the server
+        with pytest.raises(snisp.exceptions.NavigateInsufficientFuelError):
+            ship.navigate(second)
+        error = ship.navigate(second, raise_error=False)
+        assert isinstance(
+            error, snisp.exceptions.NavigateInsufficientFuelError
+        )
+        assert not respx_mock.calls
+
+        # Checked against the route the server reports
+        expected = ship.estimate(first)
+        nav = ship.nav.to_dict()
+        nav['route']['departureTime'] = '2024-03-03T16:00:00Z'
+        nav['route']['arrival'] = '2024-03-03T16:01:55Z'
+        ship.update_data_item('nav', nav)
+        fuel = ship.fuel.to_dict()
+        fuel['consumed']['amount'] = 40
+        ship.update_data_item('fuel', fuel)
+        assert snisp.navigation.validate(ship, expected)
+        nav = ship.nav.to_dict()
+        nav['route']['arrival'] = '2024-03-03T16:02:30Z'
+        ship.update_data_item('nav', nav)
+        with caplog.at_level('WARNING', logger='snisp.navigation'):
+            assert not snisp.navigation.validate(ship, expected)
+        assert 'Estimated 115s and 40 fuel' in caplog.text
+
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_autopilot(self, respx_mock, monkeypatch, caplog):
+        first = self.load_waypoint('TEST-SYSTEM-FIRST', 40)
+        second = self.load_waypoint('TEST-SYSTEM-SECOND', 80)
+        destination = self.load_waypoint('TEST-SYSTEM-DESTINATION', 120)
+        monkeypatch.setattr(
+            snisp.markets.Markets,
+            'fuel_stations',
+            lambda self: [first, second, destination],
+        )
+        # Only the destination's FUEL price is known, and it is the cheapest
+        monkeypatch.setattr(
+            snisp.cache,
+            'FUEL_PRICES',
+            {'TEST-SYSTEM': {'TEST-SYSTEM-DESTINATION': (60, 30)}},
+        )
+        server = TravelSideEffect(
+            self.load_ship(), [first, second, destination]
+        )
+        navigate_route = respx_mock.post('/my/ships/TEST_SHIP_SYMBOL/navigate')
+        navigate_route.side_effect = server.navigate
+        refuel_route = respx_mock.post('/my/ships/TEST_SHIP_SYMBOL/refuel')
+        refuel_route.side_effect = server.refuel
+        flight_mode_route = respx_mock.patch('/my/ships/TEST_SHIP_SYMBOL/nav')
+        flight_mode_route.side_effect = server.update_flight_mode
+        respx_mock.post('/my/ships/TEST_SHIP_SYMBOL/orbit').side_effect = (
+            server.orbit
+        )
+        respx_mock.post('/my/ships/TEST_SHIP_SYMBOL/dock').side_effect = (
+            server.dock
+        )
+        done = []
+
+        ship = snisp.fleet.Ship(self.agent, copy.deepcopy(server.ship))
+        with caplog.at_level('WARNING', logger='snisp.navigation'):
+            ship.autopilot(
+                destination, done_callback=lambda: done.append(True)
+            )
+        # Every leg took the estimated time and fuel
+        assert not caplog.records
+
+        assert server.failures == 0
+        assert navigate_route.call_count == 3
+        # Refueled at both stops and at the destination
+        assert refuel_route.call_count == 3
+        # CRUISE to the first stop, BURN from there, and back to CRUISE
+        assert flight_mode_route.call_count == 2
+        assert ship.nav.waypoint_symbol == 'TEST-SYSTEM-DESTINATION'
+        assert ship.nav.status == 'IN_ORBIT'
+        assert ship.nav.flight_mode == 'CRUISE'
+        assert ship.fuel.current == ship.fuel.capacity
+        assert done == [True]
+        # Prices paid along the way are recorded
+        assert snisp.cache.get_fuel_prices('TEST-SYSTEM') == {
+            'TEST-SYSTEM-FIRST': (72, None),
+            'TEST-SYSTEM-SECOND': (72, None),
+            'TEST-SYSTEM-DESTINATION': (72, 30),
+        }
+
+        # Already there
+        ship.autopilot(destination)
+        assert navigate_route.call_count == 3
+
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_autopilot_async(self, respx_mock, monkeypatch):
+        # In range with the fuel on hand, so a single BURN leg
+        destination = self.load_waypoint('TEST-SYSTEM-DESTINATION', 25)
+        monkeypatch.setattr(
+            snisp.cache,
+            'FUEL_PRICES',
+            {'TEST-SYSTEM': {'TEST-SYSTEM-DESTINATION': (60, 30)}},
+        )
+        server = TravelSideEffect(self.load_ship(), [destination])
+        # Still in transit when the flight mode is restored, so that step
+        # has to wait on the arrival
+        server.arrives_in = 1.2
+        navigate_route = respx_mock.post('/my/ships/TEST_SHIP_SYMBOL/navigate')
+        navigate_route.side_effect = server.navigate
+        refuel_route = respx_mock.post('/my/ships/TEST_SHIP_SYMBOL/refuel')
+        refuel_route.side_effect = server.refuel
+        flight_mode_route = respx_mock.patch('/my/ships/TEST_SHIP_SYMBOL/nav')
+        flight_mode_route.side_effect = server.update_flight_mode
+        respx_mock.post('/my/ships/TEST_SHIP_SYMBOL/orbit').side_effect = (
+            server.orbit
+        )
+        respx_mock.post('/my/ships/TEST_SHIP_SYMBOL/dock').side_effect = (
+            server.dock
+        )
+        agent = snisp.agent.Agent(symbol='testing', faction='testing')
+        ship = snisp.fleet.Ship(agent, copy.deepcopy(server.ship))
+        done = []
+
+        future = ship.autopilot_async(
+            destination, done_callback=lambda: done.append(True)
+        )
+        try:
+            assert future.result(timeout=10) is None
+        finally:
+            agent.scheduler.stop()
+        # The steps after the wait ran once, instead of autopilot starting
+        # over and returning early at the destination
+        assert done == [True]
+        assert navigate_route.call_count == 1
+        assert [
+            json.loads(i.request.content)['flightMode']
+            for i in flight_mode_route.calls
+        ] == ['BURN', 'CRUISE']
+        assert refuel_route.call_count == 1
+        assert ship.nav.flight_mode == 'CRUISE'
+        assert ship.nav.status == 'IN_ORBIT'
+
+    def test_refuel_policy(self, monkeypatch):
+        monkeypatch.setattr(snisp.cache, 'FUEL_PRICES', {})
+        first = self.load_waypoint('TEST-SYSTEM-FIRST', 40)
+        second = self.load_waypoint('TEST-SYSTEM-SECOND', 80)
+        destination = self.load_waypoint('TEST-SYSTEM-DESTINATION', 120)
+        Leg = snisp.navigation.Leg
+        Refuel = snisp.navigation.Refuel
+        route = snisp.navigation.Route(
+            [
+                Leg(first, 'CRUISE', 40, 40, 0, False),
+                Leg(second, 'CRUISE', 40, 40, 0, True),
+                Leg(destination, 'BURN', 40, 80, 0, False),
+            ],
+            160,
+            0,
+        )
+        ship = snisp.fleet.Ship(
+            self.agent, self.load_ship(current=60, capacity=400)
+        )
+
+        # Without prices, only the Legs that need it refuel, and fill up
+        policy = snisp.navigation.RefuelPolicy()
+        assert policy.plan(ship, route) == [
+            None, Refuel(0, False), None
+        ]
+        assert policy.arrive(ship, destination) is None
+
+        # The origin is cheapest, so it buys for the whole Route, rounded
+        # up to whole units of FUEL
+        policy = snisp.navigation.RefuelPolicy(prices={
+            'TEST-SYSTEM-ORIGIN': 50,
+            'TEST-SYSTEM-FIRST': 90,
+            'TEST-SYSTEM-SECOND': 80,
+        })
+        assert policy.plan(ship, route) == [
+            Refuel(100, False), None, None
+        ]
+
+        # Buys just enough to reach the cheaper stop
+        policy = snisp.navigation.RefuelPolicy(prices={
+            'TEST-SYSTEM-ORIGIN': 90,
+            'TEST-SYSTEM-FIRST': 80,
+            'TEST-SYSTEM-SECOND': 50,
+            'TEST-SYSTEM-DESTINATION': 50,
+        })
+        assert policy.plan(ship, route) == [
+            None, Refuel(100, False), None
+        ]
+        # The destination sells the cheapest Fuel
+        assert policy.arrive(ship, destination) == Refuel(0, False)
+        assert policy.arrive(ship, first) is None
+        assert snisp.navigation.RefuelPolicy(
+            prices={'TEST-SYSTEM-DESTINATION': 50}, top_up=False
+        ).arrive(ship, destination) is None
+
+        # FUEL in the cargo is burned when it is worth less than buying
+        ship_data = self.load_ship(current=60, capacity=400)
+        ship_data['cargo']['inventory'] = [{
+            'symbol': 'FUEL',
+            'name': 'Fuel',
+            'description': 'Fuel',
+            'units': 2,
+        }]
+        ship = snisp.fleet.Ship(self.agent, ship_data)
+        policy = snisp.navigation.RefuelPolicy(
+            prices={'TEST-SYSTEM-ORIGIN': 50}, cargo_value=40
+        )
+        assert policy.plan(ship, route) == [
+            Refuel(100, True), None, None
+        ]
+        # Unless it is worth more, or there is no known sell price
+        policy = snisp.navigation.RefuelPolicy(
+            prices={'TEST-SYSTEM-ORIGIN': 50}, cargo_value=60
+        )
+        assert policy.plan(ship, route) == [
+            Refuel(100, False), None, None
+        ]
+        policy = snisp.navigation.RefuelPolicy(
+            prices={'TEST-SYSTEM-ORIGIN': 50}
+        )
+        assert policy.cargo_value(ship) == math.inf
+        snisp.cache.insert_fuel_price(
+            'TEST-SYSTEM', 'TEST-SYSTEM-FIRST', 90, 45
+        )
+        assert policy.cargo_value(ship) == 45
+        assert policy.plan(ship, route) == [
+            Refuel(100, True), None, None
+        ]
+
+
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_travel(self, respx_mock, monkeypatch):
+        monkeypatch.setattr(
+            snisp.markets.Markets, 'fuel_stations', lambda self: []
+        )
+        gates = {
+            'X1-A': self.load_waypoint('X1-A-GATE', 10, type='JUMP_GATE'),
+            'X1-B': self.load_waypoint('X1-B-GATE', 0, type='JUMP_GATE'),
+            'X1-C': self.load_waypoint('X1-C-GATE', 0, type='JUMP_GATE'),
+            'X1-D': self.load_waypoint(
+                'X1-D-GATE', 0, type='JUMP_GATE', isUnderConstruction=True
+            ),
+        }
+        connections = {
+            'X1-A-GATE': ['X1-D-GATE', 'X1-B-GATE'],
+            'X1-B-GATE': ['X1-A-GATE', 'X1-C-GATE'],
+            'X1-C-GATE': ['X1-B-GATE'],
+            'X1-D-GATE': ['X1-C-GATE'],
+        }
+        destination = self.load_waypoint('X1-C-DEST', 20)
+        galaxy = GalaxySideEffect(gates, connections)
+        waypoints_route = respx_mock.route(
+            M(path__regex=r'/systems/[^/]+/waypoints$')
+        )
+        waypoints_route.side_effect = galaxy.waypoints
+        respx_mock.route(
+            M(path__regex=r'/systems/[^/]+/waypoints/[^/]+/jump-gate')
+        ).side_effect = galaxy.jump_gate
+
+        ship_data = self.load_ship(current=100)
+        ship_data['nav']['systemSymbol'] = 'X1-A'
+        ship_data['nav']['waypointSymbol'] = 'X1-A-ORIGIN'
+        server = TravelSideEffect(
+            ship_data, [destination, *gates.values()]
+        )
+        navigate_route = respx_mock.post('/my/ships/TEST_SHIP_SYMBOL/navigate')
+        navigate_route.side_effect = server.navigate
+        jump_route = respx_mock.post('/my/ships/TEST_SHIP_SYMBOL/jump')
+        jump_route.side_effect = server.jump
+        warp_route = respx_mock.post('/my/ships/TEST_SHIP_SYMBOL/warp')
+        warp_route.side_effect = server.navigate
+        respx_mock.patch('/my/ships/TEST_SHIP_SYMBOL/nav').side_effect = (
+            server.update_flight_mode
+        )
+
+        # The gate under construction in X1-D is never jumped to
+        assert [
+            i.symbol for i in snisp.navigation.plan_jumps(
+                snisp.fleet.Ship(self.agent, copy.deepcopy(ship_data)),
+                'X1-C',
+            )
+        ] == ['X1-A-GATE', 'X1-B-GATE', 'X1-C-GATE']
+
+        # X1-C is two jumps away, so the search stops before reaching it
+        waypoints_route.reset()
+        assert snisp.navigation.plan_jumps(
+            snisp.fleet.Ship(self.agent, copy.deepcopy(ship_data)),
+            'X1-C',
+            max_jumps=1,
+        ) is None
+        # Only X1-A and the Systems one jump away were looked up
+        assert sorted(
+            i.request.url.path.split('/')[-2] for i in waypoints_route.calls
+        ) == ['X1-A', 'X1-A', 'X1-B', 'X1-D']
+
+        done = []
+        ship = snisp.fleet.Ship(self.agent, copy.deepcopy(ship_data))
+        ship.travel(destination, done_callback=lambda: done.append(True))
+        assert [
+            json.loads(i.request.content)['waypointSymbol']
+            for i in jump_route.calls
+        ] == ['X1-B-GATE', 'X1-C-GATE']
+        assert [
+            json.loads(i.request.content)['waypointSymbol']
+            for i in navigate_route.calls
+        ] == ['X1-A-GATE', 'X1-C-DEST']
+        assert ship.nav.system_symbol == 'X1-C'
+        assert ship.nav.waypoint_symbol == 'X1-C-DEST'
+        assert ship.nav.status == 'IN_ORBIT'
+        assert done == [True]
+
+        # No gates reach X1-E, so only Ships with a Warp Drive can get there
+        remote = self.load_waypoint('X1-E-DEST', 5)
+        server.waypoints[remote.symbol] = remote.to_dict()
+        with pytest.raises(snisp.exceptions.NavigateOutsideSystemError):
+            ship.travel(remote)
+        assert not warp_route.calls
+
+        ship_data = ship.to_dict()
+        ship_data['modules'].append({'symbol': 'MODULE_WARP_DRIVE_I'})
+        ship = snisp.fleet.Ship(self.agent, ship_data)
+        ship.travel(remote)
+        assert warp_route.call_count == 1
+        assert ship.nav.system_symbol == 'X1-E'
+        assert ship.nav.waypoint_symbol == 'X1-E-DEST'
+        assert ship.nav.status == 'IN_ORBIT'
+
+
+class GalaxySideEffect:
+
+    """Serves a JumpGate per System and the gates it connects to"""
+
+    def __init__(self, gates, connections):
+        self.gates = gates
+        self.connections = connections
+
+    def waypoints(self, request, route):
+        system = request.url.path.split('/')[-2]
+        data = []
+        if int(request.url.params['page']) == 1 and system in self.gates:
+            data.append(self.gates[system].to_dict())
+        return httpx.Response(200, json={'data': data})
+
+    def jump_gate(self, request, route):
+        symbol = request.url.path.split('/')[-2]
+        return httpx.Response(200, json={'data': {
+            'symbol': symbol, 'connections': self.connections[symbol]
+        }})
+
+
+class TravelSideEffect:
+
+    """Moves and refuels a Ship the way the server would"""
+
+    def __init__(self, ship, waypoints):
+        self.ship = ship
+        self.waypoints = {
+            i.symbol: i.to_dict() for i in waypoints
+        }
+        self.failures = 0
+        # Seconds from the navigate until the Ship arrives
+        self.arrives_in = -1
+
+    def navigate(self, request, route):
+        symbol = json.loads(request.content.decode('utf8'))['waypointSymbol']
+        nav = self.ship['nav']
+        dest = self.waypoints[symbol]
+        origin = nav['route']['destination']
+        distance = math.hypot(dest['x'] - origin['x'], dest['y'] - origin['y'])
+        fuel = snisp.navigation.fuel_cost(distance, nav['flightMode'])
+        if fuel > self.ship['fuel']['current']:
+            self.failures += 1
+            return httpx.Response(400, json={'error': {'code': 4203}})
+        self.ship['fuel']['current'] -= fuel
+        self.ship['fuel']['consumed']['amount'] = fuel
+        # Already arrived by default, so the test does not wait
+        arrival = datetime.now(timezone.utc) + timedelta(
+            seconds=self.arrives_in
+        )
+        seconds = snisp.navigation.travel_time(
+            distance, self.ship['engine']['speed'], nav['flightMode']
+        )
+        nav['route']['arrival'] = arrival.isoformat()
+        nav['route']['departureTime'] = (
+            arrival - timedelta(seconds=seconds)
+        ).isoformat()
+        nav['route']['origin'] = copy.deepcopy(origin)
+        nav['route']['destination'] |= {
+            'symbol': symbol, 'x': dest['x'], 'y': dest['y']
+        }
+        nav['waypointSymbol'] = symbol
+        nav['systemSymbol'] = dest['systemSymbol']
+        nav['status'] = 'IN_TRANSIT'
+        return httpx.Response(200, json={'data': {
+            'fuel': self.ship['fuel'], 'nav': nav
+        }})
+
+    def jump(self, request, route):
+        symbol = json.loads(request.content.decode('utf8'))['waypointSymbol']
+        nav = self.ship['nav']
+        dest = self.waypoints[symbol]
+        nav['route']['origin'] = copy.deepcopy(nav['route']['destination'])
+        nav['route']['destination'] |= {
+            'symbol': symbol,
+            'systemSymbol': dest['systemSymbol'],
+            'x': dest['x'],
+            'y': dest['y'],
+        }
+        nav['waypointSymbol'] = symbol
+        nav['systemSymbol'] = dest['systemSymbol']
+        nav['status'] = 'IN_ORBIT'
+        return httpx.Response(200, json={'data': {
+            'nav': nav, 'cooldown': self.ship['cooldown']
+        }})
+
+    def refuel(self, request, route):
+        units = self.ship['fuel']['capacity'] - self.ship['fuel']['current']
+        payload = json.loads(request.content.decode('utf8'))
+        units = min(units, payload.get('units', units))
+        self.ship['fuel']['current'] += units
+        return httpx.Response(200, json={'data': {
+            'fuel': self.ship['fuel'],
+            'transaction': {
+                'waypointSymbol': self.ship['nav']['waypointSymbol'],
+                'units': units,
+                'pricePerUnit': 72,
+                'totalPrice': units * 72,
+            }
+        }})
+
+    def update_flight_mode(self, request, route):
+        mode = json.loads(request.content.decode('utf8'))['flightMode']
+        self.ship['nav']['flightMode'] = mode
+        return httpx.Response(200, json={'data': self.ship['nav']})
+
+    def orbit(self, request, route):
+        self.ship['nav']['status'] = 'IN_ORBIT'
+        return httpx.Response(200, json={'data': {'nav': self.ship['nav']}})
+
+    def dock(self, request, route):
+        self.ship['nav']['status'] = 'DOCKED'
+        return httpx.Response(200, json={'data': {'nav': self.ship['nav']}})
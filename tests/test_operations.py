@@ -0,0 +1,491 @@
+import copy
+import httpx
+import json
+import os
+import pytest
+
+from respx.patterns import M
+
+import snisp
+
+from . import DATA_DIR
+
+
+class TestMiningOperation:
+
+    agent = snisp.agent.Agent(symbol='testing', faction='testing')
+
+    def load_ship(self, symbol, capacity):
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )['data']
+        ship_data['symbol'] = symbol
+        ship_data['nav']['status'] = 'IN_ORBIT'
+        ship_data['nav']['waypointSymbol'] = 'X1-TEST-ASTEROID'
+        ship_data['cargo'] = {
+            'capacity': capacity, 'units': 0, 'inventory': []
+        }
+        return snisp.fleet.Ship(self.agent, copy.deepcopy(ship_data))
+
+    def load_asteroid(self):
+        waypoint_data = json.load(
+            open(os.path.join(DATA_DIR, 'waypoint.json'), encoding='utf8')
+        )['data']
+        waypoint_data['symbol'] = 'X1-TEST-ASTEROID'
+        waypoint_data['type'] = 'ASTEROID'
+        return snisp.waypoints.Waypoint(self.agent, waypoint_data)
+
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_mining_operation(self, respx_mock, monkeypatch):
+        asteroid = self.load_asteroid()
+        drones = [self.load_ship(f'DRONE-{i}', 4) for i in range(2)]
+        hauler = self.load_ship('HAULER', 10)
+        side_effect = MiningSideEffect(deposits=30)
+        respx_mock.route(
+            M(path__regex=r'/my/ships/DRONE-\d/extract')
+        ).side_effect = side_effect.extract
+        respx_mock.route(
+            M(path__regex=r'/my/ships/DRONE-\d/transfer')
+        ).side_effect = side_effect.transfer
+
+        unloads = []
+
+        def unload(ship):
+            unloads.append(ship.cargo.units)
+            ship.update_data_item(
+                'cargo', {'capacity': 10, 'units': 0, 'inventory': []}
+            )
+
+        operation = snisp.operations.MiningOperation(
+            asteroid, drones, [hauler], unload=unload, poll=.01
+        )
+        assert repr(operation) == (
+            "MiningOperation('X1-TEST-ASTEROID', 2 drones, 1 haulers)"
+        )
+        futures = operation.start()
+        assert operation.running
+        self.agent.scheduler.run(workers=2)
+        assert all(i.done() and i.exception() is None for i in futures)
+        assert not operation.running
+        assert operation.stopped
+
+        # Everything extracted went through the hauler
+        assert operation.extracted == {'IRON_ORE': 30}
+        assert sum(unloads) == 30
+        # The hauler only left early once the Asteroid was stripped
+        assert all(i == 10 for i in unloads[:-1])
+        assert all(i.cargo.units == 0 for i in drones)
+        assert not operation.stationed
+        assert not +operation.reserved
+
+        # Haulers unload with sell_off_cargo by default
+        respx_mock.route(
+            M(path__regex=r'/my/ships/DRONE-\d/extract')
+        ).side_effect = MiningSideEffect(deposits=0).extract
+        hauler.update_data_item(
+            'cargo', {
+                'capacity': 10,
+                'units': 1,
+                'inventory': [{
+                    'symbol': 'IRON_ORE',
+                    'name': 'IRON_ORE',
+                    'description': 'IRON_ORE',
+                    'units': 1,
+                }],
+            }
+        )
+        sold = []
+        monkeypatch.setattr(
+            snisp.fleet.Ship, 'sell_off_cargo',
+            lambda ship: sold.append(ship.symbol)
+        )
+        operation = snisp.operations.MiningOperation(
+            asteroid, drones[:1], [hauler], poll=.01
+        )
+        operation.start()
+        self.agent.scheduler.run(workers=1)
+        assert sold == ['HAULER']
+
+
+class MiningSideEffect:
+
+    def __init__(self, deposits):
+        self.deposits = deposits
+        self.cargo = {}
+
+    def hold(self, ship_symbol, capacity):
+        return self.cargo.setdefault(
+            ship_symbol, {'capacity': capacity, 'units': 0, 'inventory': []}
+        )
+
+    def extract(self, request):
+        ship_symbol = request.url.path.split('/')[-2]
+        cargo = self.hold(ship_symbol, 4)
+        units = min(2, self.deposits, cargo['capacity'] - cargo['units'])
+        self.deposits -= units
+        if units:
+            self.add(cargo, 'IRON_ORE', units)
+        return httpx.Response(200, json={'data': {
+            'cooldown': {
+                'shipSymbol': ship_symbol,
+                'totalSeconds': 0,
+                'remainingSeconds': 0,
+                'expiration': '2019-08-24T14:15:22Z',
+            },
+            'extraction': {
+                'shipSymbol': ship_symbol,
+                'yield': {'symbol': 'IRON_ORE', 'units': units},
+            },
+            'cargo': copy.deepcopy(cargo),
+        }})
+
+    def transfer(self, request):
+        ship_symbol = request.url.path.split('/')[-2]
+        payload = json.loads(request.content)
+        cargo = self.hold(ship_symbol, 4)
+        item = next(
+            i for i in cargo['inventory']
+            if i['symbol'] == payload['tradeSymbol']
+        )
+        item['units'] -= payload['units']
+        cargo['units'] -= payload['units']
+        if not item['units']:
+            cargo['inventory'].remove(item)
+        return httpx.Response(200, json={'data': {
+            'cargo': copy.deepcopy(cargo)
+        }})
+
+    @staticmethod
+    def add(cargo, symbol, units):
+        cargo['units'] += units
+        for item in cargo['inventory']:
+            if item['symbol'] == symbol:
+                item['units'] += units
+                return
+        cargo['inventory'].append({
+            'symbol': symbol,
+            'name': symbol,
+            'description': symbol,
+            'units': units,
+        })
+
+
+class TestRefinery:
+
+    agent = snisp.agent.Agent(symbol='testing', faction='testing')
+
+    def load_ship(self, symbol, capacity, **inventory):
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )['data']
+        ship_data['symbol'] = symbol
+        ship_data['nav']['status'] = 'IN_ORBIT'
+        ship_data['nav']['waypointSymbol'] = 'X1-TEST-STATION'
+        ship_data['cargo'] = {
+            'capacity': capacity, 'units': 0, 'inventory': []
+        }
+        for symbol, units in inventory.items():
+            MiningSideEffect.add(ship_data['cargo'], symbol, units)
+        return snisp.fleet.Ship(self.agent, copy.deepcopy(ship_data))
+
+    def load_station(self):
+        waypoint_data = json.load(
+            open(os.path.join(DATA_DIR, 'waypoint.json'), encoding='utf8')
+        )['data']
+        waypoint_data['symbol'] = 'X1-TEST-STATION'
+        return snisp.waypoints.Waypoint(self.agent, waypoint_data)
+
+    def test_choose(self):
+        ship = self.load_ship(
+            'REFINERY', 100, IRON_ORE=60, COPPER_ORE=30, GOLD_ORE=10
+        )
+        prices = {'IRON': 50, 'IRON_ORE': 2, 'COPPER': 10, 'COPPER_ORE': 20}
+        refinery = snisp.operations.Refinery(ship, prices=prices)
+        assert repr(refinery) == "Refinery('REFINERY')"
+        assert refinery.spreads() == {'IRON': 440, 'COPPER': -500}
+        assert refinery.choose() == 'IRON'
+
+        # COPPER is worth less than its ore, and there is too little GOLD_ORE
+        ship.update_data_item('cargo', {
+            'capacity': 100,
+            'units': 40,
+            'inventory': [
+                {'symbol': 'COPPER_ORE', 'units': 30},
+                {'symbol': 'GOLD_ORE', 'units': 10},
+            ],
+        })
+        assert refinery.choose() is None
+
+        # Without prices, the ore the hold has the most of is refined
+        refinery.prices = {}
+        ship.update_data_item('cargo', {
+            'capacity': 100,
+            'units': 80,
+            'inventory': [
+                {'symbol': 'COPPER_ORE', 'units': 30},
+                {'symbol': 'SILVER_ORE', 'units': 50},
+            ],
+        })
+        assert refinery.choose() == 'SILVER'
+
+    def test_sell_prices(self):
+        def market_data(*goods):
+            return snisp.markets.MarketData(self.agent, {
+                'tradeGoods': [
+                    {'symbol': symbol, 'sellPrice': price}
+                    for symbol, price in goods
+                ],
+            })
+
+        market_data = [
+            market_data(('IRON', 40), ('IRON_ORE', 3)),
+            market_data(('IRON', 55), ('FABRICS', 90)),
+            snisp.markets.MarketData(self.agent, {'tradeGoods': []}),
+        ]
+        assert snisp.markets.sell_prices(market_data) == {
+            'IRON': 55, 'IRON_ORE': 3, 'FABRICS': 90
+        }
+        assert snisp.markets.sell_prices(market_data, {'IRON_ORE'}) == {
+            'IRON_ORE': 3
+        }
+
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_refinery(self, respx_mock):
+        ship = self.load_ship('REFINERY', 80, IRON_ORE=30, COPPER_ORE=12)
+        drone = self.load_ship('DRONE-0', 30, IRON_ORE=25, QUARTZ_SAND=5)
+        side_effect = RefineSideEffect(ship.cargo.to_dict())
+        respx_mock.post('/my/ships/REFINERY/refine').side_effect = (
+            side_effect
+        )
+        transfer = MiningSideEffect(0)
+        transfer.cargo['DRONE-0'] = copy.deepcopy(drone.cargo.to_dict())
+        respx_mock.post('/my/ships/DRONE-0/transfer').side_effect = (
+            transfer.transfer
+        )
+
+        sales = []
+
+        def sell(ship, goods):
+            sales.append(sorted(goods))
+            cargo = ship.cargo.to_dict()
+            cargo['inventory'] = [
+                i for i in cargo['inventory'] if i['symbol'] not in goods
+            ]
+            cargo['units'] = sum(i['units'] for i in cargo['inventory'])
+            ship.update_data_item('cargo', cargo)
+
+        refinery = snisp.operations.Refinery(
+            ship,
+            station=self.load_station(),
+            sell=sell,
+            prices={'IRON': 50, 'IRON_ORE': 2},
+            poll=.01,
+        )
+
+        # Only ore is delivered
+        assert refinery.deliver(drone) == {'IRON_ORE': 25}
+        assert drone.cargo.units == 5
+        assert ship.cargo.units == 67
+        side_effect.cargo = copy.deepcopy(ship.cargo.to_dict())
+
+        future = refinery.start()
+        refinery.stop()
+        self.agent.scheduler.run(workers=1)
+        assert future.result() is None
+        # 55 IRON_ORE makes one refine, and the rest is left in the hold
+        assert refinery.refined == {'IRON': 10}
+        assert side_effect.calls == ['IRON']
+        assert sales == [['IRON']]
+        assert refinery.finished_goods() == []
+        assert {i.symbol: i.units for i in ship.cargo.inventory} == {
+            'IRON_ORE': 25, 'COPPER_ORE': 12
+        }
+
+
+class RefineSideEffect:
+
+    def __init__(self, cargo):
+        self.cargo = copy.deepcopy(cargo)
+        self.calls = []
+
+    def __call__(self, request):
+        produce = json.loads(request.content)['produce']
+        self.calls.append(produce)
+        ore = snisp.utils.REFINING_INPUTS[produce]
+        item = next(i for i in self.cargo['inventory'] if i['symbol'] == ore)
+        item['units'] -= 30
+        self.cargo['units'] -= 30
+        MiningSideEffect.add(self.cargo, produce, 10)
+        return httpx.Response(200, json={'data': {
+            'cargo': copy.deepcopy(self.cargo),
+            'cooldown': {
+                'shipSymbol': 'REFINERY',
+                'totalSeconds': 0,
+                'remainingSeconds': 0,
+                'expiration': '2019-08-24T14:15:22Z',
+            },
+            'produced': [{'tradeSymbol': produce, 'units': 10}],
+            'consumed': [{'tradeSymbol': ore, 'units': 30}],
+        }})
+
+
+class TestContractOperation:
+
+    agent = snisp.agent.Agent(symbol='testing', faction='testing')
+
+    def load_ship(self, symbol, capacity, **inventory):
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )['data']
+        ship_data['symbol'] = symbol
+        ship_data['nav']['status'] = 'DOCKED'
+        ship_data['nav']['waypointSymbol'] = 'X1-TEST-DEST'
+        ship_data['cargo'] = {
+            'capacity': capacity, 'units': 0, 'inventory': []
+        }
+        for symbol, units in inventory.items():
+            MiningSideEffect.add(ship_data['cargo'], symbol, units)
+        return snisp.fleet.Ship(self.agent, copy.deepcopy(ship_data))
+
+    def load_contract(self):
+        contract_data = json.load(
+            open(os.path.join(DATA_DIR, 'contract.json'), encoding='utf8')
+        )['data']['contract']
+        contract_data['id'] = 'CONTRACT-1'
+        contract_data['accepted'] = True
+        contract_data['terms']['deadline'] = '2099-08-24T14:15:22Z'
+        contract_data['terms']['deliver'] = [
+            {
+                'tradeSymbol': 'IRON_ORE',
+                'destinationSymbol': 'X1-TEST-DEST',
+                'unitsRequired': 25,
+                'unitsFulfilled': 5,
+            },
+            {
+                'tradeSymbol': 'COPPER',
+                'destinationSymbol': 'X1-TEST-DEST',
+                'unitsRequired': 8,
+                'unitsFulfilled': 0,
+            },
+        ]
+        return snisp.contracts.Contract(self.agent, contract_data)
+
+    def load_waypoint(self, symbol):
+        waypoint_data = json.load(
+            open(os.path.join(DATA_DIR, 'waypoint.json'), encoding='utf8')
+        )['data']
+        waypoint_data['symbol'] = symbol
+        return snisp.waypoints.Waypoint(self.agent, waypoint_data)
+
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_contract_operation(self, respx_mock, monkeypatch):
+        contract = self.load_contract()
+        haulers = [
+            self.load_ship('HAULER-0', 10, IRON_ORE=3),
+            self.load_ship('HAULER-1', 15),
+        ]
+        side_effect = ContractSideEffect(contract, haulers)
+        respx_mock.post('/my/contracts/CONTRACT-1/deliver').side_effect = (
+            side_effect.deliver
+        )
+        fulfill_route = respx_mock.post('/my/contracts/CONTRACT-1/fulfill')
+        fulfill_route.side_effect = side_effect.fulfill
+        waypoint_data = json.load(
+            open(os.path.join(DATA_DIR, 'waypoint.json'), encoding='utf8')
+        )
+        waypoint_data['data']['symbol'] = 'X1-TEST-DEST'
+        destination_route = respx_mock.route(
+            M(path__regex=r'/systems/[\w-]+/waypoints/X1-TEST-DEST')
+        ).mock(return_value=httpx.Response(200, json=waypoint_data))
+
+        flights = []
+        purchases = []
+
+        def autopilot(ship, waypoint, *args, **kwargs):
+            flights.append((ship.symbol, waypoint.symbol))
+            ship.nav.update_data_item('waypointSymbol', waypoint.symbol)
+
+        def autopurchase(ship, trade_symbol, max_units=0, buffer=200_000):
+            purchases.append((ship.symbol, trade_symbol, max_units))
+            cargo = ship.cargo.to_dict()
+            MiningSideEffect.add(cargo, trade_symbol, max_units)
+            ship.update_data_item('cargo', cargo)
+
+        monkeypatch.setattr(snisp.fleet.Ship, 'autopilot', autopilot)
+        monkeypatch.setattr(snisp.fleet.Ship, 'autopurchase', autopurchase)
+
+        sources = []
+
+        def source(trade_symbol):
+            sources.append(trade_symbol)
+            return self.load_waypoint('X1-TEST-MARKET')
+
+        operation = snisp.operations.ContractOperation(
+            contract, haulers, source=source
+        )
+        assert repr(operation) == "ContractOperation('CONTRACT-1', 2 haulers)"
+        futures = operation.start()
+        assert operation.running
+        self.agent.scheduler.run(workers=2)
+        assert all(i.done() and i.exception() is None for i in futures)
+        assert not operation.running
+        assert operation.complete
+
+        # Split by hold size, using the IRON_ORE HAULER-0 already had
+        assert operation.delivered == {'IRON_ORE': 20, 'COPPER': 8}
+        assert sorted(i for i in purchases if i[1] == 'IRON_ORE') == [
+            ('HAULER-0', 'IRON_ORE', 7), ('HAULER-1', 'IRON_ORE', 10)
+        ]
+        assert sum(i[2] for i in purchases if i[1] == 'COPPER') == 8
+        assert sorted(sources) == ['COPPER', 'IRON_ORE']
+        assert destination_route.call_count == 1
+        assert all(i.cargo.units == 0 for i in haulers)
+        assert fulfill_route.call_count == 1
+        assert contract.fulfilled
+
+        # Goods that cannot be bought are left undelivered
+        contract = self.load_contract()
+        side_effect.contract = contract
+        operation = snisp.operations.ContractOperation(
+            contract, haulers, source=lambda x: None
+        )
+        futures = operation.start()
+        self.agent.scheduler.run(workers=2)
+        assert all(i.done() and i.exception() is None for i in futures)
+        assert not operation.complete
+        assert not +operation.delivered
+        assert operation.remaining == {'IRON_ORE': 20, 'COPPER': 8}
+        assert fulfill_route.call_count == 1
+
+
+class ContractSideEffect:
+
+    def __init__(self, contract, ships):
+        self.contract = contract
+        self.ships = {i.symbol: i for i in ships}
+
+    def deliver(self, request):
+        payload = json.loads(request.content)
+        terms = copy.deepcopy(self.contract.terms.to_dict())
+        for term in terms['deliver']:
+            if term['tradeSymbol'] == payload['tradeSymbol']:
+                term['unitsFulfilled'] += payload['units']
+        cargo = self.ships[payload['shipSymbol']].cargo.to_dict()
+        item = next(
+            i for i in cargo['inventory']
+            if i['symbol'] == payload['tradeSymbol']
+        )
+        item['units'] -= payload['units']
+        cargo['units'] -= payload['units']
+        if not item['units']:
+            cargo['inventory'].remove(item)
+        return httpx.Response(200, json={'data': {
+            'contract': {'terms': terms},
+            'cargo': cargo,
+        }})
+
+    def fulfill(self, request):
+        return httpx.Response(200, json={'data': {
+            'contract': {'fulfilled': True},
+            'agent': {'credits': 100_000},
+        }})
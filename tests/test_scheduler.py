@@ -0,0 +1,228 @@
+import asyncio
+import copy
+import json
+import os
+import pytest
+import time
+
+from datetime import datetime, timedelta, timezone
+
+import snisp
+
+from . import DATA_DIR
+
+
+class TestScheduler:
+
+    agent = snisp.agent.Agent(symbol='testing', faction='testing')
+
+    def load_ship(self, symbol='TEST_SHIP_SYMBOL'):
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )['data']
+        ship_data['symbol'] = symbol
+        return snisp.fleet.Ship(self.agent, copy.deepcopy(ship_data))
+
+    def test_repr(self):
+        assert repr(self.agent.scheduler) == f'Scheduler({self.agent!r})'
+
+    def test_callbacks_run_in_deadline_order(self):
+        scheduler = snisp.scheduler.Scheduler(self.agent)
+        order = []
+        later = scheduler.call_later(.1, order.append, 'later')
+        deadline = datetime.now(timezone.utc) + timedelta(seconds=.05)
+        at = scheduler.call_at(deadline, order.append, 'at')
+        soon = scheduler.submit(order.append, 'soon')
+        assert len(scheduler) == 3
+        scheduler.run(workers=2)
+        assert order == ['soon', 'at', 'later']
+        assert all(i.done() for i in (later, at, soon))
+        assert len(scheduler) == 0
+        assert not scheduler.running
+
+    def test_waits_are_requeued(self):
+        scheduler = snisp.scheduler.Scheduler(self.agent)
+        calls = []
+
+        def action():
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                snisp.decorators.wait(.1)
+            return 'done'
+
+        with scheduler:
+            future = scheduler.submit(action)
+            assert future.result(timeout=5) == 'done'
+        assert len(calls) == 2
+        assert calls[1] - calls[0] >= .09
+
+        # A broad except within an action does not swallow the wait
+        swallowed = []
+
+        def guarded():
+            try:
+                action()
+            except Exception as e:  # pragma: no cover
+                swallowed.append(e)
+            return 'guarded'
+
+        calls.clear()
+        with scheduler:
+            assert scheduler.submit(guarded).result(timeout=5) == 'guarded'
+        assert len(calls) == 2
+        assert not swallowed
+
+        # Outside the Scheduler, nothing is raised for waits in the past
+        snisp.decorators.wait(0)
+        snisp.decorators.wait(-1)
+
+    def test_cooldown_does_not_block_worker(self):
+        scheduler = snisp.scheduler.Scheduler(self.agent)
+        ship = self.load_ship()
+        cooldown = ship.cooldown.to_dict()
+        cooldown['expiration'] = (
+            datetime.now(timezone.utc) + timedelta(seconds=.2)
+        ).isoformat()
+        ship.update_data_item('cooldown', cooldown)
+        order = []
+
+        @snisp.decorators.cooldown
+        def extract(ship):
+            order.append('extract')
+
+        with scheduler:
+            first = scheduler.submit(extract, ship)
+            second = scheduler.submit(order.append, 'other')
+            first.result(timeout=5)
+            second.result(timeout=5)
+        # A single worker ran the other task while the extract waited
+        assert order == ['other', 'extract']
+
+        with snisp.decorators.non_blocking():
+            ship.update_data_item('cooldown', cooldown | {
+                'expiration': (
+                    datetime.now(timezone.utc) + timedelta(seconds=60)
+                ).isoformat()
+            })
+            with pytest.raises(snisp.exceptions.WaitRequiredError) as e:
+                extract(ship)
+            assert e.value.deadline > datetime.now(timezone.utc)
+
+    def test_spawn(self):
+        scheduler = snisp.scheduler.Scheduler(self.agent)
+        events = []
+
+        def fails():
+            raise snisp.exceptions.SpaceUserError('failed')
+
+        def task(name):
+            result = yield lambda: f'{name}-action'
+            events.append(result)
+            yield .05
+            events.append(f'{name}-slept')
+            yield None
+            try:
+                yield fails
+            except snisp.exceptions.SpaceUserError:
+                events.append(f'{name}-caught')
+            return name
+
+        def broken():
+            yield
+            raise snisp.exceptions.SpaceUserError('broken')
+
+        one = scheduler.spawn(task('one'))
+        two = scheduler.spawn(task('two'))
+        three = scheduler.spawn(broken())
+        scheduler.run(workers=1)
+        assert one.result() == 'one'
+        assert two.result() == 'two'
+        with pytest.raises(snisp.exceptions.SpaceUserError):
+            three.result()
+        assert events.index('one-action') < events.index('one-slept')
+        assert events.index('two-slept') < events.index('two-caught')
+        assert len(events) == 6
+
+        with pytest.raises(snisp.exceptions.SpaceAttributeError):
+            scheduler.spawn(lambda: None)
+        with pytest.raises(snisp.exceptions.SpaceAttributeError):
+            scheduler.call_at('tomorrow', lambda: None)
+
+    def test_enqueue_overlaps_reactor_cooldown(self):
+        scheduler = snisp.scheduler.Scheduler(self.agent)
+        ship = self.load_ship('LANE_SHIP')
+        cooldown = ship.cooldown.to_dict()
+        cooldown['expiration'] = (
+            datetime.now(timezone.utc) + timedelta(seconds=.2)
+        ).isoformat()
+        ship.update_data_item('cooldown', cooldown)
+        order = []
+
+        @snisp.decorators.cooldown
+        def extract(ship):
+            order.append('extract')
+            return 'extracted'
+
+        def transfer(ship):
+            order.append('transfer')
+
+        def navigate(ship):
+            order.append('navigate')
+
+        def sell(ship):
+            order.append('sell')
+
+        assert snisp.decorators.uses_reactor(extract)
+        assert snisp.decorators.uses_reactor(ship.extract)
+        assert snisp.decorators.uses_reactor(ship.waypoints.survey)
+        assert not snisp.decorators.uses_reactor(ship.transfer)
+
+        with scheduler:
+            futures = [
+                scheduler.enqueue(ship, extract, ship),
+                scheduler.enqueue(ship, transfer, ship),
+                scheduler.enqueue(ship, navigate, ship),
+                scheduler.enqueue(ship, sell, ship),
+            ]
+            assert futures[0].result(timeout=5) == 'extracted'
+            for future in futures[1:]:
+                future.result(timeout=5)
+        # The transfer runs during the cooldown, but nothing overtakes the
+        # extract by moving the Ship
+        assert order == ['transfer', 'extract', 'navigate', 'sell']
+        assert not scheduler._lanes
+
+    def test_sleep_until_asyncio(self):
+        scheduler = snisp.scheduler.Scheduler(self.agent)
+
+        async def main():
+            start = time.monotonic()
+            await asyncio.wrap_future(scheduler.sleep_until(.05))
+            return time.monotonic() - start
+
+        with scheduler:
+            assert asyncio.run(main()) >= .04
+
+    def test_ready_at(self):
+        ship = self.load_ship()
+        now = datetime.now(timezone.utc)
+        nav = ship.nav.to_dict()
+        nav['status'] = 'IN_TRANSIT'
+        nav['route']['arrival'] = (now + timedelta(seconds=30)).isoformat()
+        ship.update_data_item('nav', nav)
+        cooldown = ship.cooldown.to_dict()
+        cooldown['expiration'] = (now + timedelta(seconds=60)).isoformat()
+        ship.update_data_item('cooldown', cooldown)
+
+        arrival = snisp.scheduler.ready_at(ship, 'arrival')
+        assert 29 < (arrival - now).total_seconds() <= 30
+        cooldown = snisp.scheduler.ready_at(ship, 'cooldown')
+        assert 59 < (cooldown - now).total_seconds() <= 60
+        assert snisp.scheduler.ready_at(ship) == cooldown
+
+        nav['status'] = 'IN_ORBIT'
+        ship.update_data_item('nav', nav)
+        assert snisp.scheduler.ready_at(ship, 'arrival') <= now
+
+        with pytest.raises(snisp.exceptions.SpaceAttributeError):
+            snisp.scheduler.ready_at(ship, 'docked')
@@ -4,6 +4,8 @@ import json
 import os
 import pytest
 
+from respx.patterns import M
+
 import snisp
 
 from . import DATA_DIR, GenericSideEffect
@@ -113,6 +115,8 @@ class TestShipyards:
                 encoding='utf8'
             )
         )
+        # The balance after each purchase comes from its response
+        ship_purchase_data['data']['agent']['credits'] = 400_000
         respx_mock.post('/my/ships').mock(
             return_value=httpx.Response(200, json=ship_purchase_data)
         )
@@ -154,6 +158,101 @@ class TestShipyards:
                 list(ship.shipyards.autopurchase(ship_type='SHIP_PROBE'))
 
 
+    @pytest.mark.respx(base_url='https://api.spacetraders.io/v2')
+    def test_listings(self, respx_mock):
+        waypoints_data = json.load(
+            open(os.path.join(DATA_DIR, 'waypoints.json'), encoding='utf8')
+        )
+        for waypoint in waypoints_data['data']:
+            waypoint['traits'][0]['symbol'] = 'SHIPYARD'
+        shipyards_side_effect = ShipyardsSideEffect(
+            data=None, waypoints=waypoints_data
+        )
+        respx_mock.get('/systems/TEST-SYSTEM/waypoints').side_effect = (
+            shipyards_side_effect.waypoints_side_effect
+        )
+        prices = PricesSideEffect({
+            'TEST-SYSTEM-CLOSESTWAYPOINT': 100_000,
+            'TEST-SYSTEM-WAYPOINT': 100_000,
+            'TEST-SYSTEM-FARTHESTWAYPOINT': 90_000,
+        })
+        shipyard_route = respx_mock.route(
+            M(path__regex=r'/systems/TEST-SYSTEM/waypoints/[\w-]+/shipyard')
+        )
+        shipyard_route.side_effect = prices
+        respx_mock.post('/my/ships').side_effect = prices.purchase
+
+        agent_data = json.load(
+            open(os.path.join(DATA_DIR, 'agent_data.json'), encoding='utf8')
+        )
+        agent_data['data']['credits'] = 1_000_000
+        agent_route = respx_mock.get('/my/agent').mock(
+            return_value=httpx.Response(200, json=agent_data)
+        )
+        ships_data = json.load(
+            open(
+                os.path.join(DATA_DIR, 'fleet_list_ships.json'),
+                encoding='utf8'
+            )
+        )
+        for ship_data, symbol in zip(
+            ships_data['data'],
+            ('TEST-SYSTEM-CLOSESTWAYPOINT', 'TEST-SYSTEM-FARTHESTWAYPOINT'),
+        ):
+            ship_data['nav']['status'] = 'DOCKED'
+            ship_data['nav']['waypointSymbol'] = symbol
+        respx_mock.get('/my/ships').side_effect = FleetSideEffect(ships_data)
+        ship_data = json.load(
+            open(os.path.join(DATA_DIR, 'ship_info.json'), encoding='utf8')
+        )
+        ship_data['data']['nav']['systemSymbol'] = 'TEST-SYSTEM'
+        ship_data['data']['nav']['waypointSymbol'] = (
+            'TEST-SYSTEM-CLOSESTWAYPOINT'
+        )
+        respx_mock.get('/my/ships/TEST_SHIP_SYMBOL').mock(
+            return_value=httpx.Response(200, json=ship_data)
+        )
+
+        agent = snisp.agent.Agent(symbol='testing', faction='testing')
+        ship = agent.fleet('TEST_SHIP_SYMBOL')
+
+        # Cheapest first, then closest to the Ship at (0, 0)
+        listings = ship.shipyards.listings('SHIP_PROBE')
+        assert [(i.symbol, j.purchase_price) for i, j in listings] == [
+            ('TEST-SYSTEM-FARTHESTWAYPOINT', 90_000),
+            ('TEST-SYSTEM-CLOSESTWAYPOINT', 100_000),
+            ('TEST-SYSTEM-WAYPOINT', 100_000),
+        ]
+        assert not ship.shipyards.listings('SHIP_REFINING_FREIGHTER')
+        with pytest.raises(snisp.exceptions.SpaceAttributeError):
+            ship.shipyards.listings('INVALID')
+
+        # Each Shipyard is fetched once, and only the Shipyard bought from
+        # is fetched again before the next purchase
+        shipyard_route.reset()
+        transactions = ship.shipyards.autopurchase(
+            ship_type='SHIP_PROBE', max_units=2, buffer=750_000
+        )
+        assert len(transactions) == 2
+        assert prices.purchases == [
+            'TEST-SYSTEM-FARTHESTWAYPOINT', 'TEST-SYSTEM-CLOSESTWAYPOINT'
+        ]
+        assert [i.request.url.path.split('/')[-2] for i in shipyard_route.calls] == [  # noqa: E501
+            'TEST-SYSTEM-CLOSESTWAYPOINT',
+            'TEST-SYSTEM-WAYPOINT',
+            'TEST-SYSTEM-FARTHESTWAYPOINT',
+            'TEST-SYSTEM-FARTHESTWAYPOINT',
+        ]
+        assert agent_route.call_count == 1
+        assert agent.ledger.credits == 810_000
+
+        # The buffer stops the next purchase
+        assert not ship.shipyards.autopurchase(
+            ship_type='SHIP_PROBE', buffer=950_000
+        )
+        assert len(prices.purchases) == 2
+
+
 class TestShipyard:
 
     agent = snisp.agent.Agent(symbol='testing', faction='testing')
@@ -534,3 +633,38 @@ class FleetSideEffect:
 
     def reset(self):
         self.data = copy.deepcopy(self.orig_data)
+
+
+class PricesSideEffect:
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.purchases = []
+        self.credits = 1_000_000
+
+    def __call__(self, request, route):
+        symbol = request.url.path.split('/')[-2]
+        return httpx.Response(200, json={'data': {
+            'symbol': symbol,
+            'ships': [{
+                'type': 'SHIP_PROBE',
+                'name': 'SHIP_PROBE',
+                'purchasePrice': self.prices[symbol],
+            }],
+        }})
+
+    def purchase(self, request, route):
+        data = json.load(
+            open(
+                os.path.join(DATA_DIR, 'ship_purchase.json'),
+                encoding='utf8'
+            )
+        )
+        symbol = json.loads(request.content)['waypointSymbol']
+        self.purchases.append(symbol)
+        data['data']['transaction']['price'] = self.prices[symbol]
+        self.credits -= self.prices[symbol]
+        data['data']['agent']['credits'] = self.credits
+        # Buying raises the price at that Shipyard
+        self.prices[symbol] += 20_000
+        return httpx.Response(200, json=data)
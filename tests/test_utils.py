@@ -0,0 +1,183 @@
+import copy
+import json
+import os
+import pickle
+import pytest
+import zlib
+
+import snisp
+
+from . import DATA_DIR, attribute_test
+
+
+class TestSerialization:
+
+    agent = snisp.agent.Agent(symbol='testing', faction='testing')
+
+    def load(self, name):
+        return json.load(
+            open(os.path.join(DATA_DIR, name), encoding='utf8')
+        )['data']
+
+    def test_pickle_ship(self):
+        ship_data = self.load('ship_info.json')
+        ship = snisp.fleet.Ship(self.agent, copy.deepcopy(ship_data))
+        # Force the nested, dynamically created classes into existence
+        assert ship.nav.route.destination.symbol
+        assert ship.cargo.inventory[0].symbol
+
+        payload = pickle.dumps(ship)
+        assert b'SpaceClient' not in payload
+
+        restored = pickle.loads(payload)
+        assert type(restored) is snisp.fleet.Ship
+        assert restored.agent is None
+        assert restored == ship
+        assert type(restored.nav).__name__ == type(ship.nav).__name__
+        attribute_test(restored, ship_data)
+
+        snisp.utils.set_local_agent(self.agent)
+        try:
+            restored = pickle.loads(payload)
+            assert restored.agent is self.agent
+            # Ships are restored as the Agent's shared instance
+            assert restored is self.agent.fleet.states.get(ship.symbol)
+            assert pickle.loads(payload) is restored
+        finally:
+            snisp.utils.set_local_agent(None)
+
+    def test_pickle_waypoint_and_market_data(self):
+        waypoint_data = self.load('waypoint.json')
+        waypoint = snisp.waypoints.Waypoint(self.agent, waypoint_data)
+        restored = pickle.loads(pickle.dumps(waypoint))
+        assert type(restored) is snisp.waypoints.Waypoint
+        assert restored == waypoint
+
+        unknown = snisp.waypoints.class_factory('UNKNOWN_TYPE')
+        item = unknown(self.agent, copy.deepcopy(waypoint_data))
+        restored = pickle.loads(pickle.dumps(item))
+        assert type(restored).__name__ == type(item).__name__
+        assert restored.to_dict() == item.to_dict()
+
+        market_data = self.load('market_data.json')
+        market_data['location'] = snisp.systems.Location(
+            self.agent, {'headquarters': market_data['symbol']}
+        )
+        market = snisp.markets.MarketData(self.agent, market_data)
+        restored = pickle.loads(pickle.dumps(market))
+        assert restored == market
+        assert type(restored.location) is snisp.systems.Location
+        assert restored.location.system == 'TEST-SYSTEM'
+
+    def test_dumps_loads(self):
+        ship_data = self.load('ship_info.json')
+        ship = snisp.fleet.Ship(self.agent, copy.deepcopy(ship_data))
+        waypoint = snisp.waypoints.Waypoint(
+            self.agent, self.load('waypoint.json')
+        )
+        assert ship.nav.route.origin.symbol
+
+        payload = snisp.utils.dumps(ship)
+        assert payload.startswith(snisp.utils.SERIAL_MAGIC)
+        assert len(payload) < len(json.dumps(ship_data))
+        restored = snisp.utils.loads(payload, agent=self.agent)
+        assert restored == ship
+        assert restored.agent is self.agent
+        attribute_test(restored, ship_data)
+
+        restored = snisp.utils.loads(snisp.utils.dumps([ship, waypoint]))
+        assert restored == [ship, waypoint]
+
+        # Only the Library's own classes are imported
+        tampered = snisp.utils.SERIAL_HEADER.pack(
+            snisp.utils.SERIAL_MAGIC, snisp.utils.SERIAL_VERSION
+        ) + zlib.compress(json.dumps({
+            snisp.utils.SERIAL_TAG: ['os', 'system', False], 'data': {},
+        }).encode('utf8'))
+        with pytest.raises(snisp.exceptions.SerializationError):
+            snisp.utils.loads(tampered)
+
+        with pytest.raises(snisp.exceptions.SerializationError):
+            snisp.utils.loads(b'')
+        with pytest.raises(snisp.exceptions.SerializationError):
+            snisp.utils.loads(b'NOPE' + payload[4:])
+        with pytest.raises(snisp.exceptions.SerializationError):
+            snisp.utils.loads(
+                snisp.utils.SERIAL_HEADER.pack(snisp.utils.SERIAL_MAGIC, 255)
+            )
+
+    def test_copy_keeps_agent(self):
+        ship = snisp.fleet.Ship(self.agent, self.load('ship_info.json'))
+        assert copy.copy(ship).agent is self.agent
+        deep = copy.deepcopy(ship)
+        assert deep.agent is self.agent
+        assert deep == ship
+        assert deep._data is not ship._data
+
+
+class TestDistances:
+
+    agent = snisp.agent.Agent(symbol='testing', faction='testing')
+
+    def waypoints(self, *points, system='TEST-SYSTEM'):
+        return [
+            snisp.waypoints.Waypoint(
+                self.agent,
+                {
+                    'symbol': f'{system}-{index}',
+                    'systemSymbol': system,
+                    'x': x,
+                    'y': y,
+                }
+            )
+            for index, (x, y) in enumerate(points)
+        ]
+
+    @pytest.mark.parametrize('use_numpy', [True, False])
+    def test_distance_table(self, use_numpy, monkeypatch):
+        if not use_numpy:
+            monkeypatch.setattr(snisp.utils, 'numpy', None)
+        elif snisp.utils.numpy is None:
+            pytest.skip('numpy is not installed')
+        monkeypatch.setattr(snisp.cache, 'DISTANCE_TABLES', {})
+        waypoints = self.waypoints((0, 0), (3, 4), (-6, -8))
+        table = snisp.utils.distance_table(waypoints)
+        assert len(table) == 3
+        assert table is snisp.utils.distance_table(waypoints)
+        assert table.distance(0, 1) == 5
+        assert table.distance(1, 2) == 15
+        assert table.distance(2, 2) == 0
+        assert table.index['TEST-SYSTEM-1'] == 1
+        assert table.closest(4, 4) == 1
+        assert table.farthest(4, 4) == 2
+        assert table.argsort(-1, -1) == [0, 1, 2]
+
+        ships = self.waypoints((0, 0), (-6, -8), system='OTHER')
+        matrix = snisp.utils.distance_matrix(ships, waypoints)
+        assert [list(map(float, row)) for row in matrix] == [
+            [0, 5, 10], [10, 15, 0]
+        ]
+        assert len(snisp.utils.distance_matrix([], waypoints)) == 0
+
+        empty = snisp.utils.distance_table([])
+        assert empty.closest(0, 0) is None
+        assert empty.farthest(0, 0) is None
+
+        # Same symbols with new coordinates are a different table
+        moved = self.waypoints((1, 1), (3, 4), (-6, -8))
+        assert snisp.utils.distance_table(moved) is not table
+
+        location = snisp.systems.Location(
+            self.agent, {'headquarters': 'TEST-SYSTEM-0'}
+        )
+        snisp.cache.reset_distance_tables(location)
+        assert snisp.utils.distance_table(waypoints) is not table
+
+    def test_distance_table_cap(self, monkeypatch):
+        monkeypatch.setattr(snisp.cache, 'DISTANCE_TABLES', {})
+        monkeypatch.setattr(snisp.cache, 'MAX_DISTANCE_TABLES', 2)
+        first = snisp.utils.distance_table(self.waypoints((0, 0)))
+        snisp.utils.distance_table(self.waypoints((1, 1)))
+        snisp.utils.distance_table(self.waypoints((2, 2)))
+        assert len(snisp.cache.DISTANCE_TABLES['TEST-SYSTEM']) == 2
+        assert first.key not in snisp.cache.DISTANCE_TABLES['TEST-SYSTEM']